@@ -0,0 +1,205 @@
+"""
+Puntos de control incrementales y a prueba de cortes para el estado del cerebro.
+
+El estado pequeño (contadores, confianza, chat, época...) se guarda en un
+directorio con una instantánea compactada ('estado.json') y un diario de
+cambios ('diario.jsonl') al que cada guardado sólo añade las claves que
+cambiaron. Cada cierto número de entradas el diario se compacta en una
+instantánea nueva, que se escribe en un archivo temporal y se renombra de
+forma atómica. Los datos voluminosos (el código acumulado) viven en
+'CorpusCodigo' y no se copian en cada guardado.
+"""
+
+import json
+import os
+import pickle
+import tempfile
+import threading
+
+from corpus_codigo import recortar_linea_cortada
+
+
+class ErrorAlmacenCerebro(Exception):
+    """El estado guardado no se pudo leer o migrar."""
+
+
+class AlmacenCerebro:
+    """
+    Instantánea + diario de cambios, con escrituras atómicas y guardados coalescidos.
+    """
+
+    def __init__(self, directorio='cerebro', compactar_cada=200):
+        self.directorio = directorio
+        self.ruta_instantanea = os.path.join(directorio, 'estado.json')
+        self.ruta_diario = os.path.join(directorio, 'diario.jsonl')
+        self.compactar_cada = compactar_cada
+        self._persistido = None  # Último estado escrito en disco
+        self._secuencia = 0
+        self._entradas_diario = 0
+        self._pendiente = None
+        self._guardando = False
+        self._lock = threading.Lock()
+
+    def existe(self):
+        return os.path.exists(self.ruta_instantanea) or os.path.exists(self.ruta_diario)
+
+    def cargar(self):
+        """
+        Devuelve el estado guardado (instantánea + cambios del diario) o None si no hay ninguno.
+        """
+        if not self.existe():
+            return None
+
+        estado, secuencia = {}, 0
+        if os.path.exists(self.ruta_instantanea):
+            try:
+                with open(self.ruta_instantanea, encoding='utf-8') as archivo:
+                    instantanea = json.load(archivo)
+            except ValueError as e:
+                raise ErrorAlmacenCerebro(f"Instantánea dañada en {self.ruta_instantanea}: {e}") from e
+            estado, secuencia = instantanea['estado'], instantanea['secuencia']
+
+        entradas = 0
+        if os.path.exists(self.ruta_diario):
+            # Un corte durante un guardado deja la última línea a medias: quitarla para que
+            # los guardados siguientes no se peguen a ella y se pierdan al cargar
+            recortar_linea_cortada(self.ruta_diario)
+            with open(self.ruta_diario, encoding='utf-8') as archivo:
+                for linea in archivo:
+                    try:
+                        entrada = json.loads(linea)
+                    except ValueError:
+                        continue
+                    if entrada['secuencia'] <= secuencia:
+                        continue  # Ya incluida en la instantánea
+                    estado.update(entrada['cambios'])
+                    for clave in entrada['borradas']:
+                        estado.pop(clave, None)
+                    secuencia = entrada['secuencia']
+                    entradas += 1
+
+        self._persistido = dict(estado)
+        self._secuencia = secuencia
+        self._entradas_diario = entradas
+        return estado
+
+    def guardar(self, estado):
+        """
+        Guarda el estado escribiendo sólo lo que cambió desde el último guardado.
+
+        Si otro hilo está guardando, el estado queda pendiente y ese hilo lo
+        escribe al terminar, de modo que los guardados simultáneos se combinan
+        en uno. Devuelve True si este llamador realizó la escritura.
+        """
+        with self._lock:
+            self._pendiente = dict(estado)
+            if self._guardando:
+                return False
+            self._guardando = True
+
+        try:
+            while True:
+                with self._lock:
+                    estado, self._pendiente = self._pendiente, None
+                    if estado is None:
+                        self._guardando = False
+                        return True
+                self._escribir(estado)
+        except BaseException:
+            with self._lock:
+                self._guardando = False
+            raise
+
+    def _escribir(self, estado):
+        os.makedirs(self.directorio, exist_ok=True)
+        if self._persistido is None and self.existe():
+            self.cargar()
+
+        anterior = self._persistido or {}
+        cambios = {clave: valor for clave, valor in estado.items()
+                   if clave not in anterior or anterior[clave] != valor}
+        borradas = [clave for clave in anterior if clave not in estado]
+        if not cambios and not borradas and os.path.exists(self.ruta_instantanea):
+            return
+
+        self._secuencia += 1
+        if not os.path.exists(self.ruta_instantanea) or self._entradas_diario >= self.compactar_cada:
+            self._compactar(estado)
+        else:
+            linea = json.dumps({'secuencia': self._secuencia, 'cambios': cambios, 'borradas': borradas},
+                               ensure_ascii=False)
+            with open(self.ruta_diario, 'a', encoding='utf-8') as archivo:
+                archivo.write(linea + '\n')
+                archivo.flush()
+                os.fsync(archivo.fileno())
+            self._entradas_diario += 1
+        self._persistido = dict(estado)
+
+    def _compactar(self, estado):
+        # Escribir una instantánea completa y vaciar el diario; las entradas antiguas
+        # que sobrevivan a un corte se ignoran por su número de secuencia
+        escribir_atomico(self.ruta_instantanea, json.dumps({'secuencia': self._secuencia, 'estado': estado},
+                                                           ensure_ascii=False, indent=1))
+        escribir_atomico(self.ruta_diario, '')
+        self._entradas_diario = 0
+
+
+def escribir_atomico(ruta, contenido):
+    # Escribir en un temporal del mismo directorio, sincronizar y renombrarlo encima del destino
+    # (el contenido puede ser texto, que se guarda en UTF-8, o bytes)
+    directorio = os.path.dirname(ruta) or '.'
+    descriptor, temporal = tempfile.mkstemp(dir=directorio, prefix='.' + os.path.basename(ruta), suffix='.tmp')
+    try:
+        binario = isinstance(contenido, bytes)
+        with os.fdopen(descriptor, 'wb' if binario else 'w', encoding=None if binario else 'utf-8') as archivo:
+            archivo.write(contenido)
+            archivo.flush()
+            os.fsync(archivo.fileno())
+        os.replace(temporal, ruta)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+    if hasattr(os, 'O_DIRECTORY'):
+        descriptor = os.open(directorio, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(descriptor)
+        finally:
+            os.close(descriptor)
+
+
+class _EstadoLegado:
+    # Sustituto inerte de las clases del cerebro antiguo: sólo recoge su diccionario
+    def __setstate__(self, estado):
+        self.estado = estado
+
+
+class _DesempaquetadorSeguro(pickle.Unpickler):
+    # Sólo acepta las clases que aparecían en cerebro.pkl y nunca ejecuta su código
+    CLASES_PERMITIDAS = {('homero', 'RedNeuronal'), ('corpus_codigo', 'CorpusCodigo')}
+
+    def find_class(self, modulo, nombre):
+        if (modulo, nombre) in self.CLASES_PERMITIDAS:
+            return _EstadoLegado
+        raise pickle.UnpicklingError(f"Clase no permitida en el cerebro antiguo: {modulo}.{nombre}")
+
+
+def migrar_pickle(ruta='cerebro.pkl'):
+    """
+    Lee un cerebro.pkl antiguo sin ejecutar código y devuelve su estado como diccionario.
+
+    Sólo se conservan los valores simples (texto, números, booleanos y listas
+    de ellos); el código acumulado ya está en codigo_actual.txt.
+    """
+    try:
+        with open(ruta, 'rb') as archivo:
+            objeto = _DesempaquetadorSeguro(archivo).load()
+    except (pickle.UnpicklingError, EOFError, AttributeError, ValueError) as e:
+        raise ErrorAlmacenCerebro(f"No se pudo migrar {ruta}: {e}") from e
+    if not isinstance(objeto, _EstadoLegado) or not isinstance(getattr(objeto, 'estado', None), dict):
+        raise ErrorAlmacenCerebro(f"{ruta} no contiene un cerebro reconocible")
+
+    simples = (str, int, float, bool, type(None))
+    return {clave: valor for clave, valor in objeto.estado.items()
+            if clave != 'codigo_actual' and (isinstance(valor, simples) or
+                                            (isinstance(valor, list) and all(isinstance(v, simples) for v in valor)))}
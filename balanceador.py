@@ -0,0 +1,218 @@
+"""
+Reparto de preguntas entre varias instancias de Serge.
+
+Cada backend tiene su propio cliente (URL, modelo, hilos), sus propios chats y
+sus estadísticas: preguntas en curso, latencia media y fallos seguidos. Cada
+pregunta va al backend sano con menos preguntas en curso (o con menor
+latencia), y un backend que falla varias veces seguidas sale de la rotación
+durante un tiempo, tras el cual vuelve a probarse.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from transporte import ClienteSerge, ConfiguracionSerge, ErrorSerge
+
+
+class ErrorSinBackends(ErrorSerge):
+    """Ningún backend pudo atender la pregunta."""
+
+
+class Backend:
+    """
+    Una instancia de Serge con sus chats y su estado de salud.
+    """
+
+    def __init__(self, configuracion, chats_paralelos=2, nombre=None):
+        self.configuracion = configuracion
+        self.cliente = ClienteSerge(configuracion)
+        self.nombre = nombre or configuracion.url_base
+        self.chats_paralelos = chats_paralelos
+        self.chat_ids = []
+        self.chats_libres = []
+        self.creando = 0  # Chats que se están creando ahora mismo
+        self.en_curso = 0
+        self.latencia_media = None
+        self.fallos_seguidos = 0
+        self.fuera_hasta = 0.0
+
+    def sano(self, ahora):
+        return ahora >= self.fuera_hasta
+
+    def disponible(self):
+        # Tiene un chat libre o puede crear uno más
+        return bool(self.chats_libres) or len(self.chat_ids) + self.creando < self.chats_paralelos
+
+    def __repr__(self):
+        return f"Backend({self.nombre!r}, en_curso={self.en_curso}, latencia_media={self.latencia_media})"
+
+
+class Reserva:
+    """
+    Backend y chat asignados a una pregunta.
+    """
+
+    def __init__(self, backend, chat_id):
+        self.backend = backend
+        self.cliente = backend.cliente
+        self.chat_id = chat_id
+
+
+class PoolBackends:
+    """
+    Conjunto de backends con enrutado por carga o latencia y retirada de los que fallan.
+    """
+
+    def __init__(self, backends, criterio='pendientes', fallos_para_retirar=3, tiempo_retiro=30.0,
+                 suavizado=0.3, espera_maxima=300.0):
+        if criterio not in ('pendientes', 'latencia'):
+            raise ValueError(f"Criterio de enrutado desconocido: {criterio}")
+        self.backends = list(backends)
+        self.criterio = criterio
+        self.fallos_para_retirar = fallos_para_retirar
+        self.tiempo_retiro = tiempo_retiro
+        self.suavizado = suavizado
+        self.espera_maxima = espera_maxima
+        self._condicion = threading.Condition()
+
+    @classmethod
+    def desde_entorno(cls, **valores):
+        """
+        Crea el pool a partir de SERGE_BACKENDS, o devuelve None si no está definida.
+
+        Formato: 'url|modelo|n_threads' separados por comas, por ejemplo
+        'http://192.168.68.24:8008|Mixtral-8X7B-Instruct-v0_1|42,http://192.168.68.25:8008|Zephyr-7B-Beta|28'.
+        El modelo y los hilos son opcionales.
+        """
+        definicion = os.environ.get('SERGE_BACKENDS')
+        if not definicion:
+            return None
+        backends = []
+        for entrada in definicion.split(','):
+            partes = entrada.strip().split('|')
+            parametros = {'url_base': partes[0]}
+            if len(partes) > 1 and partes[1]:
+                parametros['modelo'] = partes[1]
+            if len(partes) > 2 and partes[2]:
+                parametros['n_threads'] = int(partes[2])
+            backends.append(Backend(ConfiguracionSerge(**parametros)))
+        return cls(backends, **valores)
+
+    def capacidad(self):
+        # Preguntas que el pool puede atender a la vez
+        return sum(backend.chats_paralelos for backend in self.backends)
+
+    def descripcion(self):
+        # Modelos y parámetros de todos los backends (para la clave de la caché)
+        parametros = sorted((backend.configuracion.modelo, sorted(backend.configuracion.parametros_chat().items()))
+                            for backend in self.backends)
+        return '+'.join(modelo for modelo, _ in parametros), parametros
+
+    def _orden(self, backend):
+        latencia = backend.latencia_media or 0.0
+        if self.criterio == 'latencia':
+            return (latencia, backend.en_curso)
+        return (backend.en_curso, latencia)
+
+    def _elegir(self, excluidos):
+        # Elegir un backend sano y con chat disponible; si todos están retirados, el que vuelve antes
+        ahora = time.monotonic()
+        candidatos = [backend for backend in self.backends if backend not in excluidos]
+        sanos = [backend for backend in candidatos if backend.sano(ahora)]
+        if not sanos and candidatos:
+            sanos = [min(candidatos, key=lambda backend: backend.fuera_hasta)]
+        disponibles = [backend for backend in sanos if backend.disponible()]
+        if not disponibles:
+            return None
+        return min(disponibles, key=self._orden)
+
+    @contextmanager
+    def reservar(self):
+        """
+        Reserva un backend y uno de sus chats durante una pregunta.
+
+        Mide la latencia y cuenta como fallo cualquier 'ErrorSerge'; si la pregunta
+        se abandona por otro motivo (p. ej. el consumidor deja de leer la
+        respuesta) el chat se libera sin contar nada. Si un backend no puede crear
+        su chat se prueba con el siguiente.
+        """
+        excluidos = set()
+        while True:
+            backend, chat_id = self._reservar_chat(excluidos)
+            if chat_id is not None:
+                break
+            excluidos.add(backend)
+
+        inicio = time.monotonic()
+        latencia, fallo = None, False
+        try:
+            yield Reserva(backend, chat_id)
+            latencia = time.monotonic() - inicio
+        except ErrorSerge:
+            fallo = True
+            raise
+        finally:
+            self._liberar(backend, chat_id, latencia, fallo)
+
+    def _reservar_chat(self, excluidos):
+        limite = time.monotonic() + self.espera_maxima
+        with self._condicion:
+            while True:
+                backend = self._elegir(excluidos)
+                if backend is not None:
+                    break
+                if len(excluidos) >= len(self.backends):
+                    raise ErrorSinBackends("Ningún backend de Serge está disponible")
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    raise ErrorSinBackends("Tiempo de espera agotado esperando un chat libre")
+                self._condicion.wait(restante)
+
+            backend.en_curso += 1
+            if backend.chats_libres:
+                return backend, backend.chats_libres.pop()
+            backend.creando += 1
+
+        # Crear el chat fuera del lock para no bloquear al resto de preguntas
+        try:
+            chat_id = backend.cliente.crear_chat()
+        except ErrorSerge as e:
+            print(f"No se pudo crear un chat en {backend.nombre}: {e}")
+            with self._condicion:
+                backend.creando -= 1
+                backend.en_curso -= 1
+                self._registrar_fallo(backend)
+                self._condicion.notify_all()
+            return backend, None
+
+        with self._condicion:
+            backend.creando -= 1
+            backend.chat_ids.append(chat_id)
+        return backend, chat_id
+
+    def _liberar(self, backend, chat_id, latencia=None, fallo=False):
+        with self._condicion:
+            backend.en_curso -= 1
+            backend.chats_libres.append(chat_id)
+            if fallo:
+                self._registrar_fallo(backend)
+            elif latencia is not None:
+                backend.fallos_seguidos = 0
+                backend.fuera_hasta = 0.0
+                if backend.latencia_media is None:
+                    backend.latencia_media = latencia
+                else:
+                    backend.latencia_media += self.suavizado * (latencia - backend.latencia_media)
+            self._condicion.notify_all()
+
+    def _registrar_fallo(self, backend):
+        backend.fallos_seguidos += 1
+        if backend.fallos_seguidos >= self.fallos_para_retirar:
+            backend.fuera_hasta = time.monotonic() + self.tiempo_retiro
+            print(f"Backend {backend.nombre} retirado durante {self.tiempo_retiro} segundos.")
+
+    def cerrar(self):
+        for backend in self.backends:
+            backend.cliente.cerrar()
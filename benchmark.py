@@ -0,0 +1,475 @@
+"""
+Banco de pruebas sin conexión para el ciclo de entrenamiento.
+
+Levanta un servidor local que imita la API de Serge ('/api/chat/' y
+'/api/chat/{id}/question' con eventos SSE, comentarios ': ping' y
+'event: close'), con latencia y tamaño de respuesta configurables, y ejecuta
+sobre él las etapas del ciclo: iniciar_aprendizaje, auto_extension_codigo,
+aprender_autonomamente, clean_response, ajustar_formato, escanear_codigo y
+guardar_cerebro. Informa del tiempo de cada etapa y de cada época, del
+crecimiento de memoria a lo largo de las épocas (tracemalloc) y del
+rendimiento, y guarda una línea base para comparar ejecuciones posteriores.
+Con '--servidores N' levanta N servidores simulados (el servidor i tarda
+'latencia * i') y reparte las preguntas entre ellos con 'PoolBackends'.
+
+Uso:
+    python benchmark.py --epocas 10 --latencia 0.05 --tamano 2000
+    python benchmark.py --servidores 3 --criterio latencia
+    python benchmark.py --guardar-base      # guardar la línea base
+    python benchmark.py                     # comparar con la línea base guardada
+"""
+
+import argparse
+import contextlib
+import datetime
+import gc
+import io
+import itertools
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from almacen_cerebro import AlmacenCerebro, escribir_atomico
+from balanceador import Backend, PoolBackends
+from corpus_codigo import CorpusCodigo
+from homero import RedNeuronal
+from transporte import ClienteSerge, ConfiguracionSerge
+
+
+RUTA_BASE = 'benchmark_base.json'
+
+# Plantilla de la respuesta simulada: prosa y un bloque de código. Sin cabeceras '### X:', que
+# la limpieza descarta hasta el siguiente '#' y dejarían la respuesta sin 'code' ni 'suggestions'
+PLANTILLA_RESPUESTA = """Here is some code with suggestions to improve the network.
+```python
+def {funcion}_{n}({entradas}, {pesos}, {sesgo}=0.0):
+    \"\"\"Aplica una capa densa.\"\"\"
+    {salida} = []
+    for i in range(len({pesos})):
+        {acumulado} = {sesgo}
+        for x, w in zip({entradas}, {pesos}[i]):
+            {acumulado} += x * w
+        {salida}.append(max(0.0, {acumulado}))
+    return {salida}
+```
+"""
+# Nombres de la plantilla: cada respuesta los elige al azar para que no se repita ni se parezca
+# a las anteriores (el ciclo descarta los fragmentos repetidos y casi repetidos)
+RAICES_NOMBRES = ('capa', 'peso', 'entrada', 'salida', 'sesgo', 'gradiente', 'error', 'tasa', 'lote', 'valor',
+                  'suma', 'media', 'norma', 'paso', 'factor', 'estado', 'senal', 'filtro', 'escala', 'umbral')
+
+
+def generar_respuesta(tamano, semilla=0):
+    # Texto determinista (para cada semilla) de unos 'tamano' caracteres con uno o más bloques de código
+    aleatorio = random.Random(semilla)
+    partes = []
+    longitud = 0
+    n = 0
+    while longitud < tamano:
+        nombres = {campo: '_'.join(aleatorio.sample(RAICES_NOMBRES, 2))
+                   for campo in ('funcion', 'entradas', 'pesos', 'sesgo', 'salida', 'acumulado')}
+        parte = PLANTILLA_RESPUESTA.format(n=n, **nombres)
+        partes.append(parte)
+        longitud += len(parte)
+        n += 1
+    return ''.join(partes)
+
+
+def evento_sse(token):
+    # Un evento 'message' por token; los saltos de línea van en varias líneas 'data:'
+    return 'event: message\r\n' + ''.join(f"data: {linea}\r\n" for linea in token.split('\n')) + '\r\n'
+
+
+def ping_sse():
+    return f": ping - {datetime.datetime.now():%Y-%m-%d %H:%M:%S.%f}\r\n\r\n"
+
+
+class ServidorSergeSimulado:
+    """
+    Servidor HTTP local que responde como Serge, para medir sin un servidor real.
+
+    'latencia' es la espera hasta el primer token y 'latencia_token' la espera
+    por token; los tokens se envían en trozos de 'tokens_por_trozo' con un
+    ': ping' cada 'ping_cada' trozos.
+    """
+
+    def __init__(self, latencia=0.05, latencia_token=0.0, tamano_respuesta=1500, tokens_por_trozo=8,
+                 ping_cada=16, puerto=0):
+        self.latencia = latencia
+        self.latencia_token = latencia_token
+        self.tamano_respuesta = tamano_respuesta
+        self.tokens_por_trozo = tokens_por_trozo
+        self.ping_cada = ping_cada
+        self.chats_creados = 0
+        self.preguntas = 0
+        self.bytes_enviados = 0
+        self._semillas = itertools.count(1)
+        self._lock = threading.Lock()
+        self._servidor = _ServidorHTTP(('127.0.0.1', puerto), self._manejador())
+        self._hilo = None
+
+    @property
+    def url(self):
+        host, puerto = self._servidor.server_address[:2]
+        return f"http://{host}:{puerto}"
+
+    def respuesta(self):
+        # Cada solicitud recibe una respuesta nueva, como las de un modelo con muestreo: con una
+        # respuesta fija el ciclo rechaza casi todo como repetido y el corpus no crece
+        return generar_respuesta(self.tamano_respuesta, semilla=next(self._semillas))
+
+    def tokens(self):
+        return re.findall(r'\s*\S+|\s+', self.respuesta())
+
+    def respuesta_cruda(self):
+        # Cuerpo SSE completo, como lo recibe 'enviar_pregunta_al_modelo' sin streaming
+        return ping_sse() + ''.join(evento_sse(token) for token in self.tokens()) + 'event: close\r\ndata: \r\n\r\n'
+
+    def _manejador(self):
+        servidor = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                if not self.path.startswith('/api/chat/'):
+                    return self._responder(404, b'"Not found"')
+                with servidor._lock:
+                    servidor.chats_creados += 1
+                    chat_id = f"chat-{servidor.chats_creados}"
+                self._responder(200, json.dumps(chat_id).encode())
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                partes = url.path.strip('/').split('/')
+                if len(partes) != 4 or partes[:2] != ['api', 'chat'] or partes[3] != 'question':
+                    return self._responder(404, b'"Not found"')
+                with servidor._lock:
+                    servidor.preguntas += 1
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                try:
+                    time.sleep(servidor.latencia)
+                    self._trozo(ping_sse())
+                    tokens = servidor.tokens()
+                    for numero, inicio in enumerate(range(0, len(tokens), servidor.tokens_por_trozo), 1):
+                        trozo = tokens[inicio:inicio + servidor.tokens_por_trozo]
+                        if servidor.latencia_token:
+                            time.sleep(servidor.latencia_token * len(trozo))
+                        texto = ''.join(evento_sse(token) for token in trozo)
+                        if numero % servidor.ping_cada == 0:
+                            texto += ping_sse()
+                        self._trozo(texto)
+                    self._trozo('event: close\r\ndata: \r\n\r\n')
+                    self.wfile.write(b'0\r\n\r\n')
+                except (BrokenPipeError, ConnectionResetError):
+                    # El cliente cortó la generación (condición de parada)
+                    self.close_connection = True
+
+            def _trozo(self, texto):
+                datos = texto.encode('utf-8')
+                self.wfile.write(f"{len(datos):x}\r\n".encode() + datos + b'\r\n')
+                with servidor._lock:
+                    servidor.bytes_enviados += len(datos)
+
+            def _responder(self, codigo, cuerpo):
+                self.send_response(codigo)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(cuerpo)))
+                self.end_headers()
+                self.wfile.write(cuerpo)
+
+            def log_message(self, formato, *args):
+                pass
+
+        return Manejador
+
+    def iniciar(self):
+        self._hilo = threading.Thread(target=self._servidor.serve_forever, name='serge-simulado', daemon=True)
+        self._hilo.start()
+        return self
+
+    def detener(self):
+        self._servidor.shutdown()
+        self._servidor.server_close()
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *excepcion):
+        self.detener()
+
+
+class _ServidorHTTP(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Los clientes que cortan la generación cierran la conexión: no es un error del servidor
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class Cronometro:
+    """
+    Acumula la duración de cada ejecución de cada etapa.
+    """
+
+    def __init__(self):
+        self.tiempos = {}
+
+    @contextlib.contextmanager
+    def medir(self, etapa):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.tiempos.setdefault(etapa, []).append(time.perf_counter() - inicio)
+
+    def resumen(self):
+        return {etapa: resumir_tiempos(tiempos) for etapa, tiempos in self.tiempos.items()}
+
+
+def resumir_tiempos(tiempos):
+    ordenados = sorted(tiempos)
+    return {
+        'n': len(ordenados),
+        'total': sum(ordenados),
+        'media': statistics.fmean(ordenados),
+        'p50': ordenados[len(ordenados) // 2],
+        'p95': ordenados[min(len(ordenados) - 1, int(len(ordenados) * 0.95))],
+        'max': ordenados[-1],
+    }
+
+
+def ejecutar_benchmark(epocas=5, latencia=0.05, latencia_token=0.0, tamano_respuesta=1500, transmitir=False,
+                       max_concurrencia=4, medir_memoria=True, semilla=0, mostrar_salida=False, servidores=1,
+                       criterio='pendientes'):
+    """
+    Ejecuta el ciclo de entrenamiento contra el servidor simulado y devuelve las mediciones.
+
+    Con 'servidores' > 1 las preguntas pasan por un 'PoolBackends' (con el
+    'criterio' de enrutado dado) sobre varios servidores simulados, cada uno
+    más lento que el anterior. Todo lo que escribe el ciclo (corpus y cerebro)
+    va a un directorio temporal.
+    """
+    random.seed(semilla)
+    configuracion = {
+        'epocas': epocas, 'latencia': latencia, 'latencia_token': latencia_token,
+        'tamano_respuesta': tamano_respuesta, 'transmitir': transmitir, 'max_concurrencia': max_concurrencia,
+        'medir_memoria': medir_memoria,  # tracemalloc ralentiza todas las etapas
+        'respuestas_distintas': True,  # las líneas base anteriores medían siempre la misma respuesta
+    }
+    if servidores > 1:
+        configuracion.update(servidores=servidores, criterio=criterio)
+    cronometro = Cronometro()
+    duraciones_epoca = []
+    memoria_epoca = []
+    salida = contextlib.nullcontext() if mostrar_salida else contextlib.redirect_stdout(io.StringIO())
+
+    with tempfile.TemporaryDirectory() as directorio, contextlib.ExitStack() as pila, salida:
+        simulados = [pila.enter_context(ServidorSergeSimulado(latencia * numero, latencia_token, tamano_respuesta))
+                     for numero in range(1, servidores + 1)]
+        servidor = simulados[0]
+        red = RedNeuronal('', cliente=ClienteSerge(ConfiguracionSerge(url_base=servidor.url, reintentos=0)),
+                          almacen=AlmacenCerebro(os.path.join(directorio, 'cerebro')))
+        red.corpus = CorpusCodigo(os.path.join(directorio, 'codigo_actual.txt'))
+        red.transmitir = transmitir
+        red.max_concurrencia = red.chats_paralelos = max_concurrencia
+        if servidores > 1:
+            red.pool = PoolBackends([Backend(ConfiguracionSerge(url_base=simulado.url, reintentos=0),
+                                             chats_paralelos=max(1, max_concurrencia // servidores))
+                                     for simulado in simulados], criterio=criterio)
+
+        if medir_memoria:
+            gc.collect()
+            tracemalloc.start()
+        inicio = time.perf_counter()
+
+        if red.pool is None:
+            with cronometro.medir('obtener_chat_id'):
+                red.obtener_chat_id()
+        with cronometro.medir('iniciar_aprendizaje'):
+            red.iniciar_aprendizaje()
+
+        for _ in range(epocas):
+            inicio_epoca = time.perf_counter()
+            with cronometro.medir('auto_extension_codigo'):
+                red.auto_extension_codigo()
+            with cronometro.medir('aprender_autonomamente'):
+                red.aprender_autonomamente()
+
+            # Etapas de procesamiento por separado, cada época sobre respuestas nuevas como las del ciclo
+            # (formatear siempre el mismo texto sólo mediría aciertos de la memoria del formateador)
+            with cronometro.medir('clean_response'):
+                respuesta = red.clean_response(servidor.respuesta_cruda())
+            with cronometro.medir('ajustar_formato'):
+                fragmento = red.ajustar_formato(servidor.respuesta())
+            with cronometro.medir('escanear_codigo'):
+                red.escanear_codigo(fragmento, red.corpus.lineas())
+
+            red.epoca += 1
+            with cronometro.medir('guardar_cerebro'):
+                red.guardar_cerebro()
+            duraciones_epoca.append(time.perf_counter() - inicio_epoca)
+
+            if medir_memoria:
+                gc.collect()
+                memoria_epoca.append(tracemalloc.get_traced_memory()[0])
+
+        duracion = time.perf_counter() - inicio
+        pico_memoria = None
+        if medir_memoria:
+            pico_memoria = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        if red._despachador is not None:
+            red._despachador.cerrar()
+        red.cliente.cerrar()
+        if red.pool is not None:
+            red.pool.cerrar()
+
+        preguntas = sum(simulado.preguntas for simulado in simulados)
+
+        resultados = {
+            'configuracion': configuracion,
+            'etapas': cronometro.resumen(),
+            'epocas': {**resumir_tiempos(duraciones_epoca), 'duraciones': duraciones_epoca},
+            'rendimiento': {
+                'duracion': duracion,
+                'preguntas': preguntas,
+                'preguntas_por_segundo': preguntas / duracion,
+                'epocas_por_minuto': 60 * epocas / duracion,
+                'bytes_recibidos_por_segundo': sum(simulado.bytes_enviados for simulado in simulados) / duracion,
+                'chats_creados': sum(simulado.chats_creados for simulado in simulados),
+                'fragmentos_corpus': len(red.corpus),
+                'bytes_corpus': red.corpus.tamano(),
+                'longitud_respuesta_limpia': len(respuesta),
+            },
+            'metricas': red.metricas.instantanea(),
+        }
+        if red.pool is not None:
+            resultados['servidores'] = [{'url': simulado.url, 'latencia': simulado.latencia,
+                                         'preguntas': simulado.preguntas, 'chats_creados': simulado.chats_creados}
+                                        for simulado in simulados]
+    if medir_memoria:
+        resultados['memoria'] = {
+            'por_epoca': memoria_epoca,
+            'crecimiento': memoria_epoca[-1] - memoria_epoca[0] if memoria_epoca else 0,
+            'crecimiento_por_epoca': ((memoria_epoca[-1] - memoria_epoca[0]) / (len(memoria_epoca) - 1)
+                                      if len(memoria_epoca) > 1 else 0),
+            'pico': pico_memoria,
+        }
+    return resultados
+
+
+def comparar(resultados, base, tolerancia=0.25, minimo=0.002):
+    """
+    Devuelve las etapas cuya media empeoró más de 'tolerancia' respecto a la línea base.
+
+    Cada elemento es (etapa, media base, media actual). Las diferencias de menos
+    de 'minimo' segundos se consideran ruido. Sólo se comparan ejecuciones con la
+    misma configuración; si no coincide se devuelve None.
+    """
+    if base.get('configuracion') != resultados['configuracion']:
+        return None
+    regresiones = []
+    etapas_base = dict(base['etapas'], epoca=base['epocas'])
+    etapas = dict(resultados['etapas'], epoca=resultados['epocas'])
+    for etapa, medida in etapas.items():
+        if etapa not in etapas_base:
+            continue
+        media_base = etapas_base[etapa]['media']
+        if medida['media'] > media_base * (1 + tolerancia) and medida['media'] - media_base > minimo:
+            regresiones.append((etapa, media_base, medida['media']))
+    return regresiones
+
+
+def formatear(resultados, base=None):
+    # Tabla de texto con las etapas y, si hay línea base, la variación de cada una
+    etapas_base = {}
+    if base is not None:
+        etapas_base = dict(base['etapas'], epoca=base['epocas'])
+    lineas = [f"{'etapa':<24}{'n':>5}{'media ms':>12}{'p95 ms':>12}{'total s':>10}{'vs base':>10}"]
+    for etapa, medida in dict(resultados['etapas'], epoca=resultados['epocas']).items():
+        variacion = ''
+        if etapa in etapas_base and etapas_base[etapa]['media'] > 0:
+            variacion = f"{medida['media'] / etapas_base[etapa]['media'] - 1:+.0%}"
+        lineas.append(f"{etapa:<24}{medida['n']:>5}{medida['media'] * 1000:>12.2f}"
+                      f"{medida['p95'] * 1000:>12.2f}{medida['total']:>10.3f}{variacion:>10}")
+
+    rendimiento = resultados['rendimiento']
+    lineas.append(f"\nDuración: {rendimiento['duracion']:.2f} s, {rendimiento['preguntas']} preguntas "
+                  f"({rendimiento['preguntas_por_segundo']:.1f}/s), {rendimiento['epocas_por_minuto']:.1f} épocas/min, "
+                  f"{rendimiento['bytes_recibidos_por_segundo'] / 1024:.0f} KiB/s recibidos")
+    if 'memoria' in resultados:
+        memoria = resultados['memoria']
+        lineas.append(f"Memoria: crecimiento {memoria['crecimiento'] / 1024:.1f} KiB "
+                      f"({memoria['crecimiento_por_epoca'] / 1024:.1f} KiB/época), pico {memoria['pico'] / 1024:.0f} KiB")
+    for numero, servidor in enumerate(resultados.get('servidores', []), 1):
+        lineas.append(f"Servidor {numero} ({servidor['latencia'] * 1000:.0f} ms): {servidor['preguntas']} preguntas, "
+                      f"{servidor['chats_creados']} chats")
+    return '\n'.join(lineas)
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Mide el ciclo de entrenamiento contra un servidor Serge simulado.")
+    parser.add_argument('--epocas', type=int, default=5)
+    parser.add_argument('--latencia', type=float, default=0.05, help="segundos hasta el primer token")
+    parser.add_argument('--latencia-token', type=float, default=0.0, help="segundos por token")
+    parser.add_argument('--tamano', type=int, default=1500, help="caracteres por respuesta")
+    parser.add_argument('--transmitir', action='store_true', help="leer las respuestas en modo streaming")
+    parser.add_argument('--concurrencia', type=int, default=4)
+    parser.add_argument('--servidores', type=int, default=1, help="servidores simulados detrás de un PoolBackends")
+    parser.add_argument('--criterio', choices=('pendientes', 'latencia'), default='pendientes',
+                        help="enrutado del pool con varios servidores")
+    parser.add_argument('--sin-memoria', action='store_true', help="no medir memoria (tracemalloc ralentiza)")
+    parser.add_argument('--base', default=RUTA_BASE, help="archivo de la línea base")
+    parser.add_argument('--guardar-base', action='store_true', help="guardar estos resultados como línea base")
+    parser.add_argument('--tolerancia', type=float, default=0.25, help="empeoramiento admitido frente a la base")
+    parser.add_argument('--salida', help="guardar los resultados completos en este archivo JSON")
+    parser.add_argument('--verboso', action='store_true', help="mostrar la salida del ciclo")
+    opciones = parser.parse_args(argumentos)
+
+    resultados = ejecutar_benchmark(opciones.epocas, opciones.latencia, opciones.latencia_token, opciones.tamano,
+                                    opciones.transmitir, opciones.concurrencia, not opciones.sin_memoria,
+                                    mostrar_salida=opciones.verboso, servidores=opciones.servidores,
+                                    criterio=opciones.criterio)
+
+    base = None
+    if not opciones.guardar_base and os.path.exists(opciones.base):
+        with open(opciones.base, encoding='utf-8') as archivo:
+            base = json.load(archivo)
+    regresiones = comparar(resultados, base, opciones.tolerancia) if base is not None else None
+    if regresiones is None and base is not None:
+        print("La línea base se midió con otra configuración; no se compara.")
+        base = None
+    print(formatear(resultados, base))
+
+    contenido = json.dumps(resultados, indent=2, ensure_ascii=False)
+    if opciones.salida:
+        escribir_atomico(opciones.salida, contenido)
+    if opciones.guardar_base:
+        escribir_atomico(opciones.base, contenido)
+        print(f"Línea base guardada en {opciones.base}")
+    elif regresiones:
+        print("\nRegresiones frente a la línea base:")
+        for etapa, media_base, media in regresiones:
+            print(f"  {etapa}: {media_base * 1000:.2f} ms -> {media * 1000:.2f} ms")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
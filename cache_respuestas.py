@@ -0,0 +1,130 @@
+"""
+Caché persistente de respuestas del modelo de lenguaje.
+
+Las preguntas automáticas salen de listas fijas, así que a lo largo de una
+ejecución larga se repiten miles de veces. Esta caché guarda cada respuesta
+con una clave que combina modelo, parámetros de muestreo, contexto y pregunta:
+una capa LRU en memoria delante de un almacén SQLite que sobrevive a los
+reinicios, con caducidad (TTL) y límite de tamaño en disco.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from diferido import ModuloDiferido
+
+# La caché es opcional (CACHE_RESPUESTAS): sqlite3 sólo se importa al abrir la base de datos
+sqlite3 = ModuloDiferido('sqlite3')
+
+
+class CacheRespuestas:
+    """
+    Caché LRU en memoria respaldada por SQLite.
+    """
+
+    def __init__(self, ruta='respuestas_cache.db', capacidad_memoria=256, max_bytes_disco=64 * 1024 * 1024,
+                 ttl=7 * 24 * 3600):
+        self.ruta = ruta
+        self.capacidad_memoria = capacidad_memoria
+        self.max_bytes_disco = max_bytes_disco
+        self.ttl = ttl
+        self.aciertos = 0
+        self.fallos = 0
+        self._memoria = OrderedDict()  # clave -> (creado, respuesta)
+        self._lock = threading.Lock()
+        self._conexion = None
+        self._escrituras = 0
+
+    @staticmethod
+    def clave(modelo, parametros, contexto, pregunta):
+        # Clave estable a partir de todo lo que determina la respuesta
+        contenido = json.dumps([modelo, parametros, contexto, pregunta], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+    @property
+    def conexion(self):
+        # Abrir la base de datos en el primer uso (los hilos la comparten bajo el lock)
+        if self._conexion is None:
+            self._conexion = sqlite3.connect(self.ruta, check_same_thread=False)
+            self._conexion.execute(
+                "CREATE TABLE IF NOT EXISTS respuestas ("
+                "clave TEXT PRIMARY KEY, respuesta TEXT NOT NULL, creado REAL NOT NULL, ultimo_uso REAL NOT NULL)")
+            self._conexion.execute("CREATE INDEX IF NOT EXISTS idx_ultimo_uso ON respuestas (ultimo_uso)")
+            self._conexion.commit()
+        return self._conexion
+
+    def obtener(self, clave):
+        """
+        Devuelve la respuesta guardada para la clave, o None si no existe o ha caducado.
+        """
+        ahora = time.time()
+        with self._lock:
+            entrada = self._memoria.get(clave)
+            if entrada is not None:
+                creado, respuesta = entrada
+                if ahora - creado <= self.ttl:
+                    self._memoria.move_to_end(clave)
+                    self.aciertos += 1
+                    return respuesta
+                del self._memoria[clave]
+
+            fila = self.conexion.execute(
+                "SELECT respuesta, creado FROM respuestas WHERE clave = ?", (clave,)).fetchone()
+            if fila is None or ahora - fila[1] > self.ttl:
+                self.fallos += 1
+                return None
+
+            respuesta, creado = fila
+            self.conexion.execute("UPDATE respuestas SET ultimo_uso = ? WHERE clave = ?", (ahora, clave))
+            self.conexion.commit()
+            self._recordar(clave, creado, respuesta)
+            self.aciertos += 1
+            return respuesta
+
+    def guardar(self, clave, respuesta):
+        ahora = time.time()
+        with self._lock:
+            self._recordar(clave, ahora, respuesta)
+            self.conexion.execute(
+                "INSERT OR REPLACE INTO respuestas (clave, respuesta, creado, ultimo_uso) VALUES (?, ?, ?, ?)",
+                (clave, respuesta, ahora, ahora))
+            self.conexion.commit()
+            self._escrituras += 1
+            if self._escrituras % 50 == 0:
+                self._evictar_disco(ahora)
+
+    def _recordar(self, clave, creado, respuesta):
+        # Insertar en la capa de memoria y expulsar la entrada menos usada
+        self._memoria[clave] = (creado, respuesta)
+        self._memoria.move_to_end(clave)
+        while len(self._memoria) > self.capacidad_memoria:
+            self._memoria.popitem(last=False)
+
+    def _evictar_disco(self, ahora):
+        # Borrar lo caducado y, si se supera el tamaño máximo, lo usado hace más tiempo
+        self.conexion.execute("DELETE FROM respuestas WHERE creado < ?", (ahora - self.ttl,))
+        tamano, = self.conexion.execute("SELECT COALESCE(SUM(LENGTH(respuesta)), 0) FROM respuestas").fetchone()
+        while tamano > self.max_bytes_disco:
+            borradas = self.conexion.execute(
+                "DELETE FROM respuestas WHERE clave IN "
+                "(SELECT clave FROM respuestas ORDER BY ultimo_uso LIMIT 20)").rowcount
+            if not borradas:
+                break
+            tamano, = self.conexion.execute(
+                "SELECT COALESCE(SUM(LENGTH(respuesta)), 0) FROM respuestas").fetchone()
+        self.conexion.commit()
+
+    def limpiar(self):
+        with self._lock:
+            self._memoria.clear()
+            self.conexion.execute("DELETE FROM respuestas")
+            self.conexion.commit()
+
+    def cerrar(self):
+        with self._lock:
+            if self._conexion is not None:
+                self._conexion.close()
+                self._conexion = None
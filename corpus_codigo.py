@@ -0,0 +1,200 @@
+"""
+Almacén segmentado y de sólo escritura al final para el código acumulado.
+
+Cada fragmento aceptado se escribe una única vez al final de
+'codigo_actual.txt' y se registra en un índice ('codigo_actual.txt.idx', una
+línea JSON por fragmento) con su desplazamiento, longitud, época, pregunta de
+origen y hash. Nada se lee al crear el corpus: el índice se carga en el
+primer uso y los fragmentos se leen de una proyección en memoria (mmap) del
+archivo, de modo que arrancar no cuesta más con un corpus más grande. El texto
+completo sólo se compone cuando alguien lo pide.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import threading
+import time
+from collections import namedtuple
+
+
+# 'lineas' (saltos de línea del fragmento) puede faltar en índices antiguos
+FragmentoCodigo = namedtuple('FragmentoCodigo', ['desplazamiento', 'longitud', 'epoca', 'pregunta', 'hash', 'fecha', 'lineas'],
+                             defaults=(None,))
+
+
+def recortar_linea_cortada(ruta):
+    """
+    Corta un archivo de líneas (JSON Lines) tras su último salto de línea y devuelve los bytes quitados.
+
+    Una escritura interrumpida puede dejar la última línea a medias; si se
+    añadiera detrás, la línea siguiente quedaría pegada a ella y no se podría leer.
+    """
+    if not os.path.exists(ruta):
+        return 0
+    with open(ruta, 'rb+') as archivo:
+        tamano = archivo.seek(0, os.SEEK_END)
+        corte = fin = tamano
+        # Buscar el último '\n' leyendo hacia atrás por bloques
+        while fin > 0:
+            inicio = max(0, fin - (1 << 16))
+            archivo.seek(inicio)
+            posicion = archivo.read(fin - inicio).rfind(b'\n')
+            if posicion != -1:
+                corte = inicio + posicion + 1
+                break
+            fin = inicio
+        else:
+            corte = 0
+        if corte < tamano:
+            archivo.truncate(corte)
+    return tamano - corte
+
+
+class CorpusCodigo:
+    """
+    Fragmentos de código indexados sobre un único archivo de datos.
+    """
+
+    def __init__(self, ruta='codigo_actual.txt', ruta_indice=None):
+        self.ruta = ruta
+        self.ruta_indice = ruta_indice or ruta + '.idx'
+        self._fragmentos = None
+        self._texto = None
+        self._lineas = None
+        self._mapa = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Sólo se guardan las rutas; índice y texto se vuelven a leer del disco
+        return {'ruta': self.ruta, 'ruta_indice': self.ruta_indice}
+
+    def __setstate__(self, estado):
+        self.__init__(estado['ruta'], estado['ruta_indice'])
+
+    @property
+    def fragmentos(self):
+        if self._fragmentos is None:
+            with self._lock:
+                if self._fragmentos is None:
+                    self._fragmentos = self._cargar_indice()
+        return self._fragmentos
+
+    def _cargar_indice(self):
+        fragmentos = []
+        if os.path.exists(self.ruta_indice):
+            # Quitar la línea que dejó a medias un corte, o las siguientes se pegarían a ella
+            recortar_linea_cortada(self.ruta_indice)
+            with open(self.ruta_indice, encoding='utf-8') as archivo:
+                for linea in archivo:
+                    try:
+                        fragmentos.append(FragmentoCodigo(**json.loads(linea)))
+                    except (ValueError, TypeError):
+                        continue  # Línea dañada: se pierde ese fragmento, no los siguientes
+        elif os.path.exists(self.ruta) and os.path.getsize(self.ruta) > 0:
+            # Archivo anterior al índice: tratar su contenido como un único fragmento
+            resumen, lineas = self._resumir_archivo()
+            fragmento = FragmentoCodigo(0, os.path.getsize(self.ruta), None, 'legado', resumen, time.time(), lineas)
+            self._escribir_indice(fragmento)
+            fragmentos.append(fragmento)
+        return fragmentos
+
+    def _resumir_archivo(self):
+        # Hash y número de líneas del archivo, leyéndolo por bloques
+        resumen = hashlib.sha1()
+        lineas = 0
+        with open(self.ruta, 'rb') as archivo:
+            for bloque in iter(lambda: archivo.read(1 << 16), b''):
+                resumen.update(bloque)
+                lineas += bloque.count(b'\n')
+        return resumen.hexdigest(), lineas
+
+    def _escribir_indice(self, fragmento):
+        with open(self.ruta_indice, 'a', encoding='utf-8') as archivo:
+            archivo.write(json.dumps(fragmento._asdict(), ensure_ascii=False) + '\n')
+
+    def agregar(self, texto, epoca=None, pregunta=None):
+        """
+        Añade un fragmento al final del archivo y lo registra en el índice.
+        """
+        datos = texto.encode('utf-8')
+        fragmentos = self.fragmentos
+        with self._lock:
+            with open(self.ruta, 'ab') as archivo:
+                desplazamiento = archivo.tell()
+                archivo.write(datos)
+            fragmento = FragmentoCodigo(desplazamiento, len(datos), epoca, pregunta,
+                                        hashlib.sha1(datos).hexdigest(), time.time(), texto.count('\n'))
+            self._escribir_indice(fragmento)
+            fragmentos.append(fragmento)
+            if self._texto is not None:
+                self._texto += texto
+            if self._lineas is not None:
+                self._lineas += fragmento.lineas
+        return fragmento
+
+    def _proyeccion(self, hasta):
+        # mmap de sólo lectura del archivo; se rehace cuando crece más allá de lo proyectado
+        if self._mapa is None or len(self._mapa) < hasta:
+            if self._mapa is not None:
+                self._mapa.close()
+                self._mapa = None
+            with open(self.ruta, 'rb') as archivo:
+                if os.fstat(archivo.fileno()).st_size == 0:
+                    return b''
+                self._mapa = mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mapa
+
+    def _bytes(self, fragmento):
+        with self._lock:
+            fin = fragmento.desplazamiento + fragmento.longitud
+            return self._proyeccion(fin)[fragmento.desplazamiento:fin]
+
+    def leer(self, fragmento):
+        # Leer un único fragmento sin cargar el resto del archivo
+        return self._bytes(fragmento).decode('utf-8', errors='replace')
+
+    def iterar(self, desde=0):
+        """
+        Genera (fragmento, texto) desde el fragmento 'desde', leyendo cada uno al pedirlo.
+        """
+        for fragmento in self.fragmentos[desde:]:
+            yield fragmento, self.leer(fragmento)
+
+    def texto(self):
+        """
+        Devuelve el código completo, componiéndolo la primera vez que se pide.
+        """
+        fragmentos = self.fragmentos
+        with self._lock:
+            if self._texto is None:
+                if not fragmentos:
+                    self._texto = ''
+                else:
+                    datos = self._proyeccion(max(f.desplazamiento + f.longitud for f in fragmentos))
+                    # El índice manda: se ignoran bytes de escrituras que no llegaron a indexarse
+                    self._texto = ''.join(datos[f.desplazamiento:f.desplazamiento + f.longitud].decode('utf-8', errors='replace')
+                                          for f in fragmentos)
+            return self._texto
+
+    def lineas(self):
+        # Número de líneas del código acumulado (para numerar los hallazgos de un fragmento nuevo)
+        fragmentos = self.fragmentos
+        if self._lineas is None:
+            self._lineas = sum(fragmento.lineas if fragmento.lineas is not None else self.leer(fragmento).count('\n')
+                               for fragmento in fragmentos)
+        return self._lineas
+
+    def tamano(self):
+        # Bytes de código indexado
+        return sum(fragmento.longitud for fragmento in self.fragmentos)
+
+    def __len__(self):
+        return len(self.fragmentos)
+
+    def cerrar(self):
+        with self._lock:
+            if self._mapa is not None:
+                self._mapa.close()
+                self._mapa = None
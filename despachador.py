@@ -0,0 +1,72 @@
+"""
+Envío concurrente de preguntas independientes al modelo de lenguaje.
+
+Cada pregunta se envía desde un hilo del pool, usando uno de los chats de
+Serge disponibles (un chat sólo atiende una pregunta a la vez, para no mezclar
+conversaciones), y su respuesta se procesa en el hilo que llamó a 'ejecutar'
+en cuanto llega, sin esperar a las demás.
+"""
+
+import queue
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from transporte import ErrorSerge
+
+
+# 'procesar' recibe la respuesta limpia; 'opciones' se pasan a enviar_pregunta_al_modelo
+Tarea = namedtuple('Tarea', ['pregunta', 'procesar', 'opciones'])
+
+
+class DespachadorPreguntas:
+    """
+    Pool de hilos con límite de concurrencia que reparte las preguntas entre varios chats.
+    """
+
+    def __init__(self, enviar, chat_ids, max_concurrencia=4):
+        self.enviar = enviar
+        self.chat_ids = list(chat_ids)
+        self.max_concurrencia = max(1, min(max_concurrencia, len(self.chat_ids)))
+        self._chats_libres = queue.Queue()
+        for chat_id in self.chat_ids:
+            self._chats_libres.put(chat_id)
+        self._ejecutor = ThreadPoolExecutor(max_workers=self.max_concurrencia,
+                                            thread_name_prefix='despachador')
+
+    def _enviar(self, tarea):
+        # Reservar un chat libre durante la pregunta y devolverlo al terminar
+        chat_id = self._chats_libres.get()
+        try:
+            return self.enviar(tarea.pregunta, chat_id=chat_id, **tarea.opciones)
+        finally:
+            self._chats_libres.put(chat_id)
+
+    def despachar(self, tareas):
+        """
+        Envía todas las tareas y genera (tarea, respuesta, error) según se completan.
+        """
+        futuros = {self._ejecutor.submit(self._enviar, tarea): tarea for tarea in tareas}
+        for futuro in as_completed(futuros):
+            tarea = futuros[futuro]
+            try:
+                yield tarea, futuro.result(), None
+            except ErrorSerge as e:
+                yield tarea, None, e
+
+    def ejecutar(self, tareas):
+        """
+        Envía las tareas en paralelo y procesa cada respuesta en cuanto llega.
+
+        Devuelve una lista de (pregunta, resultado de 'procesar') en orden de llegada;
+        las preguntas que fallan se informan y se omiten.
+        """
+        resultados = []
+        for tarea, respuesta, error in self.despachar(tareas):
+            if error is not None:
+                print(f"Error en la solicitud al modelo de lenguaje: {error}")
+                continue
+            resultados.append((tarea.pregunta, tarea.procesar(respuesta)))
+        return resultados
+
+    def cerrar(self):
+        self._ejecutor.shutdown(wait=True)
@@ -0,0 +1,71 @@
+"""
+Importación diferida de módulos pesados.
+
+'requests' (con urllib3, charset_normalizer, certifi...) tarda en importarse
+más que todo el resto del programa. Los módulos que lo usan lo referencian con
+un 'ModuloDiferido', que lo importa en el primer acceso a un atributo, y
+'precargar' permite importarlo en un hilo de fondo mientras se carga el estado.
+Se anota cuánto tardó cada importación diferida en 'tiempos_importacion'.
+"""
+
+import importlib
+import sys
+import threading
+import time
+
+
+tiempos_importacion = {}
+_lock = threading.Lock()
+
+
+def importar(nombre):
+    # Importar el módulo (una sola vez) anotando cuánto tardó; si otro hilo lo está
+    # importando, 'import_module' espera a que termine en vez de devolverlo a medias
+    modulo = sys.modules.get(nombre)
+    if modulo is not None and not getattr(getattr(modulo, '__spec__', None), '_initializing', False):
+        return modulo
+    inicio = time.perf_counter()
+    modulo = importlib.import_module(nombre)
+    with _lock:
+        tiempos_importacion.setdefault(nombre, time.perf_counter() - inicio)
+    return modulo
+
+
+class ModuloDiferido:
+    """
+    Sustituto de un módulo que lo importa en el primer acceso a uno de sus atributos.
+    """
+
+    def __init__(self, nombre):
+        self._nombre = nombre
+        self._modulo = None
+
+    def cargar(self):
+        if self._modulo is None:
+            self._modulo = importar(self._nombre)
+        return self._modulo
+
+    def __getattr__(self, atributo):
+        if atributo.startswith('__'):
+            raise AttributeError(atributo)
+        return getattr(self.cargar(), atributo)
+
+    def __repr__(self):
+        estado = 'cargado' if self._modulo is not None else 'sin cargar'
+        return f"<ModuloDiferido {self._nombre!r} ({estado})>"
+
+
+def precargar(*nombres):
+    """
+    Importa los módulos en un hilo de fondo y devuelve el hilo.
+    """
+    def cargar():
+        for nombre in nombres:
+            try:
+                importar(nombre)
+            except ImportError as e:
+                print(f"No se pudo precargar {nombre}: {e}")
+
+    hilo = threading.Thread(target=cargar, name='precarga', daemon=True)
+    hilo.start()
+    return hilo
@@ -0,0 +1,215 @@
+"""
+Detección de fragmentos repetidos o casi repetidos antes de guardarlos.
+
+El modelo devuelve una y otra vez las mismas listas de mejoras con pequeños
+cambios de redacción. Cada texto se normaliza (minúsculas, sólo palabras) y
+se compara por hash (repeticiones exactas) y por MinHash sobre shingles de
+palabras (casi repeticiones), con LSH por bandas para no comparar con todos.
+
+Con 'ruta' las firmas se guardan en un archivo binario de sólo añadir (un
+registro de tamaño fijo por documento), de modo que al arrancar se leen en
+lugar de recalcular el MinHash de todo el corpus.
+"""
+
+import hashlib
+import os
+import re
+import struct
+import threading
+from array import array
+from collections import namedtuple
+
+
+PATRON_PALABRA = re.compile(r'\w+')
+PRIMO = (1 << 61) - 1
+MASCARA = (1 << 64) - 1
+MAGIA = b'HOMFIRM1'
+
+# motivo: 'exacto' o 'similar'; documento: el fragmento anterior que se parece; similitud estimada
+Duplicado = namedtuple('Duplicado', ['motivo', 'documento', 'similitud'])
+
+
+def normalizar(texto):
+    return PATRON_PALABRA.findall(texto.lower())
+
+
+def shingles(palabras, tamano=3):
+    # Secuencias de 'tamano' palabras seguidas; los textos más cortos forman un único shingle
+    if len(palabras) <= tamano:
+        return {' '.join(palabras)} if palabras else set()
+    return {' '.join(palabras[i:i + tamano]) for i in range(len(palabras) - tamano + 1)}
+
+
+def _hash64(texto):
+    return int.from_bytes(hashlib.blake2b(texto.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class DetectorDuplicados:
+    """
+    Índice de hashes exactos y firmas MinHash con LSH.
+
+    'umbral' es la similitud de Jaccard estimada a partir de la cual un texto se
+    considera casi repetido. 'permutaciones' debe ser múltiplo de 'bandas'.
+    Con 'ruta' los documentos indexados se guardan y se vuelven a cargar.
+    """
+
+    def __init__(self, umbral=0.75, permutaciones=64, bandas=16, tamano_shingle=3, semilla=1, ruta=None):
+        if permutaciones % bandas:
+            raise ValueError("'permutaciones' debe ser múltiplo de 'bandas'")
+        self.umbral = umbral
+        self.permutaciones = permutaciones
+        self.bandas = bandas
+        self.filas = permutaciones // bandas
+        self.tamano_shingle = tamano_shingle
+        self.semilla = semilla
+        self.ruta = ruta
+        generador = _Aleatorio(semilla)
+        self._coeficientes = [(generador.siguiente() % (PRIMO - 1) + 1, generador.siguiente() % PRIMO)
+                              for _ in range(permutaciones)]
+        self.hashes = {}  # hash del texto normalizado -> documento
+        self.firmas = []  # documento -> array('Q') con la firma MinHash
+        self.cubetas = {}  # (banda, valores de la banda) -> documentos
+        self._lock = threading.Lock()
+        if ruta is not None:
+            self._cargar()
+
+    def __len__(self):
+        return len(self.firmas)
+
+    def _cabecera(self):
+        # Las firmas sólo valen con las mismas permutaciones, shingles y semilla
+        return MAGIA + struct.pack('<IIQ', self.permutaciones, self.tamano_shingle, self.semilla)
+
+    def _tamano_registro(self):
+        # Indicador de firma (0 = texto sin palabras), hash sha1 y firma
+        return 1 + 20 + 8 * self.permutaciones
+
+    def _cargar(self):
+        cabecera = self._cabecera()
+        if not os.path.exists(self.ruta):
+            self.vaciar()
+            return
+        with open(self.ruta, 'rb') as archivo:
+            datos = archivo.read()
+        if not datos.startswith(cabecera):
+            print(f"Las firmas de {self.ruta} tienen otro formato; se vuelven a calcular.")
+            self.vaciar()
+            return
+        tamano = self._tamano_registro()
+        cuerpo = memoryview(datos)[len(cabecera):]
+        completos = len(cuerpo) // tamano
+        for inicio in range(0, completos * tamano, tamano):
+            registro = cuerpo[inicio:inicio + tamano]
+            firma = None
+            if registro[0]:
+                firma = array('Q')
+                firma.frombytes(registro[21:])
+            self._indexar(bytes(registro[1:21]), firma)
+        if len(cuerpo) != completos * tamano:
+            # Registro a medias por un corte: quitarlo para que los siguientes queden alineados
+            with open(self.ruta, 'rb+') as archivo:
+                archivo.truncate(len(cabecera) + completos * tamano)
+
+    def vaciar(self):
+        """
+        Olvida todos los documentos (y deja el archivo de firmas sólo con su cabecera).
+        """
+        with self._lock:
+            self.hashes, self.firmas, self.cubetas = {}, [], {}
+            if self.ruta is not None:
+                os.makedirs(os.path.dirname(self.ruta) or '.', exist_ok=True)
+                with open(self.ruta, 'wb') as archivo:
+                    archivo.write(self._cabecera())
+
+    def firma(self, palabras):
+        conjunto = shingles(palabras, self.tamano_shingle)
+        if not conjunto:
+            return None
+        valores = [_hash64(shingle) for shingle in conjunto]
+        return array('Q', (min((a * valor + b) % PRIMO for valor in valores) & MASCARA
+                           for a, b in self._coeficientes))
+
+    def _preparar(self, texto):
+        # Hash del texto normalizado y firma MinHash, calculados fuera del lock
+        palabras = normalizar(texto)
+        return hashlib.sha1(' '.join(palabras).encode('utf-8')).digest(), self.firma(palabras)
+
+    def _bandas(self, firma):
+        for banda in range(self.bandas):
+            yield banda, tuple(firma[banda * self.filas:(banda + 1) * self.filas])
+
+    def _similitud(self, firma, otra):
+        return sum(1 for a, b in zip(firma, otra) if a == b) / self.permutaciones
+
+    def buscar(self, texto):
+        """
+        Devuelve un 'Duplicado' si el texto repite (o casi) uno indexado, o None.
+        """
+        resumen, firma = self._preparar(texto)
+        with self._lock:
+            return self._buscar(resumen, firma)
+
+    def _buscar(self, resumen, firma):
+        if resumen in self.hashes:
+            return Duplicado('exacto', self.hashes[resumen], 1.0)
+        if firma is None:
+            return None
+        candidatos = set()
+        for clave in self._bandas(firma):
+            candidatos.update(self.cubetas.get(clave, ()))
+        mejor = None
+        for documento in candidatos:
+            similitud = self._similitud(firma, self.firmas[documento])
+            if similitud >= self.umbral and (mejor is None or similitud > mejor.similitud):
+                mejor = Duplicado('similar', documento, similitud)
+        return mejor
+
+    def agregar(self, texto):
+        """
+        Indexa el texto y devuelve su número de documento.
+        """
+        resumen, firma = self._preparar(texto)
+        with self._lock:
+            return self._agregar(resumen, firma)
+
+    def _agregar(self, resumen, firma):
+        documento = self._indexar(resumen, firma)
+        if self.ruta is not None:
+            registro = bytes([firma is not None]) + resumen
+            registro += (firma if firma is not None else array('Q', [0] * self.permutaciones)).tobytes()
+            with open(self.ruta, 'ab') as archivo:
+                archivo.write(registro)
+        return documento
+
+    def _indexar(self, resumen, firma):
+        documento = len(self.firmas)
+        self.hashes.setdefault(resumen, documento)
+        self.firmas.append(firma if firma is not None else array('Q'))
+        if firma is not None:
+            for clave in self._bandas(firma):
+                self.cubetas.setdefault(clave, []).append(documento)
+        return documento
+
+    def comprobar_y_agregar(self, texto):
+        """
+        Indexa el texto si no es un duplicado; devuelve el 'Duplicado' encontrado o None.
+        """
+        resumen, firma = self._preparar(texto)
+        with self._lock:
+            duplicado = self._buscar(resumen, firma)
+            if duplicado is None:
+                self._agregar(resumen, firma)
+            return duplicado
+
+
+class _Aleatorio:
+    # Generador determinista (splitmix64) para que las firmas no cambien entre ejecuciones
+    def __init__(self, semilla):
+        self.estado = semilla & MASCARA
+
+    def siguiente(self):
+        self.estado = (self.estado + 0x9E3779B97F4A7C15) & MASCARA
+        valor = self.estado
+        valor = ((valor ^ (valor >> 30)) * 0xBF58476D1CE4E5B9) & MASCARA
+        valor = ((valor ^ (valor >> 27)) * 0x94D049BB133111EB) & MASCARA
+        return valor ^ (valor >> 31)
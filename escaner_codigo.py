@@ -0,0 +1,220 @@
+"""
+Escaneo del código en una sola pasada para encontrar áreas a mejorar.
+
+Sustituye a los tres recorridos línea a línea de 'escanear_codigo'. Si el
+fragmento es Python válido se recorre su árbol sintáctico ('ast'). Si no (las
+respuestas del modelo suelen mezclar prosa y código) se recorre el árbol de cada
+bloque de código válido por separado y el resto del texto se analiza por tokens
+('tokenize'), saltando las líneas que no se pueden tokenizar.
+"""
+
+import ast
+import functools
+import itertools
+import keyword
+import tokenize
+from collections import Counter, namedtuple
+
+from formateador import extraer_bloques
+
+
+# tipo: 'bucle_range', 'nombre_corto' o 'sin_documentar'; linea: número de línea (desde 1)
+Hallazgo = namedtuple('Hallazgo', ['tipo', 'linea', 'detalle'])
+
+TOKENS_IGNORADOS = (tokenize.NL, tokenize.COMMENT, tokenize.INDENT, tokenize.DEDENT)
+
+
+class EscanerCodigo:
+    """
+    Detecta bucles 'for ... in range(...)', identificadores cortos y funciones o clases sin docstring.
+    """
+
+    def __init__(self, longitud_maxima_corta=3, nombres_permitidos=('_', 'cls')):
+        self.longitud_maxima_corta = longitud_maxima_corta
+        self.nombres_permitidos = set(nombres_permitidos)
+
+    def escanear(self, codigo, linea_base=0):
+        """
+        Devuelve los hallazgos del código, con las líneas desplazadas 'linea_base'.
+        """
+        try:
+            arbol = ast.parse(codigo)
+        except (SyntaxError, ValueError):
+            hallazgos = self._escanear_mixto(codigo)
+        else:
+            hallazgos = self._escanear_arbol(arbol)
+        hallazgos.sort(key=lambda hallazgo: hallazgo.linea)
+        return [hallazgo._replace(linea=hallazgo.linea + linea_base) for hallazgo in hallazgos]
+
+    def _es_corto(self, nombre):
+        return len(nombre) <= self.longitud_maxima_corta and nombre not in self.nombres_permitidos
+
+    def _escanear_arbol(self, arbol):
+        hallazgos = []
+        vistos = set()
+
+        def nombre_corto(nombre, linea):
+            # Informar cada nombre una sola vez, en la línea donde se define por primera vez
+            if self._es_corto(nombre) and nombre not in vistos:
+                vistos.add(nombre)
+                hallazgos.append(Hallazgo('nombre_corto', linea, nombre))
+
+        for nodo in ast.walk(arbol):
+            if isinstance(nodo, (ast.For, ast.AsyncFor)):
+                iterable = nodo.iter
+                if (isinstance(iterable, ast.Call) and isinstance(iterable.func, ast.Name)
+                        and iterable.func.id == 'range'):
+                    detalle = f"for {ast.unparse(nodo.target)} in {ast.unparse(iterable)}"
+                    hallazgos.append(Hallazgo('bucle_range', nodo.lineno, detalle))
+            elif isinstance(nodo, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                nombre_corto(nodo.name, nodo.lineno)
+                if ast.get_docstring(nodo) is None:
+                    hallazgos.append(Hallazgo('sin_documentar', nodo.lineno, nodo.name))
+            elif isinstance(nodo, ast.Name) and isinstance(nodo.ctx, ast.Store):
+                nombre_corto(nodo.id, nodo.lineno)
+            elif isinstance(nodo, ast.arg) and nodo.arg != 'self':
+                nombre_corto(nodo.arg, nodo.lineno)
+        return hallazgos
+
+    def _escanear_mixto(self, codigo):
+        # Prosa y bloques de código: los bloques válidos se recorren con 'ast' y el resto del
+        # texto, con esos bloques en blanco para conservar los números de línea, con 'tokenize'
+        hallazgos = []
+        resto = []
+        posicion = 0
+        for inicio, fin, bloque, _ in extraer_bloques(codigo):
+            try:
+                arbol = ast.parse(bloque)
+            except (SyntaxError, ValueError):
+                continue
+            desplazamiento = codigo.count('\n', 0, inicio)
+            hallazgos.extend(hallazgo._replace(linea=hallazgo.linea + desplazamiento)
+                             for hallazgo in self._escanear_arbol(arbol))
+            resto.append(codigo[posicion:inicio])
+            resto.append('\n' * codigo.count('\n', inicio, fin))
+            posicion = fin
+        resto.append(codigo[posicion:])
+        hallazgos.extend(self._escanear_tokens(''.join(resto)))
+
+        # Cada nombre corto se informa una sola vez, en la primera línea donde aparece
+        cortos = {}
+        for hallazgo in sorted(hallazgos, key=lambda hallazgo: hallazgo.linea):
+            if hallazgo.tipo == 'nombre_corto':
+                cortos.setdefault(hallazgo.detalle, hallazgo)
+        return [hallazgo for hallazgo in hallazgos if hallazgo.tipo != 'nombre_corto'] + list(cortos.values())
+
+    def _escanear_tokens(self, codigo):
+        # Agrupar los tokens en líneas lógicas y analizar cada una por separado
+        hallazgos = []
+        vistos = set()
+        linea_logica = []
+        definicion = None  # (linea, nombre) de la definición cuyo cuerpo empieza en la línea siguiente
+
+        for token in _tokens_tolerantes(codigo):
+            if token.type in TOKENS_IGNORADOS:
+                continue
+            if token.type in (tokenize.NEWLINE, tokenize.ENDMARKER):
+                if linea_logica:
+                    definicion = self._analizar_linea(linea_logica, hallazgos, vistos)
+                linea_logica = []
+                continue
+            if definicion is not None and not linea_logica:
+                # Primer token del cuerpo: si no es una cadena, no hay docstring
+                if token.type != tokenize.STRING:
+                    hallazgos.append(Hallazgo('sin_documentar', *definicion))
+                definicion = None
+            linea_logica.append(token)
+
+        if linea_logica:
+            definicion = self._analizar_linea(linea_logica, hallazgos, vistos)
+        if definicion is not None:
+            hallazgos.append(Hallazgo('sin_documentar', *definicion))
+        return hallazgos
+
+    def _analizar_linea(self, tokens, hallazgos, vistos):
+        # Reconocer 'def'/'class', 'for ... in range(...)' y asignaciones simples
+        textos = [token.string for token in tokens]
+        linea = tokens[0].start[0]
+        if textos[0] == 'async':
+            textos = textos[1:]
+            tokens = tokens[1:]
+        if not tokens:
+            return None
+
+        if textos[0] in ('def', 'class') and len(tokens) > 2 and tokens[1].type == tokenize.NAME and ':' in textos:
+            nombre = textos[1]
+            self._nombre_corto_token(nombre, linea, hallazgos, vistos)
+            if textos[-1] == ':':
+                return linea, nombre
+            hallazgos.append(Hallazgo('sin_documentar', linea, nombre))  # Cuerpo en la misma línea
+            return None
+
+        if textos[0] == 'for' and 'in' in textos and textos[-1] == ':':
+            posicion_in = textos.index('in')
+            variables = [token for token in tokens[1:posicion_in] if token.string != ',']
+            if (variables and all(token.type == tokenize.NAME for token in variables)
+                    and textos[posicion_in + 1:posicion_in + 3] == ['range', '(']):
+                for variable in variables:
+                    self._nombre_corto_token(variable.string, linea, hallazgos, vistos)
+                detalle = f"for {', '.join(token.string for token in variables)} in range(...)"
+                hallazgos.append(Hallazgo('bucle_range', linea, detalle))
+            return None
+
+        if '=' in textos:
+            objetivos = tokens[:textos.index('=')]
+            nombres = [token for token in objetivos if token.string != ',']
+            if nombres and all(token.type == tokenize.NAME and not keyword.iskeyword(token.string)
+                               for token in nombres):
+                for nombre in nombres:
+                    self._nombre_corto_token(nombre.string, linea, hallazgos, vistos)
+        return None
+
+    def _nombre_corto_token(self, nombre, linea, hallazgos, vistos):
+        if self._es_corto(nombre) and nombre not in vistos:
+            vistos.add(nombre)
+            hallazgos.append(Hallazgo('nombre_corto', linea, nombre))
+
+
+def _tokens_tolerantes(codigo):
+    # Tokenizar el texto entero; si una línea no se puede tokenizar, continuar después de ella.
+    # Se leen las líneas ya separadas, sin volver a unir el resto del texto en cada reintento.
+    # Un paréntesis sin cerrar en la prosa alarga la línea lógica hasta el final del texto y
+    # 'TokenError' llega en el EOF: entonces se cierra la línea lógica pendiente con un NEWLINE
+    # y se sigue después de la línea donde empezaba, no después del final.
+    lineas = codigo.splitlines(keepends=True)
+    inicio = 0
+    while inicio < len(lineas):
+        lector = functools.partial(next, itertools.islice(lineas, inicio, None), '')
+        pendiente = None  # Línea (relativa a 'inicio') donde empieza la línea lógica en curso
+        try:
+            for token in tokenize.generate_tokens(lector):
+                if token.type == tokenize.ERRORTOKEN:
+                    continue
+                if token.type in (tokenize.NEWLINE, tokenize.ENDMARKER):
+                    pendiente = None
+                elif pendiente is None and token.type not in TOKENS_IGNORADOS:
+                    pendiente = token.start[0]
+                yield token._replace(start=(token.start[0] + inicio, token.start[1]),
+                                     end=(token.end[0] + inicio, token.end[1]))
+            return
+        except tokenize.TokenError as e:
+            linea_error = pendiente or e.args[1][0]
+        except SyntaxError as e:
+            linea_error = e.lineno
+        linea_error = max(linea_error or 1, 1)
+        posicion = (inicio + linea_error, 0)
+        yield tokenize.TokenInfo(tokenize.NEWLINE, '', posicion, posicion, '')
+        inicio += linea_error
+
+
+def resumir_hallazgos(hallazgos, maximo=10):
+    """
+    Resumen acotado para mostrar: total por tipo y los primeros 'maximo' hallazgos.
+    """
+    totales = Counter(hallazgo.tipo for hallazgo in hallazgos)
+    lineas = [f"{tipo}: {cantidad}" for tipo, cantidad in sorted(totales.items())]
+    for hallazgo in hallazgos[:maximo]:
+        lineas.append(f"  línea {hallazgo.linea}: {hallazgo.tipo} -> {hallazgo.detalle}")
+    if len(hallazgos) > maximo:
+        lineas.append(f"  ... y {len(hallazgos) - maximo} más")
+    return '\n'.join(lineas)
@@ -0,0 +1,188 @@
+"""
+Evaluador de respuestas: regresión logística sobre n-gramas con hashing.
+
+Cada respuesta se convierte en un vector de 'dimension' posiciones a partir
+de sus palabras y signos (unigramas y bigramas), con el truco del hashing
+(crc32, con signo) y sin vocabulario que mantener. Un lote de respuestas se
+puntúa con una sola multiplicación de matrices. El modelo aprende de forma
+incremental de las respuestas aceptadas o rechazadas, y la precisión, la
+pérdida y el F1 se miden sobre las últimas predicciones hechas antes de
+conocer cada etiqueta. Los pesos se guardan como '.npz' junto al cerebro.
+"""
+
+import io
+import re
+import threading
+import zlib
+from collections import Counter, deque
+
+from almacen_cerebro import escribir_atomico
+from diferido import ModuloDiferido
+
+
+np = ModuloDiferido('numpy')
+
+PATRON_TOKEN = re.compile(r'\w+|```|[^\w\s]')
+EPSILON = 1e-7
+
+
+def ngramas(texto):
+    # Unigramas y bigramas de palabras y signos, en minúsculas
+    tokens = PATRON_TOKEN.findall(texto.lower())
+    return tokens + [a + ' ' + b for a, b in zip(tokens, tokens[1:])]
+
+
+def vectorizar(textos, dimension):
+    """
+    Matriz (len(textos), dimension) de float32 con los n-gramas de cada texto.
+
+    Las frecuencias se suavizan con log1p y cada fila se normaliza (norma L2).
+    """
+    filas, columnas, valores = [], [], []
+    mascara = dimension - 1
+    for fila, texto in enumerate(textos):
+        for resumen, cuenta in Counter(zlib.crc32(ngrama.encode('utf-8')) for ngrama in ngramas(texto)).items():
+            filas.append(fila)
+            columnas.append(resumen & mascara)
+            valores.append(cuenta if resumen >> 31 else -cuenta)  # El bit alto da el signo
+    matriz = np.zeros((len(textos), dimension), dtype=np.float32)
+    np.add.at(matriz, (np.array(filas, dtype=np.intp), np.array(columnas, dtype=np.intp)),
+              np.array(valores, dtype=np.float32))
+    matriz = np.sign(matriz) * np.log1p(np.abs(matriz))
+    normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+    return matriz / np.maximum(normas, EPSILON)
+
+
+def _sigmoide(valores):
+    return 1.0 / (1.0 + np.exp(-np.clip(valores, -30.0, 30.0)))
+
+
+class EvaluadorRespuestas:
+    """
+    Probabilidad de que una respuesta sea aceptada, aprendida de las respuestas ya juzgadas.
+
+    'dimension' debe ser potencia de dos. Las etiquetas llegan con 'registrar'
+    (desde cualquier hilo) y se aprenden en lote con 'entrenar'.
+    """
+
+    def __init__(self, dimension=2 ** 14, tasa=1.0, regularizacion=1e-4, pasadas=3, ventana=500):
+        if dimension & (dimension - 1):
+            raise ValueError("'dimension' debe ser potencia de dos")
+        self.dimension = dimension
+        self.tasa = tasa
+        self.regularizacion = regularizacion
+        self.pasadas = pasadas
+        self.pesos = np.zeros(dimension, dtype=np.float32)
+        self.sesgo = 0.0
+        self.ejemplos = 0
+        self.predicciones = deque(maxlen=ventana)  # (probabilidad predicha, etiqueta real)
+        self.puntuaciones = deque(maxlen=ventana)  # Últimas puntuaciones de 'puntuar'
+        self.modificado = False
+        self._pendientes = []  # (texto, etiqueta) aún sin aprender
+        self._lock = threading.Lock()
+
+    def puntuar(self, textos):
+        """
+        Devuelve un array con la probabilidad de aceptación de cada texto.
+        """
+        if not textos:
+            return np.zeros(0, dtype=np.float32)
+        matriz = vectorizar(textos, self.dimension)
+        with self._lock:
+            probabilidades = _sigmoide(matriz @ self.pesos + self.sesgo)
+            self.puntuaciones.extend(probabilidades.tolist())
+        return probabilidades
+
+    def registrar(self, texto, aceptada):
+        # Anotar una respuesta juzgada; se aprende en el próximo 'entrenar'
+        with self._lock:
+            self._pendientes.append((texto, 1.0 if aceptada else 0.0))
+
+    def entrenar(self):
+        """
+        Aprende de las respuestas registradas y devuelve cuántas eran.
+
+        Antes de actualizar los pesos se guarda la predicción de cada una, de modo
+        que las métricas miden respuestas que el modelo aún no había visto.
+        """
+        with self._lock:
+            pendientes, self._pendientes = self._pendientes, []
+        if not pendientes:
+            return 0
+        matriz = vectorizar([texto for texto, _ in pendientes], self.dimension)
+        etiquetas = np.array([etiqueta for _, etiqueta in pendientes], dtype=np.float32)
+        with self._lock:
+            probabilidades = _sigmoide(matriz @ self.pesos + self.sesgo)
+            self.predicciones.extend(zip(probabilidades.tolist(), etiquetas.tolist()))
+            for _ in range(self.pasadas):
+                error = probabilidades - etiquetas
+                gradiente = matriz.T @ error / len(etiquetas) + self.regularizacion * self.pesos
+                self.pesos -= self.tasa * gradiente.astype(np.float32)
+                self.sesgo -= self.tasa * float(error.mean())
+                probabilidades = _sigmoide(matriz @ self.pesos + self.sesgo)
+            self.ejemplos += len(etiquetas)
+            self.modificado = True
+        return len(etiquetas)
+
+    def _ventana(self):
+        with self._lock:
+            if not self.predicciones:
+                return None, None
+            probabilidades, etiquetas = zip(*self.predicciones)
+        return np.array(probabilidades), np.array(etiquetas)
+
+    def precision(self, umbral=0.5):
+        probabilidades, etiquetas = self._ventana()
+        if probabilidades is None:
+            return 0.0
+        positivas = probabilidades >= umbral
+        return float((positivas & (etiquetas == 1)).sum() / positivas.sum()) if positivas.any() else 0.0
+
+    def perdida(self):
+        # Entropía cruzada media; sin predicciones, la de un modelo que no sabe nada (ln 2)
+        probabilidades, etiquetas = self._ventana()
+        if probabilidades is None:
+            return float(np.log(2.0))
+        probabilidades = np.clip(probabilidades, EPSILON, 1 - EPSILON)
+        return float(-(etiquetas * np.log(probabilidades) + (1 - etiquetas) * np.log(1 - probabilidades)).mean())
+
+    def puntaje_f1(self, umbral=0.5):
+        probabilidades, etiquetas = self._ventana()
+        if probabilidades is None:
+            return 0.0
+        positivas = probabilidades >= umbral
+        aciertos = float((positivas & (etiquetas == 1)).sum())
+        total = positivas.sum() + (etiquetas == 1).sum()
+        return 2 * aciertos / total if total else 0.0
+
+    def confianza(self):
+        # Puntuación media de las últimas respuestas evaluadas (0,5 sin datos)
+        with self._lock:
+            return sum(self.puntuaciones) / len(self.puntuaciones) if self.puntuaciones else 0.5
+
+    def guardar(self, ruta):
+        """
+        Guarda pesos y ventana de predicciones en un '.npz' comprimido (escritura atómica).
+        """
+        with self._lock:
+            datos = {
+                'pesos': self.pesos.copy(),
+                'sesgo': np.array(self.sesgo),
+                'ejemplos': np.array(self.ejemplos),
+                'predicciones': np.array(list(self.predicciones), dtype=np.float32).reshape(-1, 2),
+            }
+            self.modificado = False
+        contenido = io.BytesIO()
+        np.savez_compressed(contenido, **datos)
+        escribir_atomico(ruta, contenido.getvalue())
+
+    @classmethod
+    def cargar(cls, ruta, **opciones):
+        # Evaluador guardado con 'guardar' (la dimensión es la de los pesos guardados)
+        with np.load(ruta, allow_pickle=False) as datos:
+            evaluador = cls(dimension=len(datos['pesos']), **opciones)
+            evaluador.pesos = datos['pesos'].astype(np.float32)
+            evaluador.sesgo = float(datos['sesgo'])
+            evaluador.ejemplos = int(datos['ejemplos'])
+            evaluador.predicciones.extend((float(p), float(e)) for p, e in datos['predicciones'])
+        return evaluador
@@ -0,0 +1,285 @@
+"""
+Lectura incremental del flujo SSE que devuelve Serge en /api/chat/{id}/question.
+
+El servidor envía un evento por token ('event: message' + 'data: ...'),
+comentarios de keep-alive (': ping - <fecha>') y un 'event: close' final.
+Este módulo separa esos eventos a medida que llegan y limpia cada fragmento
+sin esperar a que termine la generación.
+
+La limpieza es una cadena de generadores ('limpiar_flujo'): trozos -> líneas
+('dividir_lineas') -> datos de los mensajes ('desenmarcar') -> texto sin
+cabeceras ('quitar_cabeceras'). Cada etapa sólo retiene la línea o el
+fragmento en curso, así que la memoria no crece con el tamaño de la respuesta
+y los saltos de línea (y la sangría del código) se conservan.
+"""
+
+import codecs
+import itertools
+import re
+from collections import namedtuple
+
+
+EventoSSE = namedtuple('EventoSSE', ['evento', 'datos'])
+
+# Cabeceras que el modelo a veces inventa ("### Instruction:", "### Response:")
+PATRON_CABECERA = re.compile(r'##\s?#\s?[^#:\n]{1,40}:\s?')
+PATRON_PREFIJO_CABECERA = re.compile(r'#{1,2}\Z|##\s?\Z|##\s?#\s?[^#:\n]{0,40}\Z')
+
+# Apertura de un bloque vallado, como en 'formateador.PATRON_BLOQUE_VALLADO'
+PATRON_VALLA = re.compile(r'(?P<sangria>[ \t]*)(?P<valla>```|~~~)[ \t]*(?P<etiqueta>[\w+-]*)')
+PATRON_FIN_LINEA = re.compile(r'\r\n|\r|\n')
+# Primera línea con contenido de un flujo SSE: un campo conocido o un comentario
+PATRON_CAMPO_SSE = re.compile(r'(?:data|event|id|retry)(?::|\Z)|:')
+
+
+class ErrorFlujoSSE(Exception):
+    """El flujo SSE trajo un evento 'error' (el texto es el de sus datos)."""
+
+
+def dividir_lineas(trozos, codificacion='utf-8'):
+    """
+    Convierte trozos de bytes (o texto) en líneas, sin el separador ('\n', '\r\n' o '\r').
+
+    Sólo se retienen los trozos de la línea en curso; un '\r\n' partido entre
+    dos trozos cuenta como un único separador.
+    """
+    decodificador = codecs.getincrementaldecoder(codificacion)(errors='replace')
+    partes = []  # Trozos de la línea en curso
+    retorno = False  # El trozo anterior terminó en '\r': un '\n' inicial es parte del mismo separador
+    for trozo in itertools.chain(trozos, [None]):
+        if trozo is None:
+            trozo = decodificador.decode(b'', final=True)
+        elif isinstance(trozo, bytes):
+            trozo = decodificador.decode(trozo)
+        if not trozo:
+            continue
+        if retorno and trozo[0] == '\n':
+            trozo = trozo[1:]
+        retorno = trozo.endswith('\r')
+        lineas = PATRON_FIN_LINEA.split(trozo)
+        if len(lineas) > 1:
+            # La primera completa la línea en curso y la última queda pendiente
+            partes.append(lineas[0])
+            yield ''.join(partes)
+            yield from lineas[1:-1]
+            partes = []
+        if lineas[-1]:
+            partes.append(lineas[-1])
+    if partes:
+        yield ''.join(partes)
+
+
+def leer_eventos(lineas):
+    """
+    Agrupa las líneas de un flujo SSE en eventos.
+
+    Los comentarios (': ping - ...') se ignoran y cada línea en blanco despacha
+    el evento acumulado, como indica la especificación de EventSource.
+    """
+    evento = 'message'
+    datos = []
+    for linea in lineas:
+        if linea == '':
+            if datos:
+                yield EventoSSE(evento, '\n'.join(datos))
+            evento, datos = 'message', []
+            continue
+        if linea.startswith(':'):
+            continue
+        campo, _, valor = linea.partition(':')
+        if valor.startswith(' '):
+            valor = valor[1:]
+        if campo == 'event':
+            evento = valor
+        elif campo == 'data':
+            datos.append(valor)
+    if datos:
+        yield EventoSSE(evento, '\n'.join(datos))
+
+
+def desenmarcar(lineas):
+    """
+    Genera los datos de los eventos 'message' hasta el 'event: close'.
+
+    Un evento 'error' lanza 'ErrorFlujoSSE'. Si el texto no es SSE (su primera
+    línea con contenido no es un campo ni un comentario) se entregan sus
+    líneas tal cual, cada una con su salto de línea.
+    """
+    lineas = iter(lineas)
+    primeras = []
+    for linea in lineas:
+        primeras.append(linea)
+        if linea:
+            break
+    lineas = itertools.chain(primeras, lineas)
+    if primeras and not PATRON_CAMPO_SSE.match(primeras[-1]):
+        for linea in lineas:
+            yield linea + '\n'
+        return
+    for evento in leer_eventos(lineas):
+        if evento.evento == 'error':
+            raise ErrorFlujoSSE(evento.datos)
+        if evento.evento == 'close':
+            return
+        if evento.evento == 'message':
+            yield evento.datos
+
+
+def quitar_cabeceras(fragmentos):
+    # Etapa de 'LimpiadorIncremental': los fragmentos sin las cabeceras '### ...:'
+    limpiador = LimpiadorIncremental()
+    for fragmento in fragmentos:
+        texto = limpiador.alimentar(fragmento)
+        if texto:
+            yield texto
+    resto = limpiador.terminar()
+    if resto:
+        yield resto
+
+
+def limpiar_flujo(trozos):
+    """
+    Genera el texto limpio de un cuerpo SSE (trozos de bytes o texto) a medida que llega.
+    """
+    return quitar_cabeceras(desenmarcar(dividir_lineas(trozos)))
+
+
+class LimpiadorIncremental:
+    """
+    Elimina las cabeceras '### Instruction:' / '### Response:' fragmento a fragmento.
+
+    Quita lo mismo que la antigua expresión regular de 'clean_response' (la
+    cabecera y su texto hasta el siguiente '#'), pero sólo retiene el texto
+    que todavía podría ser el inicio de una cabecera; el resto se entrega en
+    cuanto llega.
+    """
+
+    def __init__(self):
+        self.pendiente = ''
+        self.descartando = False
+
+    def alimentar(self, fragmento):
+        texto = self.pendiente + fragmento
+        self.pendiente = ''
+        salida = []
+        while texto:
+            if self.descartando:
+                # Descartar el cuerpo de la cabecera hasta el siguiente '#'
+                indice = texto.find('#')
+                if indice == -1:
+                    return ''.join(salida)
+                self.descartando = False
+                texto = texto[indice:]
+                continue
+
+            indice = texto.find('#')
+            if indice == -1:
+                salida.append(texto)
+                break
+            salida.append(texto[:indice])
+            texto = texto[indice:]
+
+            coincidencia = PATRON_CABECERA.match(texto)
+            if coincidencia:
+                self.descartando = True
+                texto = texto[coincidencia.end():]
+            elif PATRON_PREFIJO_CABECERA.match(texto):
+                # Todavía no se sabe si es una cabecera: esperar al siguiente fragmento
+                self.pendiente = texto
+                break
+            else:
+                salida.append('#')
+                texto = texto[1:]
+        return ''.join(salida)
+
+    def terminar(self):
+        # Entregar lo retenido al cerrarse el flujo
+        resto = '' if self.descartando else self.pendiente
+        self.pendiente = ''
+        self.descartando = False
+        return resto
+
+
+def limite_tokens(maximo):
+    # Condición de parada: detener tras 'maximo' fragmentos (un token por evento en Serge)
+    contador = [0]
+
+    def condicion(fragmento):
+        contador[0] += 1
+        return contador[0] >= maximo
+
+    condicion.descripcion = f'limite_tokens({maximo})'
+    return condicion
+
+
+def bloque_codigo_cerrado():
+    # Condición de parada: detener en cuanto se cierra el primer bloque ```
+    estado = {'comillas': 0, 'marcas': 0}
+
+    def condicion(fragmento):
+        # Contar comillas invertidas seguidas, aunque la marca llegue partida
+        for caracter in fragmento:
+            if caracter != '`':
+                estado['comillas'] = 0
+                continue
+            estado['comillas'] += 1
+            if estado['comillas'] == 3:
+                estado['marcas'] += 1
+                estado['comillas'] = 0
+        return estado['marcas'] >= 2
+
+    condicion.descripcion = 'bloque_codigo_cerrado'
+    return condicion
+
+
+def al_cerrar_bloque(funcion):
+    """
+    Consumidor para 'al_recibir': llama a funcion(codigo, etiqueta) en cuanto se cierra un bloque vallado.
+
+    El código se entrega tal como lo recorta 'formateador.extraer_bloques' (las
+    líneas entre las vallas, con su salto de línea), para que lo que se haga con
+    él mientras el modelo sigue generando sirva luego para la respuesta completa.
+    Sólo se retienen la línea en curso y las del bloque abierto. Al acabar el flujo
+    hay que llamar a 'terminar_consumidor': la última línea (a menudo la valla de
+    cierre) no lleva salto de línea detrás.
+    """
+    estado = {'linea': [], 'bloque': None}  # bloque: (sangría, valla, etiqueta, líneas)
+
+    def procesar_linea(linea):
+        if estado['bloque'] is None:
+            apertura = PATRON_VALLA.match(linea)
+            if apertura:
+                estado['bloque'] = (apertura.group('sangria'), apertura.group('valla'), apertura.group('etiqueta'), [])
+            return
+        sangria, valla, etiqueta, lineas = estado['bloque']
+        if linea.rstrip(' \t') == sangria + valla:
+            estado['bloque'] = None
+            funcion(''.join(lineas), etiqueta)
+        else:
+            lineas.append(linea + '\n')
+
+    def al_recibir(fragmento):
+        lineas = fragmento.split('\n')
+        estado['linea'].append(lineas[0])
+        for siguiente in lineas[1:]:
+            procesar_linea(''.join(estado['linea']))
+            estado['linea'] = [siguiente]
+
+    def terminar():
+        linea = ''.join(estado['linea'])
+        estado['linea'] = []
+        if linea:
+            procesar_linea(linea)
+        estado['bloque'] = None
+
+    al_recibir.terminar = terminar
+    return al_recibir
+
+
+def terminar_consumidor(al_recibir):
+    """
+    Avisa del final del flujo a un consumidor 'al_recibir' que lo necesite (los de 'al_cerrar_bloque').
+    """
+    terminar = getattr(al_recibir, 'terminar', None)
+    if terminar is not None:
+        terminar()
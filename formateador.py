@@ -0,0 +1,262 @@
+"""
+Formateo PEP 8 sólo del código de las respuestas.
+
+autopep8 es Python puro y lento con entradas grandes, y la mayoría de las
+respuestas del modelo son prosa. Aquí se detectan los bloques de código
+(vallados con ``` o ~~~, o sangrados), se formatea cada bloque una sola vez
+(los resultados se memorizan por hash del contenido) y el formateo se ejecuta
+en un pool de procesos para no ocupar el intérprete principal. La prosa se
+devuelve tal cual.
+"""
+
+import ast
+import hashlib
+import re
+import signal
+import threading
+from collections import OrderedDict
+from concurrent.futures import BrokenExecutor, TimeoutError as TiempoAgotado
+
+
+# Bloque vallado: apertura con etiqueta opcional, contenido y cierre con la misma valla
+PATRON_BLOQUE_VALLADO = re.compile(r'^(?P<sangria>[ \t]*)(?P<valla>```|~~~)[ \t]*(?P<etiqueta>[\w+-]*)[^\n]*\n'
+                                   r'(?P<codigo>.*?)^(?P=sangria)(?P=valla)[ \t]*$', re.MULTILINE | re.DOTALL)
+# Bloque sangrado (markdown): líneas con cuatro espacios o un tabulador tras una línea en blanco
+PATRON_BLOQUE_SANGRADO = re.compile(r'(?:\A|\n[ \t]*\n)(?P<codigo>(?:(?: {4}|\t)[^\n]*\n?|[ \t]*\n(?= {4}|\t))+)')
+PATRON_LINEA_CODIGO = re.compile(r'^\s*(?:def |class |import |from \S+ import |for .+ in .+:|while .+:|if .+:|return\b|'
+                                 r'@\w+|\w+(?:\.\w+)* ?= ?\S)', re.MULTILINE)
+ETIQUETAS_PYTHON = ('', 'python', 'py', 'python3', 'py3')
+
+
+def _formatear(codigo):
+    # Se ejecuta en los procesos del pool: importar autopep8 allí
+    import autopep8
+    return autopep8.fix_code(codigo)
+
+
+def _ignorar_interrupcion():
+    # Inicializador de los procesos del pool: Ctrl+C lo atiende el proceso principal, que cierra el pool
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _terminar_procesos(pool):
+    # Un formateo colgado ocupa su proceso hasta que termina: matar los procesos del pool
+    terminar = getattr(pool, 'terminate_workers', None)  # Python 3.14+
+    if terminar is not None:
+        terminar()
+        return
+    for proceso in list((pool._processes or {}).values()):
+        proceso.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _es_python(codigo):
+    try:
+        ast.parse(codigo)
+    except (SyntaxError, ValueError):
+        return False
+    return True
+
+
+def parece_codigo(texto):
+    """
+    True si el texto tiene bloques vallados o líneas con forma de código Python.
+    """
+    return '```' in texto or '~~~' in texto or PATRON_LINEA_CODIGO.search(texto) is not None
+
+
+def extraer_bloques(texto):
+    """
+    Devuelve los bloques de código Python del texto como (inicio, fin, codigo, sangria).
+
+    'inicio' y 'fin' delimitan el código dentro de 'texto' (sin las vallas);
+    'sangria' es la sangría de los bloques sangrados ('' en los demás). Los
+    bloques vallados con otra etiqueta (bash, json...) y los sangrados que no son
+    Python válido se ignoran. Si el texto no tiene bloques pero es Python válido
+    en su totalidad, se devuelve entero como un solo bloque.
+    """
+    bloques = []
+    vallados = []
+    for coincidencia in PATRON_BLOQUE_VALLADO.finditer(texto):
+        vallados.append(coincidencia.span())
+        if coincidencia.group('etiqueta').lower() in ETIQUETAS_PYTHON and coincidencia.group('codigo').strip():
+            bloques.append((coincidencia.start('codigo'), coincidencia.end('codigo'), coincidencia.group('codigo'), ''))
+
+    for coincidencia in PATRON_BLOQUE_SANGRADO.finditer(texto):
+        inicio, fin = coincidencia.span('codigo')
+        if any(inicio < fin_vallado and inicio_vallado < fin for inicio_vallado, fin_vallado in vallados):
+            continue
+        sangria = '\t' if coincidencia.group('codigo').lstrip(' \n').startswith('\t') else '    '
+        codigo = _quitar_sangria(coincidencia.group('codigo'), sangria)
+        if PATRON_LINEA_CODIGO.search(codigo) and _es_python(codigo):
+            bloques.append((inicio, fin, codigo, sangria))
+
+    if not bloques and not vallados and texto.strip() and PATRON_LINEA_CODIGO.search(texto) and _es_python(texto):
+        bloques.append((0, len(texto), texto, ''))
+    bloques.sort()
+    return bloques
+
+
+def _quitar_sangria(codigo, sangria):
+    return ''.join(linea[len(sangria):] if linea.startswith(sangria) else linea
+                   for linea in codigo.splitlines(keepends=True))
+
+
+def _poner_sangria(codigo, sangria):
+    return ''.join(sangria + linea if linea.strip() else linea for linea in codigo.splitlines(keepends=True))
+
+
+class FormateadorCodigo:
+    """
+    Formatea con autopep8 los bloques de código de un texto, con memoria y pool de procesos.
+
+    Con procesos=0 el formateo se hace en el propio hilo.
+    """
+
+    def __init__(self, procesos=1, capacidad=512, timeout=60.0):
+        self.procesos = procesos
+        self.capacidad = capacidad
+        self.timeout = timeout
+        self.aciertos = 0
+        self.fallos = 0
+        self.omitidos = 0  # Textos sin código que no se formatearon
+        self._memoria = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = None
+        self._recreado = False  # El pool ya se creó una vez (y se descartó)
+
+    def __getstate__(self):
+        # El pool y la memoria no se copian
+        return {'procesos': self.procesos, 'capacidad': self.capacidad, 'timeout': self.timeout}
+
+    def __setstate__(self, estado):
+        self.__init__(**estado)
+
+    def iniciar(self):
+        """
+        Crea el pool de procesos.
+
+        Conviene llamarlo al arrancar, antes de crear hilos: sólo entonces se usa
+        'fork' (rápido, los procesos se crean todos en el primer envío). Hacer fork
+        con otros hilos en marcha puede dejar al hijo bloqueado en un lock que otro
+        hilo tenía tomado, así que si hay más hilos, o el pool se vuelve a crear tras
+        un fallo, se usa 'forkserver' (o 'spawn').
+        """
+        if self.procesos and self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    # multiprocessing sólo se importa si se llega a formatear
+                    import multiprocessing
+                    from concurrent.futures import ProcessPoolExecutor
+                    metodos = multiprocessing.get_all_start_methods()
+                    if 'fork' in metodos and not self._recreado and threading.active_count() == 1:
+                        metodo = 'fork'
+                    else:
+                        metodo = 'forkserver' if 'forkserver' in metodos else 'spawn'
+                    try:
+                        pool = ProcessPoolExecutor(max_workers=self.procesos,
+                                                   mp_context=multiprocessing.get_context(metodo),
+                                                   initializer=_ignorar_interrupcion)
+                        pool.submit(int).result()
+                    except (OSError, RuntimeError) as e:
+                        print(f"No se pudo crear el pool de formateo; se formateará en el hilo actual: {e}")
+                        self.procesos = 0
+                        return self
+                    self._pool = pool
+        return self
+
+    @staticmethod
+    def clave(codigo):
+        return hashlib.sha1(codigo.encode('utf-8')).hexdigest()
+
+    def _recordar(self, clave):
+        with self._lock:
+            resultado = self._memoria.get(clave)
+            if resultado is not None:
+                self._memoria.move_to_end(clave)
+                self.aciertos += 1
+            return resultado
+
+    def _guardar(self, original, formateado):
+        # El resultado ya formateado también es su propio resultado: formatear dos veces es gratis
+        with self._lock:
+            for clave in (self.clave(original), self.clave(formateado)):
+                self._memoria[clave] = formateado
+                self._memoria.move_to_end(clave)
+            while len(self._memoria) > self.capacidad:
+                self._memoria.popitem(last=False)
+
+    def formatear_codigo(self, codigo):
+        """
+        Formatea un bloque de código, o lo devuelve de la memoria si ya se formateó.
+        """
+        resultado = self._recordar(self.clave(codigo))
+        if resultado is not None:
+            return resultado
+        with self._lock:
+            self.fallos += 1
+
+        pool = self.iniciar()._pool
+        resultado = None
+        if pool is not None:
+            try:
+                futuro = pool.submit(_formatear, codigo)
+                resultado = futuro.result(timeout=self.timeout)
+            except TiempoAgotado:
+                # El proceso sigue ocupado con este bloque y los siguientes esperarían detrás:
+                # descartar el pool y crear otro en el próximo formateo
+                print("El formateo tardó demasiado; se deja el código sin formatear.")
+                if self._descartar_pool(pool):
+                    _terminar_procesos(pool)
+                return codigo
+            except BrokenExecutor:
+                # Un proceso del pool murió: crear otro pool en el próximo formateo
+                print("El pool de formateo dejó de funcionar; se volverá a crear.")
+                self._descartar_pool(pool)
+        if resultado is None:
+            resultado = _formatear(codigo)
+        self._guardar(codigo, resultado)
+        return resultado
+
+    def _descartar_pool(self, pool):
+        # True si 'pool' era el pool en uso (otro hilo puede haberlo descartado ya)
+        with self._lock:
+            if self._pool is not pool:
+                return False
+            self._pool = None
+            self._recreado = True
+            return True
+
+    def formatear(self, texto):
+        """
+        Devuelve el texto con sus bloques de código formateados y la prosa intacta.
+        """
+        if not parece_codigo(texto):
+            with self._lock:
+                self.omitidos += 1
+            return texto
+
+        bloques = extraer_bloques(texto)
+        if not bloques:
+            with self._lock:
+                self.omitidos += 1
+            return texto
+
+        partes = []
+        posicion = 0
+        for inicio, fin, codigo, sangria in bloques:
+            partes.append(texto[posicion:inicio])
+            formateado = self.formatear_codigo(codigo)
+            if sangria:
+                formateado = _poner_sangria(formateado, sangria)
+                if not texto[inicio:fin].endswith('\n'):
+                    formateado = formateado.rstrip('\n')
+            partes.append(formateado)
+            posicion = fin
+        partes.append(texto[posicion:])
+        return ''.join(partes)
+
+    def cerrar(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,292 @@
+"""
+Grabación y reproducción de los intercambios con Serge.
+
+'ClienteGrabador' envuelve un 'ClienteSerge' y anota en un registro de solo
+añadir cada chat creado (parámetros e ID) y cada pregunta (chat, prompt,
+cuerpo SSE crudo y en qué momento llegó cada trozo). 'ClienteReproductor'
+tiene la misma interfaz y sirve esas respuestas sin servidor: al instante o,
+con 'tiempos=True', con los tiempos originales. Así se pueden repetir miles
+de épocas de limpieza, escaneo, formato y guardado en segundos, y perfilarlas
+sin la latencia del modelo.
+
+El registro es un archivo JSON Lines con un índice aparte ('.idx', como el
+de 'CorpusCodigo') de desplazamientos, tipos y claves, de modo que al abrirlo
+no hay que leer los cuerpos.
+"""
+
+import datetime
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+
+from corpus_codigo import recortar_linea_cortada
+from transporte import ConfiguracionSerge, ErrorRespuestaSerge
+
+
+# tipo: 'chat' o 'pregunta'; clave: resumen del prompt (vacía en los chats)
+EntradaIntercambio = namedtuple('EntradaIntercambio', ['desplazamiento', 'longitud', 'tipo', 'clave'])
+
+
+def clave_pregunta(pregunta):
+    return hashlib.sha1(pregunta.encode('utf-8')).hexdigest()
+
+
+class RegistroIntercambios:
+    """
+    Registro indexado de solo añadir con los chats y preguntas grabados.
+    """
+
+    def __init__(self, ruta='intercambios.jsonl', ruta_indice=None):
+        self.ruta = ruta
+        self.ruta_indice = ruta_indice or ruta + '.idx'
+        self._lock = threading.Lock()
+        self.entradas = self._cargar_indice()
+        self._por_clave = {}
+        for posicion, entrada in enumerate(self.entradas):
+            self._por_clave.setdefault((entrada.tipo, entrada.clave), []).append(posicion)
+
+    def __len__(self):
+        return len(self.entradas)
+
+    def _cargar_indice(self):
+        entradas = []
+        if os.path.exists(self.ruta_indice):
+            # Una línea a medias al final impediría leer las que se añadan detrás
+            recortar_linea_cortada(self.ruta_indice)
+            with open(self.ruta_indice, encoding='utf-8') as archivo:
+                for linea in archivo:
+                    try:
+                        entradas.append(EntradaIntercambio(**json.loads(linea)))
+                    except (ValueError, TypeError):
+                        continue
+        # Descartar entradas cuyo registro no llegó a escribirse entero
+        tamano = os.path.getsize(self.ruta) if os.path.exists(self.ruta) else 0
+        while entradas and entradas[-1].desplazamiento + entradas[-1].longitud > tamano:
+            entradas.pop()
+        return entradas
+
+    def agregar(self, registro):
+        """
+        Añade un registro ('tipo' y, en las preguntas, 'pregunta') y devuelve su entrada del índice.
+        """
+        datos = (json.dumps(registro, ensure_ascii=False) + '\n').encode('utf-8')
+        clave = clave_pregunta(registro['pregunta']) if registro['tipo'] == 'pregunta' else ''
+        with self._lock:
+            with open(self.ruta, 'ab') as archivo:
+                desplazamiento = archivo.tell()
+                archivo.write(datos)
+            entrada = EntradaIntercambio(desplazamiento, len(datos), registro['tipo'], clave)
+            with open(self.ruta_indice, 'a', encoding='utf-8') as archivo:
+                archivo.write(json.dumps(entrada._asdict()) + '\n')
+            self._por_clave.setdefault((entrada.tipo, entrada.clave), []).append(len(self.entradas))
+            self.entradas.append(entrada)
+        return entrada
+
+    def leer(self, entrada):
+        # Leer un único registro sin cargar el resto del archivo
+        with open(self.ruta, 'rb') as archivo:
+            archivo.seek(entrada.desplazamiento)
+            return json.loads(archivo.read(entrada.longitud))
+
+    def posiciones(self, tipo, clave=''):
+        # Posiciones (en orden de grabación) de las entradas de un tipo y clave
+        return self._por_clave.get((tipo, clave), [])
+
+    def de_tipo(self, tipo):
+        return [posicion for posicion, entrada in enumerate(self.entradas) if entrada.tipo == tipo]
+
+
+class ClienteGrabador:
+    """
+    Cliente que reenvía todo a otro 'ClienteSerge' y graba cada intercambio.
+    """
+
+    def __init__(self, cliente, registro):
+        self.cliente = cliente
+        self.registro = registro
+
+    @property
+    def configuracion(self):
+        return self.cliente.configuracion
+
+    def crear_chat(self):
+        chat_id = self.cliente.crear_chat()
+        self.registro.agregar({'tipo': 'chat', 'fecha': time.time(), 'chat_id': chat_id,
+                               'modelo': self.configuracion.modelo,
+                               'parametros': self.configuracion.parametros_chat()})
+        return chat_id
+
+    def preguntar(self, chat_id, pregunta, stream=False):
+        inicio = time.perf_counter()
+        response = self.cliente.preguntar(chat_id, pregunta, stream=stream)
+        return _RespuestaGrabada(response, self.registro, {
+            'tipo': 'pregunta', 'fecha': time.time(), 'chat_id': chat_id, 'pregunta': pregunta, 'stream': stream,
+            'estado': response.status_code, 'primer_byte': response.elapsed.total_seconds(),
+        }, inicio)
+
+    def cerrar(self):
+        self.cliente.cerrar()
+
+
+class _RespuestaGrabada:
+    # Respuesta HTTP que anota los trozos leídos y graba el intercambio al leerla entera o cerrarla
+    def __init__(self, response, registro, datos, inicio):
+        self._response = response
+        self._registro = registro
+        self._datos = datos
+        self._inicio = inicio
+        self._trozos = []  # (segundos desde la solicitud, bytes)
+        self._grabada = False
+        self.status_code = response.status_code
+        self.ok = response.ok
+        self.elapsed = response.elapsed
+
+    def iter_content(self, chunk_size=None):
+        completa = False
+        try:
+            for trozo in self._response.iter_content(chunk_size=chunk_size):
+                self._trozos.append((time.perf_counter() - self._inicio, trozo))
+                yield trozo
+            completa = True
+        finally:
+            self._grabar(completa)
+
+    @property
+    def content(self):
+        if not self._trozos:
+            self._trozos.append((time.perf_counter() - self._inicio, self._response.content))
+            self._grabar(completa=True)
+        return b''.join(trozo for _, trozo in self._trozos)
+
+    @property
+    def text(self):
+        return self.content.decode(self._response.encoding or 'utf-8', errors='replace')
+
+    def close(self):
+        self._response.close()
+        self._grabar(completa=False)
+
+    def _grabar(self, completa):
+        if self._grabada:
+            return
+        self._grabada = True
+        cuerpo = b''.join(trozo for _, trozo in self._trozos)
+        self._datos.update({
+            'cuerpo': cuerpo.decode('utf-8', errors='replace'),
+            'trozos': [[round(momento, 6), len(trozo)] for momento, trozo in self._trozos],
+            'duracion': time.perf_counter() - self._inicio,
+            'completa': completa or not self._datos['stream'],
+        })
+        try:
+            self._registro.agregar(self._datos)
+        except OSError as e:
+            print(f"Error al grabar el intercambio: {e}")
+
+
+class ClienteReproductor:
+    """
+    Cliente que responde con los intercambios grabados, sin servidor.
+
+    Cada prompt se busca por su contenido; si se grabó varias veces, las
+    respuestas se sirven por turnos. Con 'solo_exactas=False' (por defecto) un
+    prompt que no se grabó (las preguntas aleatorias o el contexto pueden
+    cambiar entre ejecuciones) recibe la siguiente respuesta grabada en orden,
+    dando la vuelta al llegar al final. 'tiempos=True' reproduce las esperas
+    originales (primer byte y llegada de cada trozo); 'velocidad' las acelera.
+    """
+
+    def __init__(self, registro, configuracion=None, tiempos=False, velocidad=1.0, solo_exactas=False):
+        self.registro = registro
+        self.configuracion = configuracion or ConfiguracionSerge.desde_entorno()
+        self.tiempos = tiempos
+        self.velocidad = velocidad
+        self.solo_exactas = solo_exactas
+        self.exactas = 0
+        self.sustituidas = 0
+        self._turnos = {}  # (tipo, clave) -> siguiente posición a servir
+        self._lock = threading.Lock()
+
+    def _siguiente(self, posiciones, clave):
+        with self._lock:
+            turno = self._turnos.get(clave, 0)
+            self._turnos[clave] = turno + 1
+        return self.registro.leer(self.registro.entradas[posiciones[turno % len(posiciones)]])
+
+    def crear_chat(self):
+        posiciones = self.registro.posiciones('chat')
+        if not posiciones:
+            with self._lock:
+                self._turnos['chats'] = numero = self._turnos.get('chats', 0) + 1
+            return f'reproduccion-{numero}'
+        return self._siguiente(posiciones, ('chat', ''))['chat_id']
+
+    def preguntar(self, chat_id, pregunta, stream=False):
+        clave = clave_pregunta(pregunta)
+        posiciones = self.registro.posiciones('pregunta', clave)
+        if posiciones:
+            self.exactas += 1
+            registro = self._siguiente(posiciones, ('pregunta', clave))
+        else:
+            posiciones = [] if self.solo_exactas else self.registro.de_tipo('pregunta')
+            if not posiciones:
+                raise ErrorRespuestaSerge(404, f"Pregunta no grabada: {pregunta[:80]}")
+            self.sustituidas += 1
+            registro = self._siguiente(posiciones, ('pregunta', None))
+        if registro['estado'] >= 400:
+            raise ErrorRespuestaSerge(registro['estado'], registro['cuerpo'])
+        if self.tiempos:
+            # Sin streaming el cuerpo se lee entero antes de volver: esperar toda la duración
+            time.sleep((registro['primer_byte'] if stream else registro['duracion']) / self.velocidad)
+        return _RespuestaReproducida(registro, self.tiempos and stream, self.velocidad)
+
+    def cerrar(self):
+        pass
+
+
+class _RespuestaReproducida:
+    # Respuesta con la misma interfaz que la de 'requests' a partir de un registro grabado
+    def __init__(self, registro, tiempos, velocidad):
+        self.status_code = registro['estado']
+        self.ok = self.status_code < 400
+        self.elapsed = datetime.timedelta(seconds=registro['primer_byte'])
+        self.content = registro['cuerpo'].encode('utf-8')
+        self.text = registro['cuerpo']
+        self._trozos = registro['trozos'] or [[registro['primer_byte'], len(self.content)]]
+        self._primer_byte = registro['primer_byte']
+        self._tiempos = tiempos
+        self._velocidad = velocidad
+
+    def iter_content(self, chunk_size=None):
+        # Los trozos se cortan con los tamaños grabados; el cuerpo se recodificó, así que el último se lleva el resto
+        inicio = time.perf_counter() - self._primer_byte / self._velocidad
+        posicion = 0
+        for numero, (momento, longitud) in enumerate(self._trozos):
+            if self._tiempos:
+                espera = momento / self._velocidad - (time.perf_counter() - inicio)
+                if espera > 0:
+                    time.sleep(espera)
+            fin = len(self.content) if numero == len(self._trozos) - 1 else posicion + longitud
+            yield self.content[posicion:fin]
+            posicion = fin
+
+    def close(self):
+        pass
+
+
+def cliente_desde_entorno(cliente=None):
+    """
+    Cliente según GRABAR_INTERCAMBIOS / REPRODUCIR_INTERCAMBIOS (rutas del registro), o None.
+
+    REPRODUCIR_TIEMPOS=1 reproduce las esperas originales (REPRODUCIR_VELOCIDAD las acelera).
+    """
+    if os.environ.get('REPRODUCIR_INTERCAMBIOS'):
+        registro = RegistroIntercambios(os.environ['REPRODUCIR_INTERCAMBIOS'])
+        print(f"Reproduciendo {len(registro)} intercambios grabados de {registro.ruta}.")
+        return ClienteReproductor(registro, tiempos=os.environ.get('REPRODUCIR_TIEMPOS') == '1',
+                                  velocidad=float(os.environ.get('REPRODUCIR_VELOCIDAD', 1.0)))
+    if os.environ.get('GRABAR_INTERCAMBIOS') and cliente is not None:
+        return ClienteGrabador(cliente, RegistroIntercambios(os.environ['GRABAR_INTERCAMBIOS']))
+    return None
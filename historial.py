@@ -0,0 +1,233 @@
+"""
+Historial compacto de las épocas de entrenamiento.
+
+Cada época deja una fila de tamaño fijo (fecha, duración, latencia, calidad,
+confianza, tamaño del corpus, solicitudes y errores) en búferes circulares de
+NumPy. El nivel 0 guarda las últimas 'capacidad' épocas tal cual; las filas
+que salen de un nivel se combinan de 'factor' en 'factor' en el siguiente,
+así que con pocos niveles se cubren meses de entrenamiento en un tamaño
+constante. Con 'ruta' los búferes viven en un archivo binario proyectado en
+memoria ('np.memmap'): no hay nada que serializar al guardar.
+"""
+
+import os
+import threading
+import time
+
+from diferido import ModuloDiferido
+
+
+np = ModuloDiferido('numpy')
+
+MAGIA = 0x484F4D48495354  # 'HOMHIST'
+VERSION = 1
+
+# Columnas y cómo se combinan al reducir resolución: 'ultimo' (valor del final
+# del intervalo), 'suma' o 'media' (ponderada por el número de épocas 'n')
+COLUMNAS = (
+    ('epoca', 'i8', 'ultimo'),
+    ('fecha', 'f8', 'ultimo'),
+    ('n', 'i8', 'suma'),
+    ('duracion', 'f4', 'media'),
+    ('latencia', 'f4', 'media'),
+    ('calidad', 'f4', 'media'),
+    ('confianza', 'f4', 'media'),
+    ('corpus_fragmentos', 'i8', 'ultimo'),
+    ('corpus_bytes', 'i8', 'ultimo'),
+    ('solicitudes', 'i8', 'suma'),
+    ('errores', 'i8', 'suma'),
+)
+CAMPOS_MEDIA = tuple(nombre for nombre, _, combinacion in COLUMNAS if combinacion == 'media')
+CAMPOS_SUMA = tuple(nombre for nombre, _, combinacion in COLUMNAS if combinacion == 'suma')
+CAMPOS_ULTIMO = tuple(nombre for nombre, _, combinacion in COLUMNAS if combinacion == 'ultimo')
+
+
+def tipo_fila():
+    return np.dtype([(nombre, tipo) for nombre, tipo, _ in COLUMNAS])
+
+
+class HistorialEntrenamiento:
+    """
+    Búferes circulares por niveles de resolución, en memoria o en un archivo proyectado.
+
+    Con 'niveles=3', 'capacidad=4096' y 'factor=16' se guardan 4096 épocas
+    completas, 4096 filas de 16 épocas y 4096 de 256 (más de un millón de
+    épocas) en menos de 1 MiB.
+    """
+
+    def __init__(self, ruta=None, capacidad=4096, niveles=3, factor=16):
+        self.ruta = ruta
+        self.capacidad = capacidad
+        self.niveles = niveles
+        self.factor = factor
+        self._lock = threading.Lock()
+        self._abrir()
+
+    def _abrir(self):
+        dtype = tipo_fila()
+        parametros = [MAGIA, VERSION, self.capacidad, self.niveles, self.factor]
+        tamano_cabecera = 8 * (len(parametros) + self.niveles)
+        if self.ruta is None:
+            self._cabecera = np.zeros(len(parametros) + self.niveles, dtype=np.int64)
+            self._acumuladores = np.zeros(self.niveles, dtype=dtype)
+            self.filas = np.zeros((self.niveles, self.capacidad), dtype=dtype)
+            self._cabecera[:len(parametros)] = parametros
+            return
+
+        tamano = tamano_cabecera + dtype.itemsize * self.niveles * (self.capacidad + 1)
+        if os.path.exists(self.ruta) and not self._compatible(parametros, tamano):
+            print(f"El historial {self.ruta} tiene otro formato; se guarda como {self.ruta}.antiguo y se empieza uno nuevo.")
+            os.replace(self.ruta, self.ruta + '.antiguo')
+        nuevo = not os.path.exists(self.ruta)
+        if nuevo:
+            os.makedirs(os.path.dirname(self.ruta) or '.', exist_ok=True)
+            with open(self.ruta, 'wb') as archivo:
+                archivo.truncate(tamano)
+
+        modo = 'r+'
+        self._cabecera = np.memmap(self.ruta, dtype=np.int64, mode=modo, shape=(len(parametros) + self.niveles,))
+        self._acumuladores = np.memmap(self.ruta, dtype=dtype, mode=modo, offset=tamano_cabecera,
+                                       shape=(self.niveles,))
+        self.filas = np.memmap(self.ruta, dtype=dtype, mode=modo,
+                               offset=tamano_cabecera + dtype.itemsize * self.niveles,
+                               shape=(self.niveles, self.capacidad))
+        if nuevo:
+            self._cabecera[:len(parametros)] = parametros
+            self.sincronizar()
+
+    def _compatible(self, parametros, tamano):
+        # El archivo existente tiene la misma cabecera y el mismo tamaño
+        if os.path.getsize(self.ruta) != tamano:
+            return False
+        cabecera = np.fromfile(self.ruta, dtype=np.int64, count=len(parametros))
+        return cabecera.tolist() == parametros
+
+    @property
+    def _totales(self):
+        # Filas escritas en cada nivel desde el principio (la posición de escritura es total % capacidad);
+        # van detrás de magia, versión, capacidad, niveles y factor
+        return self._cabecera[5:]
+
+    def __len__(self):
+        # Épocas registradas en total, incluidas las ya combinadas
+        with self._lock:
+            return int(self.filas['n'].sum() + self._acumuladores['n'].sum())
+
+    def registrar(self, epoca, duracion=0.0, latencia=0.0, calidad=0.0, confianza=0.0, corpus_fragmentos=0,
+                  corpus_bytes=0, solicitudes=0, errores=0, fecha=None):
+        """
+        Añade la fila de una época.
+        """
+        fila = np.zeros((), dtype=self.filas.dtype)
+        fila['epoca'], fila['fecha'], fila['n'] = epoca, time.time() if fecha is None else fecha, 1
+        fila['duracion'], fila['latencia'], fila['calidad'], fila['confianza'] = duracion, latencia, calidad, confianza
+        fila['corpus_fragmentos'], fila['corpus_bytes'] = corpus_fragmentos, corpus_bytes
+        fila['solicitudes'], fila['errores'] = solicitudes, errores
+        with self._lock:
+            self._insertar(0, fila)
+
+    def _insertar(self, nivel, fila):
+        total = int(self._totales[nivel])
+        posicion = total % self.capacidad
+        if total >= self.capacidad and nivel + 1 < self.niveles:
+            # La fila más antigua sale del nivel: se acumula para el siguiente
+            self._acumular(nivel + 1, self.filas[nivel, posicion].copy())
+        self.filas[nivel, posicion] = fila
+        self._totales[nivel] = total + 1
+
+    def _acumular(self, nivel, fila):
+        acumulador = np.array(self._acumuladores[nivel])
+        peso = fila['n']
+        for campo in CAMPOS_MEDIA:
+            acumulador[campo] += fila[campo] * peso  # Suma ponderada; se divide al completar la fila
+        for campo in CAMPOS_SUMA:
+            acumulador[campo] += fila[campo]
+        for campo in CAMPOS_ULTIMO:
+            acumulador[campo] = fila[campo]
+        self._acumuladores[nivel] = acumulador
+        if acumulador['n'] >= self.factor ** nivel:
+            self._insertar(nivel, _cerrar(acumulador))
+            self._acumuladores[nivel] = np.zeros((), dtype=self.filas.dtype)
+
+    def _nivel(self, nivel):
+        # Filas del nivel en orden cronológico
+        total = int(self._totales[nivel])
+        if total <= self.capacidad:
+            return self.filas[nivel, :total]
+        posicion = total % self.capacidad
+        return np.concatenate([self.filas[nivel, posicion:], self.filas[nivel, :posicion]])
+
+    def todas(self):
+        """
+        Todas las filas en orden cronológico: primero las más combinadas (las más antiguas).
+
+        Los acumuladores a medio llenar se incluyen como una fila más, para que no haya huecos.
+        """
+        with self._lock:
+            partes = []
+            for nivel in reversed(range(self.niveles)):
+                partes.append(np.array(self._nivel(nivel)))
+                if nivel and self._acumuladores[nivel]['n']:
+                    partes.append(_cerrar(np.array(self._acumuladores[nivel]))[np.newaxis])
+        return np.concatenate(partes)
+
+    def rango(self, desde=None, hasta=None):
+        """
+        Filas con fecha entre 'desde' y 'hasta' (segundos desde la época Unix, ambos incluidos).
+        """
+        filas = self.todas()
+        inicio = 0 if desde is None else np.searchsorted(filas['fecha'], desde, side='left')
+        fin = len(filas) if hasta is None else np.searchsorted(filas['fecha'], hasta, side='right')
+        return filas[inicio:fin]
+
+    def resumen(self, desde=None, hasta=None):
+        """
+        Resumen de un intervalo: épocas, medias ponderadas, extremos, totales y tendencia de la calidad.
+        """
+        filas = self.rango(desde, hasta)
+        if not len(filas):
+            return {'epocas': 0}
+        pesos = filas['n'].astype(np.float64)
+        resumen = {
+            'epocas': int(pesos.sum()),
+            'desde': float(filas['fecha'][0]),
+            'hasta': float(filas['fecha'][-1]),
+            'ultima_epoca': int(filas['epoca'][-1]),
+        }
+        for campo in CAMPOS_MEDIA:
+            resumen[f'{campo}_media'] = float(np.average(filas[campo], weights=pesos))
+        resumen['calidad_min'] = float(filas['calidad'].min())
+        resumen['calidad_max'] = float(filas['calidad'].max())
+        for campo in ('solicitudes', 'errores'):
+            resumen[campo] = int(filas[campo].sum())
+        resumen['tasa_errores'] = resumen['errores'] / resumen['solicitudes'] if resumen['solicitudes'] else 0.0
+        resumen['crecimiento_corpus'] = int(filas['corpus_fragmentos'][-1] - filas['corpus_fragmentos'][0])
+        resumen['calidad_tendencia_dia'] = self._pendiente(filas, 'calidad') * 86400
+        return resumen
+
+    @staticmethod
+    def _pendiente(filas, campo):
+        # Pendiente (unidades por segundo) de la recta de mínimos cuadrados ponderada por épocas
+        if len(filas) < 2 or filas['fecha'][-1] == filas['fecha'][0]:
+            return 0.0
+        pesos = filas['n'].astype(np.float64)
+        x = filas['fecha'] - filas['fecha'][0]
+        y = filas[campo].astype(np.float64)
+        x_media, y_media = np.average(x, weights=pesos), np.average(y, weights=pesos)
+        varianza = np.sum(pesos * (x - x_media) ** 2)
+        return float(np.sum(pesos * (x - x_media) * (y - y_media)) / varianza) if varianza else 0.0
+
+    def sincronizar(self):
+        # Volcar al archivo las páginas modificadas
+        if self.ruta is not None:
+            with self._lock:
+                for mapa in (self._cabecera, self._acumuladores, self.filas):
+                    mapa.flush()
+
+
+def _cerrar(acumulador):
+    # Fila combinada a partir de un acumulador: las medias se dividen por el número de épocas
+    fila = acumulador.copy()
+    for campo in CAMPOS_MEDIA:
+        fila[campo] = acumulador[campo] / max(int(acumulador['n']), 1)
+    return fila
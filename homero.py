@@ -16,7 +16,7 @@ Usage:
 3. Run the script using the command: python mainy.py.
 
 Important Files:
-- cerebro.pkl: Stores the current state of the neural network.
+- cerebro/: Stores the current state of the neural network (snapshot + change journal; old cerebro.pkl files are migrated on load).
 - codigo_actual.txt: Contains the extracted code from conversations with the language model.
 
 Additional Notes:
@@ -32,83 +32,464 @@ import os
 import random
 import re
 import threading
-import requests
-from urllib.parse import quote
-import pickle
 import time
-import autopep8
+from contextlib import contextmanager
+
+from flujo_sse import (ErrorFlujoSSE, LimpiadorIncremental, al_cerrar_bloque, bloque_codigo_cerrado, desenmarcar,
+                       dividir_lineas, limite_tokens, limpiar_flujo, terminar_consumidor)
+from transporte import ClienteSerge, ErrorConexionSerge, ErrorSerge, requests
+from despachador import DespachadorPreguntas, Tarea
+from cache_respuestas import CacheRespuestas
+from corpus_codigo import CorpusCodigo
+from escaner_codigo import EscanerCodigo, resumir_hallazgos
+from almacen_cerebro import AlmacenCerebro, ErrorAlmacenCerebro, migrar_pickle
+from planificador import PlanificadorEntrenamiento
+from metricas import Metricas
+from formateador import ETIQUETAS_PYTHON, FormateadorCodigo
+from recuperacion import ContextoCodigo, estimar_tokens
+from duplicados import DetectorDuplicados
+from lotes import agrupar_tareas
+from persistencia import EscritorFondo
+from evaluador import EvaluadorRespuestas
+from historial import HistorialEntrenamiento
 
 
 class RedNeuronal:
-    def __init__(self, chat_id):
+    # Leer las respuestas en modo streaming por defecto (ver 'transmitir_pregunta_al_modelo')
+    transmitir = False
+    # Máximo de tokens a leer por respuesta de código en modo streaming (None = sin límite)
+    limite_tokens_respuesta = None
+    # Preguntas independientes enviadas a la vez y chats de Serge entre los que se reparten
+    max_concurrencia = 4
+    chats_paralelos = 4
+    # Caché de respuestas (CacheRespuestas); None la desactiva
+    cache = None
+    # Incluir el chat en la clave de la caché (por defecto se comparte entre chats con los mismos parámetros)
+    cache_por_chat = False
+    # Época actual del entrenamiento (se registra junto a cada fragmento de código)
+    epoca = 0
+    # Escáner de una sola pasada (ast/tokenize) usado por escanear_codigo
+    escaner = EscanerCodigo()
+    # Formatea sólo los bloques de código, una vez cada uno, en un pool de procesos
+    formateador = FormateadorCodigo()
+    # Tokens de código relevante que se añaden a la pregunta de mejora (0 desactiva el contexto)
+    tokens_contexto = 512
+    # Similitud (Jaccard estimada con MinHash) a partir de la cual un fragmento se rechaza por repetido
+    umbral_duplicados = 0.75
+    # Preguntas por solicitud (1 = una pregunta por solicitud; >1 las agrupa en lotes)
+    tamano_lote = 1
+    # Distancia a 0,5 de la puntuación del evaluador para contar una respuesta como positiva o negativa
+    margen_retroalimentacion = 0.1
+    # Planificador del ciclo de entrenamiento (pausas adaptativas y trabajo en segundo plano)
+    planificador = None
+    # Varias instancias de Serge (PoolBackends); None usa sólo 'cliente' y 'chat_id'
+    pool = None
+    # Perfilador de épocas (p. ej. PerfiladorEpocas); None no perfila
+    perfilador = None
+
+    # Valores simples que se guardan en cada punto de control
+    ATRIBUTOS_PERSISTENTES = ('chat_id', 'chats_adicionales', 'entrenamiento_completo', 'retroalimentacion_positiva',
+                              'retroalimentacion_negativa', 'confianza_IA', 'epoca')
+
+    def __init__(self, chat_id, cliente=None, almacen=None):
         self.chat_id = chat_id
         self.entrenamiento_completo = False
         self.retroalimentacion_positiva = 0
         self.retroalimentacion_negativa = 0
-        self.codigo_actual = ''
+        self.corpus = CorpusCodigo()  # Fragmentos de código aceptados, en codigo_actual.txt
         self.confianza_IA = 0.5  # Valor inicial de confianza
+        self._cliente = cliente
+        self.chats_adicionales = []  # Chats extra para enviar preguntas en paralelo
+        self._despachador = None
+        self.almacen = almacen or AlmacenCerebro()  # Puntos de control en el directorio 'cerebro'
+        self.metricas = Metricas()  # Contadores y tiempos por etapa
+        self._contexto = None
+        self._duplicados = None
+        self._evaluador = None
+        self._historial = None
+        self._metricas_epoca = {}  # Totales de las métricas al terminar la época anterior
+        self._por_evaluar = []  # Respuestas analizadas pendientes de puntuar en lote
+        self.ultimos_hallazgos = []  # Hallazgos del último fragmento escaneado
+        # Los contadores y la confianza se modifican desde los hilos del despachador
+        self._lock_estado = threading.RLock()
+        self._lock_duplicados = threading.Lock()  # Un solo hilo construye el detector de duplicados
+        self.escritor = EscritorFondo()  # Hilo único para guardar el cerebro y exportar métricas
+
+    @property
+    def cliente(self):
+        # Cliente HTTP compartido (sesión con keep-alive); se crea en el primer uso
+        if getattr(self, '_cliente', None) is None:
+            self._cliente = ClienteSerge()
+        return self._cliente
+
+    @cliente.setter
+    def cliente(self, cliente):
+        # Los chats adicionales pertenecen al servidor del cliente anterior
+        self._cliente = cliente
+        self.chats_adicionales = []
+        self._despachador = None
+
+    def estado_persistente(self):
+        # Estado pequeño del cerebro; el código acumulado se guarda aparte en el corpus
+        with self._lock_estado:
+            estado = {atributo: getattr(self, atributo) for atributo in self.ATRIBUTOS_PERSISTENTES}
+            estado['chats_adicionales'] = list(estado['chats_adicionales'])
+        estado['corpus'] = {'ruta': self.corpus.ruta, 'ruta_indice': self.corpus.ruta_indice}
+        return estado
+
+    def restaurar_estado(self, estado):
+        with self._lock_estado:
+            for atributo in self.ATRIBUTOS_PERSISTENTES:
+                if atributo in estado:
+                    setattr(self, atributo, estado[atributo])
+        if 'corpus' in estado:
+            self.corpus = CorpusCodigo(estado['corpus']['ruta'], estado['corpus']['ruta_indice'])
+
+    @property
+    def codigo_actual(self):
+        # Código acumulado completo, compuesto a partir del corpus sólo cuando se pide
+        return self.corpus.texto()
+
+    @property
+    def contexto(self):
+        # Índice BM25 sobre el corpus actual; se rehace si se sustituye el corpus. El corpus que ya
+        # existía se indexa en segundo plano y, hasta que termine, las preguntas van sin contexto
+        contexto = getattr(self, '_contexto', None)
+        if contexto is None or contexto.corpus is not self.corpus:
+            contexto = self._contexto = ContextoCodigo(self.corpus).preparar()
+        return contexto
+
+    @property
+    def duplicados(self):
+        """
+        Detector de fragmentos repetidos, con el corpus actual ya indexado.
+
+        Las firmas se guardan junto al corpus ('codigo_actual.txt.firmas'): al
+        arrancar sólo se calculan las de los fragmentos que aún no tienen.
+        """
+        corpus, detector = self._duplicados or (None, None)
+        if detector is not None and corpus is self.corpus:
+            return detector
+        # Indexar el corpus (MinHash de cada fragmento) sin tomar '_lock_estado', que bloquearía
+        # los contadores y las instantáneas del estado hasta el final; sólo se publica con él
+        with self._lock_duplicados:
+            corpus, detector = self._duplicados or (None, None)
+            if detector is None or corpus is not self.corpus:
+                corpus = self.corpus
+                detector = DetectorDuplicados(self.umbral_duplicados, ruta=corpus.ruta + '.firmas')
+                if len(detector) > len(corpus):
+                    # Las firmas son de otro corpus (o de un fragmento que no llegó a guardarse)
+                    detector.vaciar()
+                for _, texto in corpus.iterar(len(detector)):
+                    detector.agregar(texto)
+                with self._lock_estado:
+                    self._duplicados = (corpus, detector)
+        return detector
+
+    @property
+    def evaluador(self):
+        """
+        Evaluador de respuestas, cargado de 'evaluador.npz' junto al cerebro si existe.
+        """
+        with self._lock_estado:
+            if self._evaluador is None:
+                ruta = self.ruta_evaluador
+                evaluador = None
+                if os.path.exists(ruta):
+                    try:
+                        evaluador = EvaluadorRespuestas.cargar(ruta)
+                    except (OSError, ValueError, KeyError) as e:
+                        print(f"Error al cargar el evaluador de respuestas: {e}")
+                self._evaluador = evaluador or EvaluadorRespuestas()
+            return self._evaluador
+
+    @property
+    def historial(self):
+        """
+        Historial de épocas en 'historial.bin' junto al cerebro (búferes circulares proyectados en memoria).
+        """
+        with self._lock_estado:
+            if self._historial is None:
+                self._historial = HistorialEntrenamiento(os.path.join(self.almacen.directorio, 'historial.bin'))
+            return self._historial
+
+    def registrar_epoca(self, duracion, calidad):
+        # Añadir al historial la época recién terminada, con las solicitudes, errores y latencia de esa época
+        instantanea = self.metricas.instantanea()
+        totales = {
+            'solicitudes': instantanea['contadores'].get('solicitudes', 0),
+            'errores': instantanea['contadores'].get('errores', 0),
+        }
+        tiempo = instantanea['tiempos'].get('solicitud_http', {'n': 0, 'suma': 0.0})
+        totales['latencia_n'], totales['latencia_suma'] = tiempo['n'], tiempo['suma']
+        anteriores, self._metricas_epoca = self._metricas_epoca, totales
+        diferencia = {clave: valor - anteriores.get(clave, 0) for clave, valor in totales.items()}
+        latencia = diferencia['latencia_suma'] / diferencia['latencia_n'] if diferencia['latencia_n'] else 0.0
+        try:
+            self.historial.registrar(self.epoca, duracion=duracion, latencia=latencia, calidad=calidad,
+                                     confianza=self.confianza_IA, corpus_fragmentos=len(self.corpus),
+                                     corpus_bytes=self.corpus.tamano(), solicitudes=diferencia['solicitudes'],
+                                     errores=diferencia['errores'])
+        except OSError as e:
+            print(f"Error al registrar la época en el historial: {e}")
+
+    @property
+    def ruta_evaluador(self):
+        return os.path.join(self.almacen.directorio, 'evaluador.npz')
+
+    @property
+    def despachador(self):
+        """
+        Despachador que envía preguntas independientes en paralelo.
+
+        Reparte las preguntas entre 'chat_id' y hasta 'chats_paralelos - 1' chats
+        adicionales, que se crean la primera vez que se necesitan. Con un pool de
+        backends, cada pregunta se envía sin chat fijo y el pool elige backend y chat.
+        """
+        if self.pool is not None:
+            return self._crear_despachador([None] * self.pool.capacidad())
+
+        chats_adicionales = getattr(self, 'chats_adicionales', [])
+        while len(chats_adicionales) < self.chats_paralelos - 1:
+            try:
+                chats_adicionales.append(self.cliente.crear_chat())
+            except ErrorSerge as e:
+                print(f"No se pudo crear un chat adicional: {e}")
+                break
+        self.chats_adicionales = chats_adicionales
+
+        return self._crear_despachador([self.chat_id] + chats_adicionales[:self.chats_paralelos - 1])
+
+    def _crear_despachador(self, chat_ids):
+        # Reutilizar el despachador mientras no cambien los chats
+        despachador = getattr(self, '_despachador', None)
+        if despachador is None or despachador.chat_ids != chat_ids:
+            if despachador is not None:
+                despachador.cerrar()
+            despachador = DespachadorPreguntas(self.enviar_pregunta_al_modelo, chat_ids, self.max_concurrencia)
+            self._despachador = despachador
+        return despachador
+
+    def ejecutar_tareas(self, tareas):
+        """
+        Envía las tareas con el despachador, agrupadas en lotes si 'tamano_lote' > 1.
+
+        Devuelve una lista de (pregunta, resultado de 'procesar') como 'DespachadorPreguntas.ejecutar'.
+        """
+        if self.tamano_lote <= 1:
+            resultados = self.despachador.ejecutar(tareas)
+        else:
+            agrupadas = agrupar_tareas(tareas, self.tamano_lote, self._reintentar_lote)
+            self.metricas.contar('solicitudes_ahorradas_lote', len(tareas) - len(agrupadas))
+            resultados = []
+            for _, resultados_lote in self.despachador.ejecutar(agrupadas):
+                resultados.extend(resultados_lote)
+
+        # Puntuar de una vez las respuestas analizadas durante estas tareas
+        self.evaluar_respuestas()
+        return resultados
+
+    def _reintentar_lote(self, tareas):
+        # La respuesta del lote no se pudo separar: preguntar cada cosa por separado
+        self.metricas.contar('lotes_fallidos')
+        return self.despachador.ejecutar(tareas)
+
+    def _registrar_solicitud(self, latencia, error):
+        # Informar al planificador de la latencia (o el fallo) de cada solicitud al servidor;
+        # las respuestas de la caché no cuentan ni para la latencia ni para el presupuesto por minuto
+        if self.planificador is not None:
+            self.planificador.registrar_solicitud(latencia, error)
+
+    def en_segundo_plano(self, funcion, *args):
+        # Ejecutar fuera del camino de las preguntas si hay planificador; si no, en el acto
+        if self.planificador is not None:
+            return self.planificador.en_segundo_plano(funcion, *args)
+        funcion(*args)
 
     def obtener_chat_id(self):
         """
         Obtiene el ID del chat al conectarse al servicio de chat.
 
-        Realiza una solicitud HTTP POST al servicio de chat con un prompt predefinido.
-        Si la solicitud es exitosa, almacena el ID del chat en el atributo 'chat_id'.
+        Realiza una solicitud HTTP POST al servicio de chat con los parámetros de
+        'ConfiguracionSerge' y almacena el ID del chat en el atributo 'chat_id'.
+        Lanza 'ErrorSerge' si el chat no se pudo crear.
         """
-        try:
-            pre_prompt = "You are a Python programming language expert. You have extensive knowledge and experience in Python development. You're proficient in various Python libraries such as NumPy, Pandas, and TensorFlow. Your expertise includes data manipulation, machine learning algorithms, and deep learning architectures. You are constantly seeking ways to optimize and enhance code performance. You have a deep understanding of Python syntax, object-oriented programming, and best practices in software development. You are eager to teach and adapt your Python skills to improve this neural network's codebase. Please provide guidance and instructions on code enhancement, best practices, and innovative techniques to elevate the capabilities of this neural network."
-            url = f"http://192.168.68.24:8008/api/chat/?model=Mixtral-8X7B-Instruct-v0_1&temperature=0.1&top_k=50&top_p=0.95&max_length=2048&context_window=2048&repeat_last_n=64&repeat_penalty=1.3&n_threads=42&init_prompt={quote(pre_prompt)}&gpu_layers=0"
-            #url = f"https://192.168.68.24:8008/api/chat/?model=Zephyr-7B-Beta&temperature=0.1&top_k=50&top_p=0.95&max_length=2048&context_window=2048&repeat_last_n=64&repeat_penalty=1.3&n_threads=28&init_prompt={quote(pre_prompt)}&gpu_layers=0"
-
-            response = requests.post(url, headers={'Accept': 'application/json'})
-            if response.ok:
-                self.chat_id = response.json()
-                print(f"Connected to chat with ID: {self.chat_id}")
-            else:
-                print('Request error:', response.text)
-        except Exception as e:
-            print('Error creating chat:', e)
+        self.chat_id = self.cliente.crear_chat()
+        print(f"Connected to chat with ID: {self.chat_id}")
 
-    def enviar_pregunta_al_modelo(self, pregunta):
+    def enviar_pregunta_al_modelo(self, pregunta, al_recibir=None, condiciones_parada=None, chat_id=None,
+                                  usar_cache=True):
         """
         Envía una pregunta al modelo de lenguaje y devuelve la respuesta limpia.
 
         Realiza una solicitud HTTP GET al servicio de chat con la pregunta proporcionada.
         Limpia la respuesta antes de retornarla utilizando la función 'clean_response'.
+        Si se indica 'al_recibir' o 'condiciones_parada' (o 'transmitir' está activo),
+        la respuesta se lee en modo streaming con 'transmitir_pregunta_al_modelo':
+        'al_recibir' se llama con cada fragmento limpio y la generación se corta en
+        cuanto alguna condición de parada devuelve True.
+        'chat_id' permite preguntar en otro chat distinto del principal.
+        Si hay una caché configurada, las preguntas repetidas se responden desde ella;
+        con usar_cache=False se pide una respuesta nueva al modelo (y se guarda).
+        Lanza 'ErrorSerge' si no se pudo obtener una respuesta.
         """
-        chat_url = f"http://192.168.68.24:8008/api/chat/{self.chat_id}/question?prompt={quote(pregunta)}"
+        clave = None
+        if self.cache is not None:
+            clave = self.clave_cache(pregunta, condiciones_parada, chat_id)
+            if usar_cache:
+                respuesta = self.cache.obtener(clave)
+                if respuesta is not None:
+                    self.metricas.contar('cache_aciertos')
+                    if al_recibir:
+                        al_recibir(respuesta)
+                        terminar_consumidor(al_recibir)
+                    return respuesta
+                self.metricas.contar('cache_fallos')
+
+        self.metricas.contar('solicitudes')
+        inicio = time.monotonic()
         try:
-            response = requests.get(chat_url, headers={'Accept': 'text/plain'})
-            if response.ok:
-                return self.clean_response(response.text)  # Limpia la respuesta antes de retornarla
-            else:
-                return "No se pudo obtener una respuesta del modelo de lenguaje."
-        except Exception as e:
-            return f"Error en la solicitud al modelo de lenguaje: {e}"
+            with self.metricas.medir('solicitud_http'):
+                respuesta = self._consultar_modelo(pregunta, al_recibir, condiciones_parada, chat_id)
+        except ErrorSerge:
+            self.metricas.contar('errores')
+            self._registrar_solicitud(time.monotonic() - inicio, True)
+            raise
+        self._registrar_solicitud(time.monotonic() - inicio, False)
+        if clave is not None:
+            self.cache.guardar(clave, respuesta)
+        return respuesta
+
+    def clave_cache(self, pregunta, condiciones_parada=None, chat_id=None):
+        # Modelo, parámetros de muestreo, contexto (chat y condiciones de parada) y pregunta
+        if self.pool is not None:
+            modelo, parametros = self.pool.descripcion()
+        else:
+            modelo, parametros = self.cliente.configuracion.modelo, self.cliente.configuracion.parametros_chat()
+        contexto = {
+            'condiciones_parada': sorted(getattr(condicion, 'descripcion', repr(condicion))
+                                         for condicion in condiciones_parada or []),
+            'chat_id': (chat_id or self.chat_id) if self.cache_por_chat else None,
+        }
+        return CacheRespuestas.clave(modelo, parametros, contexto, pregunta)
+
+    def _consultar_modelo(self, pregunta, al_recibir, condiciones_parada, chat_id):
+        # Pedir la respuesta al servidor, en modo streaming o de una vez
+        if self.transmitir or al_recibir or condiciones_parada:
+            fragmentos = []
+            for fragmento in self.transmitir_pregunta_al_modelo(pregunta, condiciones_parada, chat_id):
+                fragmentos.append(fragmento)
+                if al_recibir:
+                    al_recibir(fragmento)
+            # Fin del flujo o condición de parada: el consumidor procesa lo que tenga pendiente
+            if al_recibir:
+                terminar_consumidor(al_recibir)
+            return ''.join(fragmentos).strip()
+
+        # El cuerpo se limpia a medida que llega, sin guardar el SSE completo en memoria
+        with self._destino(chat_id) as (cliente, chat_id):
+            inicio = time.perf_counter()
+            response = cliente.preguntar(chat_id, pregunta, stream=True)
+            try:
+                texto = ''.join(limpiar_flujo(self._medir_trozos(response.iter_content(chunk_size=None), inicio, [])))
+            except requests.RequestException as e:
+                raise ErrorConexionSerge(f"Error al leer la respuesta del modelo de lenguaje: {e}") from e
+            except ErrorFlujoSSE as e:
+                raise ErrorSerge(f"El modelo de lenguaje devolvió un error: {e}") from e
+            finally:
+                response.close()
+        return self.formatear_respuesta(texto.strip())
+
+    @contextmanager
+    def _destino(self, chat_id=None):
+        # Cliente y chat para una pregunta: el pool elige backend salvo que se pida un chat concreto
+        if self.pool is not None and chat_id is None:
+            with self.pool.reservar() as reserva:
+                yield reserva.cliente, reserva.chat_id
+        else:
+            yield self.cliente, chat_id or self.chat_id
 
-    def clean_response(self, data, estilo='autopep8'):
+    def transmitir_pregunta_al_modelo(self, pregunta, condiciones_parada=None, chat_id=None):
         """
-        Limpia la respuesta del modelo de lenguaje.
+        Envía una pregunta al modelo y genera los fragmentos de la respuesta a medida que llegan.
 
-        Realiza varios pasos de limpieza en la respuesta obtenida del modelo.
-        Puede aplicar el formateo según el estilo especificado (por defecto, autopep8).
+        Cada evento SSE se limpia de forma incremental (cabeceras '### ...:' incluidas),
+        de modo que el consumidor puede procesar la respuesta antes de que termine.
+        Las condiciones de parada reciben cada fragmento; si alguna devuelve True
+        se cierra la conexión y el servidor deja de generar.
+        Lanza 'ErrorSerge' si la solicitud falla o la conexión se corta.
         """
+        with self._destino(chat_id) as (cliente, chat_id):
+            yield from self._transmitir(cliente, chat_id, pregunta, condiciones_parada)
+
+    def _transmitir(self, cliente, chat_id, pregunta, condiciones_parada):
+        inicio = time.perf_counter()
+        response = cliente.preguntar(chat_id, pregunta, stream=True)
+        primer_trozo = []
         try:
-            clean_data = re.sub(r'data:|event: message|event: close|: ping - \d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}.\d{6}', '', data)
-            trimmed_data = ' '.join(clean_data.split())
-            remove_instructions = re.sub(r'##\s?#\s?Instruction\s?:[^#]+|##\s?#\s?Response\s?:[^#]+|##\s?#\s?[^#]+:\s?[^#]+', '', trimmed_data)
-            clean_content = remove_instructions.strip()
+            limpiador = LimpiadorIncremental()
+            lineas = dividir_lineas(self._medir_trozos(response.iter_content(chunk_size=None), inicio, primer_trozo))
+            for datos in desenmarcar(lineas):
+                fragmento = limpiador.alimentar(datos)
+                if fragmento:
+                    yield fragmento
+                if condiciones_parada and any(condicion(datos) for condicion in condiciones_parada):
+                    break
+
+            resto = limpiador.terminar()
+            if resto:
+                yield resto
+        except requests.RequestException as e:
+            raise ErrorConexionSerge(f"Error al leer la respuesta del modelo de lenguaje: {e}") from e
+        except ErrorFlujoSSE as e:
+            raise ErrorSerge(f"El modelo de lenguaje devolvió un error: {e}") from e
+        finally:
+            response.close()
+            if primer_trozo:
+                self.metricas.observar('transmision', time.perf_counter() - primer_trozo[0])
+
+    def _medir_trozos(self, trozos, inicio, primer_trozo):
+        # Tiempo hasta el primer trozo del cuerpo y bytes recibidos
+        for trozo in trozos:
+            if not primer_trozo:
+                primer_trozo.append(time.perf_counter())
+                self.metricas.observar('primer_byte', primer_trozo[0] - inicio)
+            self.metricas.contar('bytes_recibidos', len(trozo))
+            yield trozo
 
-            if estilo == 'autopep8':
-                clean_content = autopep8.fix_code(clean_content)
-                print("Código formateado según PEP 8.")
+    def clean_response(self, data, estilo='autopep8'):
+        """
+        Limpia la respuesta del modelo de lenguaje.
 
+        'data' es el cuerpo SSE: texto, bytes o un iterable de trozos (como
+        'iter_content'). Pasa por las etapas de 'limpiar_flujo' (líneas, eventos,
+        cabeceras '### ...:') sin copias intermedias del cuerpo entero y
+        conservando los saltos de línea y la sangría del código.
+        Puede aplicar el formateo según el estilo especificado (por defecto, autopep8).
+        """
+        with self.metricas.medir('clean_response'):
+            trozos = [data] if isinstance(data, (str, bytes)) else data
+            try:
+                clean_content = ''.join(limpiar_flujo(trozos)).strip()
+            except ErrorFlujoSSE as e:
+                print(f"La respuesta trae un error del modelo de lenguaje: {e}")
+                return ''
+            return self.formatear_respuesta(clean_content, estilo)
+
+    def formatear_respuesta(self, clean_content, estilo='autopep8'):
+        # Formatear el código de una respuesta ya limpia; la prosa queda igual
+        if estilo != 'autopep8':
             return clean_content
-
+        try:
+            with self.metricas.medir('autopep8'):
+                formateado = self.formateador.formatear(clean_content)
         except Exception as e:
-            print(f"Error al limpiar la respuesta: {e}")
+            print(f"Error al formatear la respuesta: {e}")
             return clean_content
-        
+        if formateado != clean_content:
+            print("Código formateado según PEP 8.")
+        return formateado
+
     ###########################
     def iniciar_aprendizaje(self):
         # Start the learning process by asking initial questions
@@ -118,19 +499,20 @@ class RedNeuronal:
             "What are your long-term goals?",
             "How would you like to improve or continue learning?"
         ]
-        for pregunta in preguntas_iniciales:
-            # Ask questions and get responses
-            respuesta = self.enviar_pregunta_al_modelo(pregunta)
-            # Display the question and response
-            print(f"Pregunta: {pregunta}\nRespuesta: {respuesta}\n")
-            # Process the response for learning (add your logic here)
+
+        def procesar(pregunta):
+            def mostrar(respuesta):
+                # Display the question and response
+                print(f"Pregunta: {pregunta}\nRespuesta: {respuesta}\n")
+                # Process the response for learning (add your logic here)
+            return mostrar
+
+        # Ask all questions at once and handle each response as it arrives
+        self.ejecutar_tareas([Tarea(pregunta, procesar(pregunta), {}) for pregunta in preguntas_iniciales])
 
     def procesar_respuesta_aprendizaje(self, respuesta):
         # Process the response received during the learning process
-        if "positiva" in respuesta:
-            self.retroalimentacion_positiva += 1
-        elif "negativa" in respuesta:
-            self.retroalimentacion_negativa += 1
+        self.contar_retroalimentacion(respuesta)
 
         # Extract relevant data from the response
         datos_relevantes = self.extraer_datos(respuesta)
@@ -169,21 +551,24 @@ class RedNeuronal:
     def aumentar_confianza_IA(self):
         # Increase confidence in the intelligent assistant
         factor_ajuste = 0.1
-        self.confianza_IA += factor_ajuste
+        with self._lock_estado:
+            self.confianza_IA += factor_ajuste
 
     def reducir_confianza_IA(self):
         # Decrease confidence in the intelligent assistant
         factor_ajuste = 0.1
-        self.confianza_IA -= factor_ajuste
+        with self._lock_estado:
+            self.confianza_IA -= factor_ajuste
 
     def ajustar_IA(self):
         # Adjust the intelligent assistant based on feedback
-        if self.retroalimentacion_positiva > self.retroalimentacion_negativa:
-            self.usar_datos("aumentar_confianza")
-        elif self.retroalimentacion_positiva < self.retroalimentacion_negativa:
-            self.usar_datos("reducir_confianza")
-        else:
-            pass  # No significant changes needed
+        with self._lock_estado:
+            if self.retroalimentacion_positiva > self.retroalimentacion_negativa:
+                self.usar_datos("aumentar_confianza")
+            elif self.retroalimentacion_positiva < self.retroalimentacion_negativa:
+                self.usar_datos("reducir_confianza")
+            else:
+                pass  # No significant changes needed
 
     def obtener_confianza_IA(self):
         # Get the initial confidence level
@@ -192,7 +577,8 @@ class RedNeuronal:
     def actualizar_confianza_IA(self, nueva_confianza):
         # Update the confidence level, ensuring it is within a valid range (e.g., between 0 and 1)
         if 0 <= nueva_confianza <= 1:
-            self.confianza_IA = nueva_confianza
+            with self._lock_estado:
+                self.confianza_IA = nueva_confianza
             print(f"Nivel de confianza actualizado a: {self.confianza_IA}")
         else:
             print("Error: El valor de confianza debe estar entre 0 y 1.")
@@ -202,90 +588,126 @@ class RedNeuronal:
     #################
     def auto_extension_codigo(self):
         # Método principal para mejorar el código
-        pregunta_codigo = "Can you provide more code to improve?"
-        respuesta_codigo = self.enviar_pregunta_al_modelo(pregunta_codigo)
-        print(f"Pregunta Código: {pregunta_codigo}\nRespuesta Código: {respuesta_codigo}\n")
+        self.ejecutar_tareas([self.tarea_extension_codigo()])
 
-        # Procesar la respuesta y mejorar el código actual
-        self.procesar_respuesta_codigo(respuesta_codigo)
+    def tarea_extension_codigo(self):
+        # Pregunta de mejora de código y el procesamiento de su respuesta
+        pregunta_codigo = "Can you provide more code to improve?"
+        condiciones_parada = None
+        if self.transmitir:
+            # Cortar la generación al cerrarse el bloque de código o agotarse el presupuesto
+            condiciones_parada = [bloque_codigo_cerrado()]
+            if self.limite_tokens_respuesta:
+                condiciones_parada.append(limite_tokens(self.limite_tokens_respuesta))
+        opciones = {'condiciones_parada': condiciones_parada}
+        if self.transmitir or self.tamano_lote <= 1:
+            # Leer la respuesta en streaming y formatear cada bloque en cuanto se cierra, mientras el
+            # modelo sigue generando; en lotes la pregunta va sin opciones para poder agruparla
+            opciones['al_recibir'] = al_cerrar_bloque(self.preformatear_bloque)
+
+        def procesar(respuesta_codigo):
+            print(f"Pregunta Código: {pregunta_codigo}\nRespuesta Código: {respuesta_codigo}\n")
+
+            # Procesar la respuesta y mejorar el código actual
+            self.procesar_respuesta_codigo(respuesta_codigo, pregunta_codigo)
+
+        return Tarea(self.pregunta_con_contexto(pregunta_codigo), procesar, opciones)
+
+    def preformatear_bloque(self, codigo, etiqueta):
+        # Adelantar el formateo (memorizado) de un bloque Python recién cerrado: cuando se
+        # incorpore la respuesta completa, 'ajustar_formato' lo encontrará ya hecho
+        if etiqueta.lower() in ETIQUETAS_PYTHON and codigo.strip():
+            self.en_segundo_plano(self.formateador.formatear_codigo, codigo)
+
+    def pregunta_con_contexto(self, pregunta):
+        """
+        Añade a la pregunta el código acumulado más relevante, dentro de 'tokens_contexto'.
 
-    def procesar_respuesta_codigo(self, respuesta):
+        La relevancia se calcula con BM25 frente al último fragmento aceptado y sus
+        hallazgos. Sin corpus (o con tokens_contexto=0) la pregunta queda igual.
+        """
+        if not self.tokens_contexto or not len(self.corpus):
+            return pregunta
+        plantilla = "Here is the most relevant code we have so far:\n{codigo}\n\n{pregunta} Extend or improve it instead of repeating it."
+        consulta = self.corpus.leer(self.corpus.fragmentos[-1])
+        consulta += ' ' + ' '.join(hallazgo.detalle for hallazgo in self.ultimos_hallazgos)
+        presupuesto = self.tokens_contexto - estimar_tokens(plantilla + pregunta)
+        fragmentos = self.contexto.empaquetar(consulta, presupuesto)
+        if not fragmentos:
+            return pregunta
+        return plantilla.format(codigo='\n\n'.join(fragmentos), pregunta=pregunta)
+
+    def procesar_respuesta_codigo(self, respuesta, pregunta=None):
         # Procesar la respuesta recibida
         if any(keyword in respuesta for keyword in ["code", "suggestions"]):
-            # Aplicar mejoras al código existente
-            codigo_mejorado = self.aplicar_mejoras(respuesta)
-
-            # Escanear el código actual y buscar áreas para mejorar
-            areas_por_mejorar = self.escanear_codigo(codigo_mejorado)
-
-            # Ajustar el formato del código si es necesario
-            codigo_formateado = self.ajustar_formato(codigo_mejorado)
-
-            # Actualizar el código actual con las mejoras
-            self.actualizar_codigo(codigo_formateado)
-
-            # Utilizar areas_por_mejorar para registro o procesamiento adicional
-            print("Áreas identificadas para mejorar:", areas_por_mejorar)
+            # Formatear, guardar y escanear en segundo plano: el ciclo no espera a autopep8
+            self.en_segundo_plano(self.incorporar_codigo, respuesta, pregunta)
         else:
             # La respuesta no contiene código o sugerencias para mejorar
-            pass
-
-    def escanear_codigo(self, codigo_actual):
-        # Escanear el código para identificar áreas a mejorar
-        areas_por_mejorar = []
+            self.evaluador.registrar(respuesta, aceptada=False)
+
+    def incorporar_codigo(self, respuesta, pregunta=None):
+        # Descartar repeticiones exactas o casi exactas antes de formatear y guardar nada
+        duplicado = self.duplicados.comprobar_y_agregar(respuesta)
+        if duplicado is not None:
+            # Sin etiqueta para el evaluador: repetirse no dice nada de la calidad, y el texto
+            # original ya se etiquetó al aceptarlo (otra etiqueta sólo añadiría ruido)
+            self.metricas.contar('fragmentos_rechazados')
+            self.metricas.contar(f'fragmentos_rechazados_{duplicado.motivo}')
+            print(f"Fragmento descartado por repetido ({duplicado.motivo}, similitud {duplicado.similitud:.2f}).")
+            return None
 
-        # Escaneo para optimizar bucles (loops)
-        areas_por_mejorar.extend(self.analizar_optimizacion_bucles(codigo_actual))
+        # Ajustar el formato sólo del fragmento nuevo: el código anterior ya está formateado
+        codigo_formateado = self.ajustar_formato(respuesta)
 
-        # Escaneo para corregir nombres de variables
-        areas_por_mejorar.extend(self.analizar_nombres_variables(codigo_actual))
+        linea_base = self.corpus.lineas()
+        self.evaluador.registrar(respuesta, aceptada=True)
 
-        # Escaneo para agregar comentarios
-        areas_por_mejorar.extend(self.analizar_comentarios(codigo_actual))
+        # Añadir el fragmento al código actual
+        self.actualizar_codigo(codigo_formateado, pregunta)
 
-        # Otros análisis y escaneos pueden agregarse según sea necesario
+        # Escanear sólo el fragmento nuevo, numerando sus líneas dentro del código actual
+        return self.informar_areas_por_mejorar(codigo_formateado, linea_base)
 
+    def informar_areas_por_mejorar(self, codigo, linea_base=0):
+        areas_por_mejorar = self.escanear_codigo(codigo, linea_base)
+        self.ultimos_hallazgos = areas_por_mejorar
+        # Utilizar areas_por_mejorar para registro o procesamiento adicional
+        print("Áreas identificadas para mejorar:\n" + resumir_hallazgos(areas_por_mejorar))
         return areas_por_mejorar
 
+    def escanear_codigo(self, codigo_actual, linea_base=0):
+        """
+        Escanea el código para identificar áreas a mejorar.
+
+        Una sola pasada (ast, o tokens si el texto no es Python válido) devuelve
+        hallazgos estructurados (tipo, línea, detalle): bucles 'for ... in range(...)',
+        identificadores cortos y funciones o clases sin docstring.
+        """
+        with self.metricas.medir('escaneo'):
+            return self.escaner.escanear(codigo_actual, linea_base)
+
     def analizar_optimizacion_bucles(self, codigo):
         # Analizar y devolver áreas para optimizar bucles
-        areas_optimizar_bucles = []
-        for linea in codigo.split('\n'):
-            if 'for' in linea and 'range' in linea:
-                areas_optimizar_bucles.append(linea)
-        return areas_optimizar_bucles
+        return [hallazgo for hallazgo in self.escanear_codigo(codigo) if hallazgo.tipo == 'bucle_range']
 
     def analizar_nombres_variables(self, codigo):
         # Analizar y devolver áreas para corregir nombres de variables
-        areas_corregir_nombres = []
-        for linea in codigo.split('\n'):
-            palabras = linea.split()
-            for palabra in palabras:
-                if len(palabra) <= 3:
-                    areas_corregir_nombres.append(palabra)
-        return areas_corregir_nombres
+        return [hallazgo for hallazgo in self.escanear_codigo(codigo) if hallazgo.tipo == 'nombre_corto']
 
     def analizar_comentarios(self, codigo):
-        # Analizar y devolver áreas para agregar comentarios
-        areas_agregar_comentarios = []
-        lineas = codigo.split('\n')
-        for i in range(len(lineas)):
-            if lineas[i].strip() != '' and i < len(lineas) - 1 and lineas[i + 1].strip() == '':
-                areas_agregar_comentarios.append(lineas[i])
-        return areas_agregar_comentarios
-
-    def aplicar_mejoras(self, respuesta):
-        # Aplicar las mejoras sugeridas por la respuesta
-        codigo_mejorado = self.codigo_actual + respuesta
-        return codigo_mejorado
+        # Analizar y devolver áreas para agregar comentarios (funciones y clases sin docstring)
+        return [hallazgo for hallazgo in self.escanear_codigo(codigo) if hallazgo.tipo == 'sin_documentar']
 
     def ajustar_formato(self, codigo, estilo='autopep8'):
         # Ajustar el formato del código
         try:
             if estilo == 'autopep8':
-                # Aplicar formato PEP 8 utilizando autopep8
-                codigo_formateado = autopep8.fix_code(codigo)
-                print("Código formateado según PEP 8.")
+                # Aplicar formato PEP 8 (autopep8) a los bloques de código, no a la prosa
+                with self.metricas.medir('autopep8'):
+                    codigo_formateado = self.formateador.formatear(codigo)
+                if codigo_formateado != codigo:
+                    print("Código formateado según PEP 8.")
                 return codigo_formateado
             elif estilo == 'indentacion':
                 # Aplicar únicamente indentación
@@ -299,23 +721,18 @@ class RedNeuronal:
             print(f"Error al ajustar el formato del código: {e}")
             return codigo
 
-    def actualizar_codigo(self, codigo):
-        # Actualizar el código actual con el código mejorado
-        self.codigo_actual = codigo
-        # Guardar el código actualizado o realizar otros pasos necesarios
-        self.guardar_codigo_actual()
+    def actualizar_codigo(self, fragmento, pregunta=None):
+        # Actualizar el código actual con el fragmento mejorado
+        # Guardar el fragmento o realizar otros pasos necesarios
+        self.guardar_codigo_actual(fragmento, pregunta)
 
-    def guardar_codigo_actual(self):
-        # Guardar el código actualizado en un archivo
+    def guardar_codigo_actual(self, fragmento, pregunta=None):
+        # Añadir el fragmento al final de codigo_actual.txt (una sola vez) y a su índice
         try:
-            nombre_archivo = 'codigo_actual.txt'
-            if os.path.exists(nombre_archivo):
-                modo_apertura = 'a'
-            else:
-                modo_apertura = 'w'
-            with open(nombre_archivo, modo_apertura) as file:
-                file.write(self.codigo_actual)
-                print("Código actualizado guardado exitosamente en el archivo.")
+            self.corpus.agregar(fragmento, epoca=self.epoca, pregunta=pregunta)
+            self.metricas.fijar('corpus_fragmentos', len(self.corpus))
+            self.metricas.fijar('corpus_bytes', self.corpus.tamano())
+            print("Código actualizado guardado exitosamente en el archivo.")
         except Exception as e:
             print(f"Error al guardar el código actualizado: {e}")
 
@@ -327,77 +744,116 @@ class RedNeuronal:
     def generar_pregunta_autonoma(self):
         # Verificar si el entrenamiento está completo
         if self.entrenamiento_completo:
-            # Lista de preguntas automáticas
-            preguntas_automaticas = [
-                "What could be a potential optimization strategy for the current problem?",
-                "How might this solution generalize to other similar scenarios?",
-                "What alternative approaches could be explored?",
-                "Are there any recent advancements in the field that could be applied here?",
-                "What potential drawbacks might exist in the current implementation?",
-                "How does this solution align with industry best practices?",
-                # Agregar más preguntas relevantes basadas en el contexto del entrenamiento
-            ]
-
-            # Seleccionar una pregunta al azar
-            pregunta_generada = random.choice(preguntas_automaticas)
-            respuesta_generada = self.enviar_pregunta_al_modelo(pregunta_generada)
-
-            # Procesar la respuesta generada si es necesario
-            self.procesar_respuesta_autonoma(respuesta_generada)
+            resultados = self.ejecutar_tareas([self.tarea_pregunta_autonoma()])
+            if not resultados:
+                # La pregunta falló: no procesar un error como si fuera una respuesta del modelo
+                return None, None
 
             # Devolver la pregunta y respuesta generadas
-            return pregunta_generada, respuesta_generada
+            return resultados[0]
         else:
             # Mensaje si el entrenamiento no está completo
             return "El entrenamiento aún no está completo. Por favor, espere hasta que se complete el proceso."
 
+    def tarea_pregunta_autonoma(self):
+        # Lista de preguntas automáticas
+        preguntas_automaticas = [
+            "What could be a potential optimization strategy for the current problem?",
+            "How might this solution generalize to other similar scenarios?",
+            "What alternative approaches could be explored?",
+            "Are there any recent advancements in the field that could be applied here?",
+            "What potential drawbacks might exist in the current implementation?",
+            "How does this solution align with industry best practices?",
+            # Agregar más preguntas relevantes basadas en el contexto del entrenamiento
+        ]
+
+        # Seleccionar una pregunta al azar
+        pregunta_generada = random.choice(preguntas_automaticas)
+
+        def procesar(respuesta_generada):
+            # Procesar la respuesta generada si es necesario
+            self.procesar_respuesta_autonoma(respuesta_generada)
+            return respuesta_generada
+
+        return Tarea(pregunta_generada, procesar, {})
+
     def aprender_autonomamente(self):
         # Verificar si el entrenamiento no está completo
         if not self.entrenamiento_completo:
-            # Lista de preguntas automáticas
-            preguntas_automaticas = [
-                "Could you elaborate more on the positive aspects?",
-                "Could you explain more about the negative aspects?",
-                "What other insights can you provide?",
-                "What specific challenges did you encounter?",
-                "How does this relate to your previous experiences?",
-                "In what ways do you think this could be improved?",
-                "Can you provide more details on that particular point?",
-                "What impact do you foresee from these actions?",
-                "Are there any alternative approaches you considered?",
-                "How do you think this might affect future outcomes?"
-            ]
-
-            # Seleccionar una pregunta al azar
-            pregunta = random.choice(preguntas_automaticas)
-
-            # Enviar la pregunta al modelo y obtener la respuesta
-            respuesta = self.enviar_pregunta_al_modelo(pregunta)
-            
+            # Enviar la pregunta al modelo y procesar la respuesta
+            self.ejecutar_tareas([self.tarea_aprendizaje_autonomo()])
+
+        else:
+            # Mensaje si el entrenamiento está completo
+            print("El entrenamiento ya está completo.")
+
+    def tarea_aprendizaje_autonomo(self):
+        # Lista de preguntas automáticas
+        preguntas_automaticas = [
+            "Could you elaborate more on the positive aspects?",
+            "Could you explain more about the negative aspects?",
+            "What other insights can you provide?",
+            "What specific challenges did you encounter?",
+            "How does this relate to your previous experiences?",
+            "In what ways do you think this could be improved?",
+            "Can you provide more details on that particular point?",
+            "What impact do you foresee from these actions?",
+            "Are there any alternative approaches you considered?",
+            "How do you think this might affect future outcomes?"
+        ]
+
+        # Seleccionar una pregunta al azar
+        pregunta = random.choice(preguntas_automaticas)
+
+        def procesar(respuesta):
             # Imprimir la pregunta y respuesta
             print(f"Pregunta Autónoma: {pregunta}\nRespuesta Autónoma: {respuesta}\n")
 
             # Procesar la respuesta para el aprendizaje (agrega tu lógica aquí)
             self.procesar_respuesta_aprendizaje(respuesta)
 
-        else:
-            # Mensaje si el entrenamiento está completo
-            print("El entrenamiento ya está completo.")
+        return Tarea(pregunta, procesar, {})
 
     def procesar_respuesta_aprendizaje(self, respuesta):
         # Llamar a la función analizar_respuesta
         self.analizar_respuesta(respuesta)
 
+    def contar_retroalimentacion(self, respuesta):
+        # Las respuestas se procesan en varios hilos a la vez: se acumulan y se puntúan en lote
+        with self._lock_estado:
+            self._por_evaluar.append(respuesta)
+
+    def evaluar_respuestas(self):
+        """
+        Aprende de las respuestas juzgadas y puntúa en un solo lote las pendientes.
+
+        Las puntuaciones por encima (o por debajo) de 0,5 ± 'margen_retroalimentacion'
+        cuentan como retroalimentación positiva (o negativa), y 'confianza_IA' pasa a
+        ser la puntuación media de las últimas respuestas.
+        """
+        with self._lock_estado:
+            respuestas, self._por_evaluar = self._por_evaluar, []
+        with self.metricas.medir('evaluacion'):
+            self.metricas.contar('respuestas_juzgadas', self.evaluador.entrenar())
+            if not respuestas:
+                return
+            puntuaciones = self.evaluador.puntuar(respuestas)
+        self.metricas.contar('respuestas_evaluadas', len(respuestas))
+        with self._lock_estado:
+            self.retroalimentacion_positiva += int((puntuaciones >= 0.5 + self.margen_retroalimentacion).sum())
+            self.retroalimentacion_negativa += int((puntuaciones <= 0.5 - self.margen_retroalimentacion).sum())
+            self.confianza_IA = self.evaluador.confianza()
+
     def procesar_respuesta_autonoma(self, respuesta):
         # Llamar a la función analizar_respuesta
         self.analizar_respuesta(respuesta)
 
     def analizar_respuesta(self, respuesta):
         # Verificar si la respuesta es positiva o negativa y actualizar contadores
-        if "positiva" in respuesta:
-            self.retroalimentacion_positiva += 1
-        elif "negativa" in respuesta:
-            self.retroalimentacion_negativa += 1
+        self.contar_retroalimentacion(respuesta)
+
+        # Guardar la respuesta como contexto recuperable para las preguntas de mejora
+        self.contexto.agregar_respuesta(respuesta)
 
         # Extraer y usar datos relevantes
         datos_relevantes = self.extraer_datos(respuesta)
@@ -409,26 +865,70 @@ class RedNeuronal:
 
     #######################
 
-    def ciclo_entrenamiento(self):
+    def ciclo_entrenamiento(self, planificador=None):
+        """
+        Ejecuta ciclos de entrenamiento hasta completarlo o recibir SIGINT/SIGTERM.
+
+        El planificador decide la pausa entre ciclos según la latencia medida, los
+        errores y el presupuesto de solicitudes por minuto; el guardado y la
+        exportación de métricas se encolan en el hilo de escritura ('escritor').
+        Se informa del tiempo real de cada época y se avisa al perfilador si lo hay.
+        """
+        self.planificador = planificador or self.planificador or PlanificadorEntrenamiento()
+        self.planificador.instalar_senales()
         epoch = 0  # Contador de épocas
-        while not self.entrenamiento_completo:
-            self.auto_extension_codigo()
-            self.aprender_autonomamente()
+        inicio = time.monotonic()
+        try:
+            while not self.entrenamiento_completo and not self.planificador.detenido():
+                inicio_epoca = time.monotonic()
+                if self.perfilador is not None:
+                    self.perfilador.inicio_epoca(self.epoca)
+
+                # Enviar las preguntas independientes del ciclo a la vez (o en lote) y procesarlas según llegan
+                tareas = self.tareas_ciclo()
+                self.ejecutar_tareas(tareas)
+                with self._lock_estado:
+                    self.epoca += 1
+                self.solicitar_guardado()
+                if self.perfilador is not None:
+                    self.perfilador.fin_epoca(self.epoca)
+
+                # Actualizar estado de entrenamiento
+                epoch += 1
+                duracion = time.monotonic() - inicio_epoca
+                tiempo_transcurrido = time.monotonic() - inicio
+                calidad_entrenamiento = self.calcular_calidad()  # Función que calcula la calidad del entrenamiento
+                self.metricas.observar('epoca', duracion)
+                self.metricas.fijar('epoca', self.epoca)
+                self.metricas.fijar('calidad', calidad_entrenamiento)
+                self.registrar_epoca(duracion, calidad_entrenamiento)
+                self.escritor.solicitar('metricas', self.exportar_metricas)
+                print(f"Epoch: {epoch}, Duración: {duracion:.1f} segundos, "
+                      f"Tiempo transcurrido: {tiempo_transcurrido:.1f} segundos, Calidad: {calidad_entrenamiento}")
+
+                print(f"Estado de entrenamiento: {'Completo' if self.entrenamiento_completo else 'En progreso'}")
+                self.planificador.esperar(len(tareas))  # Pausa adaptativa antes del siguiente ciclo
+        finally:
+            # Terminar el trabajo pendiente y las escrituras encoladas, y guardar el estado final
+            self.planificador.cerrar()
+            self.planificador = None
+            self.escritor.vaciar()
             self.guardar_cerebro()
 
-            # Actualizar estado de entrenamiento
-            epoch += 1
-            tiempo_transcurrido = epoch * 20  # Cada ciclo es de 20 segundos
-            calidad_entrenamiento = self.calcular_calidad()  # Función que calcula la calidad del entrenamiento
-            print(f"Epoch: {epoch}, Tiempo transcurrido: {tiempo_transcurrido} segundos, Calidad: {calidad_entrenamiento}")
+    def tareas_ciclo(self):
+        # Preguntas de un ciclo: mejora de código, aprendizaje autónomo y, al terminar el entrenamiento, la pregunta autónoma
+        tareas = [self.tarea_extension_codigo()]
+        if not self.entrenamiento_completo:
+            tareas.append(self.tarea_aprendizaje_autonomo())
+        else:
+            tarea = self.tarea_pregunta_autonoma()
 
-            # Añade la llamada a la función generar_pregunta_autonoma()
-            pregunta_generada, respuesta_generada = self.generar_pregunta_autonoma()
-            print(f"Pregunta Autónoma: {pregunta_generada}\nRespuesta Autónoma: {respuesta_generada}\n")
-            
-            print(f"Estado de entrenamiento: {'Completo' if self.entrenamiento_completo else 'En progreso'}")
-            time.sleep(20)  # Esperar 20 segundos antes de iniciar el siguiente ciclo
+            def procesar(respuesta_generada, procesar_respuesta=tarea.procesar):
+                procesar_respuesta(respuesta_generada)
+                print(f"Pregunta Autónoma: {tarea.pregunta}\nRespuesta Autónoma: {respuesta_generada}\n")
 
+            tareas.append(tarea._replace(procesar=procesar))
+        return tareas
 
     def calcular_calidad(self):
         #  métricas reales para evaluar el entrenamiento
@@ -437,6 +937,9 @@ class RedNeuronal:
         precision = self.calcular_precision()  # Función que calcula la precisión
         perdida = self.calcular_perdida()  # Función que calcula la pérdida
         puntaje_f1 = self.calcular_puntaje_f1()  # Función que calcula el puntaje F1
+        self.metricas.fijar('evaluador_precision', precision)
+        self.metricas.fijar('evaluador_perdida', perdida)
+        self.metricas.fijar('evaluador_f1', puntaje_f1)
 
         # Podrías ponderar estas métricas o utilizar cualquier otro método para calcular la calidad
         calidad = (precision + puntaje_f1) / 2 - perdida  # Fórmula de calidad de ejemplo
@@ -444,49 +947,74 @@ class RedNeuronal:
         return calidad
 
     def calcular_precision(self):
-        # Lógica para calcular la precisión
-        # Puede ser mediante evaluación con datos de prueba o validación cruzada
-        # Ejemplo: métrica de precisión del modelo
-        precision = 0.85  # Ejemplo de precisión
-        return precision
+        # Precisión del evaluador sobre las últimas respuestas juzgadas, predichas antes de aprenderlas
+        return self.evaluador.precision()
 
     def calcular_perdida(self):
-        # Lógica para calcular la pérdida
-        # Puede ser la función de pérdida utilizada durante el entrenamiento
-        # Ejemplo: pérdida del modelo
-        perdida = 0.3  # Ejemplo de pérdida
-        return perdida
+        # Entropía cruzada del evaluador en esas mismas respuestas
+        return self.evaluador.perdida()
 
     def calcular_puntaje_f1(self):
-        # Lógica para calcular el puntaje F1
-        # Puede ser otra métrica de evaluación del modelo
-        # Ejemplo: puntaje F1 del modelo
-        puntaje_f1 = 0.78  # Ejemplo de puntaje F1
-        return puntaje_f1
+        # Puntaje F1 del evaluador (respuestas aceptadas como clase positiva)
+        return self.evaluador.puntaje_f1()
+
+    def exportar_metricas(self):
+        # Reescribir los archivos de métricas configurados (JSON y Prometheus)
+        try:
+            self.metricas.exportar()
+        except OSError as e:
+            print(f"Error al exportar las métricas: {e}")
 
     def guardar_cada_5_minutos(self):
-        threading.Timer(300, self.guardar_cada_5_minutos).start()  # 300 segundos = 5 minutos
-        self.guardar_cerebro()
+        # Guardado periódico en el hilo de escritura (sin crear un hilo nuevo por guardado)
+        self.escritor.cada(300, 'cerebro_periodico', self.guardar_cerebro)  # 300 segundos = 5 minutos
+        self.solicitar_guardado()
+
+    def solicitar_guardado(self):
+        # Encolar un guardado sin esperar al disco; los que se acumulan se combinan en uno
+        self.escritor.solicitar('cerebro', self.guardar_cerebro)
 
     def guardar_cerebro(self):
+        # Guardar sólo los cambios desde el último punto de control (los guardados simultáneos se combinan)
         try:
-            with open('cerebro.pkl', 'wb') as file:
-                pickle.dump(self, file)
-                print("Cerebro guardado exitosamente.")
+            with self.metricas.medir('guardado'):
+                self.almacen.guardar(self.estado_persistente())
+                if self._evaluador is not None and self._evaluador.modificado:
+                    self._evaluador.guardar(self.ruta_evaluador)
+                if self._historial is not None:
+                    self._historial.sincronizar()
+            print("Cerebro guardado exitosamente.")
         except Exception as e:
             print(f"Error al guardar el cerebro: {e}")
 
 
     @staticmethod
-    def cargar_cerebro():
+    def cargar_cerebro(almacen=None, ruta_pickle='cerebro.pkl'):
+        """
+        Carga el cerebro desde sus puntos de control.
+
+        Si todavía no hay puntos de control pero existe un cerebro.pkl antiguo,
+        lo migra sin ejecutar código del pickle y guarda el primer punto de control.
+        """
+        almacen = almacen or AlmacenCerebro()
+        migrado = False
         try:
-            with open('cerebro.pkl', 'rb') as file:
-                red_neuronal = pickle.load(file)
-                print("Cerebro cargado exitosamente.")
-                return red_neuronal
-        except FileNotFoundError:
-            print("No se encontró ningún cerebro existente.")
-            return None
-        except Exception as e:
+            estado = almacen.cargar()
+            if estado is None and os.path.exists(ruta_pickle):
+                estado = migrar_pickle(ruta_pickle)
+                migrado = True
+        except (ErrorAlmacenCerebro, OSError) as e:
             print(f"Error al cargar el cerebro: {e}")
             return None
+
+        if estado is None:
+            print("No se encontró ningún cerebro existente.")
+            return None
+
+        red_neuronal = RedNeuronal(estado.get('chat_id', ''), almacen=almacen)
+        red_neuronal.restaurar_estado(estado)
+        if migrado:
+            red_neuronal.guardar_cerebro()
+            print(f"Cerebro migrado desde {ruta_pickle}.")
+        print("Cerebro cargado exitosamente.")
+        return red_neuronal
@@ -0,0 +1,88 @@
+"""
+Varias preguntas en una sola solicitud.
+
+En inferencia por CPU el procesado del prompt y el coste fijo de cada
+solicitud pesan mucho en la latencia. Este módulo junta varias preguntas en un
+prompt con marcadores numerados ('[[QUESTION n]]' / '[[ANSWER n]]'), separa la
+respuesta en una por pregunta y procesa cada una como si se hubiera preguntado
+sola. Si la respuesta no trae exactamente una sección por pregunta, las
+preguntas se vuelven a enviar por separado.
+"""
+
+import re
+
+from despachador import Tarea
+
+
+PLANTILLA_LOTE = ("Answer each of the following {cantidad} questions separately. Start every answer with the marker "
+                  "of its number, exactly as written (for example [[ANSWER 1]]), and do not write anything else "
+                  "outside the answers.\n\n{preguntas}")
+PATRON_RESPUESTA = re.compile(r'\[\[\s*ANSWER\s+(\d+)\s*\]\]', re.IGNORECASE)
+
+
+def componer_lote(preguntas):
+    """
+    Prompt con las preguntas numeradas y las instrucciones para marcar cada respuesta.
+    """
+    listado = '\n\n'.join(f"[[QUESTION {numero}]] {pregunta}" for numero, pregunta in enumerate(preguntas, 1))
+    return PLANTILLA_LOTE.format(cantidad=len(preguntas), preguntas=listado)
+
+
+def dividir_respuesta(respuesta, cantidad):
+    """
+    Separa la respuesta de un lote en 'cantidad' respuestas, o devuelve None si no se puede.
+
+    Cada número de 1 a 'cantidad' debe aparecer una sola vez y con texto.
+    """
+    partes = PATRON_RESPUESTA.split(respuesta)
+    respuestas = {}
+    for numero, texto in zip(partes[1::2], partes[2::2]):
+        numero = int(numero)
+        if numero in respuestas or not 1 <= numero <= cantidad or not texto.strip():
+            return None
+        respuestas[numero] = texto.strip()
+    if len(respuestas) != cantidad:
+        return None
+    return [respuestas[numero] for numero in range(1, cantidad + 1)]
+
+
+def agrupar_tareas(tareas, tamano, reintentar):
+    """
+    Junta las tareas en lotes de hasta 'tamano' preguntas.
+
+    Sólo se agrupan las tareas sin opciones (las condiciones de parada cortarían
+    el lote tras la primera respuesta). El 'procesar' de cada tarea devuelta
+    genera una lista de (pregunta, resultado); si la respuesta de un lote no se
+    puede separar, 'reintentar(tareas)' envía sus preguntas por separado y
+    devuelve esa lista.
+    """
+    agrupables = [tarea for tarea in tareas if not any(tarea.opciones.values())]
+    resto = [tarea for tarea in tareas if any(tarea.opciones.values())]
+    if tamano <= 1:
+        agrupables, resto = [], tareas
+
+    resultado = [_individual(tarea) for tarea in resto]
+    for inicio in range(0, len(agrupables), tamano):
+        grupo = agrupables[inicio:inicio + tamano]
+        if len(grupo) == 1:
+            resultado.append(_individual(grupo[0]))
+        else:
+            resultado.append(Tarea(componer_lote([tarea.pregunta for tarea in grupo]),
+                                   _procesar_lote(grupo, reintentar), {}))
+    return resultado
+
+
+def _individual(tarea):
+    def procesar(respuesta):
+        return [(tarea.pregunta, tarea.procesar(respuesta))]
+    return tarea._replace(procesar=procesar)
+
+
+def _procesar_lote(grupo, reintentar):
+    def procesar(respuesta):
+        respuestas = dividir_respuesta(respuesta, len(grupo))
+        if respuestas is None:
+            print(f"No se pudo separar la respuesta del lote de {len(grupo)} preguntas; se preguntan por separado.")
+            return reintentar(grupo)
+        return [(tarea.pregunta, tarea.procesar(texto)) for tarea, texto in zip(grupo, respuestas)]
+    return procesar
@@ -16,7 +16,7 @@ Usage:
 3. Run the script using the command: python mainy.py.
 
 Important Files:
-- cerebro.pkl: Stores the current state of the neural network.
+- cerebro/: Stores the current state of the neural network (snapshot + change journal; old cerebro.pkl files are migrated on load).
 - codigo_actual.txt: Contains the extracted code from conversations with the language model.
 
 Additional Notes:
@@ -30,28 +30,89 @@ Happy coding!
 
 
 
-from homero import *
+import time
+inicio_arranque = time.perf_counter()
 
-# Crear o cargar el objeto RedNeuronal con el chat_id existente o generado automáticamente
-red_neuronal = RedNeuronal('')
-if red_neuronal.chat_id == '':
-    red_neuronal.obtener_chat_id()
-    while red_neuronal.chat_id == '':  # Esperar hasta que se obtenga un chat_id
-        time.sleep(5)  # Esperar 5 segundos antes de volver a verificar
-else:
-    # Intentar cargar el cerebro existente o crear uno nuevo si no existe
-    red_cargado = RedNeuronal.cargar_cerebro()
-    if red_cargado:
-        red_neuronal = red_cargado
-    else:
+import os
+
+from homero import RedNeuronal
+from transporte import ErrorSerge
+from cache_respuestas import CacheRespuestas
+from balanceador import PoolBackends
+from metricas import Metricas, PerfiladorEpocas
+from planificador import PlanificadorEntrenamiento
+from grabacion import ClienteGrabador, ClienteReproductor, cliente_desde_entorno
+from diferido import precargar, tiempos_importacion
+
+tiempo_importacion = time.perf_counter() - inicio_arranque
+
+
+def main():
+    # Los procesos del pool de formateo creados con 'forkserver' o 'spawn' importan este módulo:
+    # el arranque va aquí para que no se vuelva a ejecutar en ellos
+
+    # Crear el pool de formateo antes de que arranque ningún hilo
+    RedNeuronal.formateador.iniciar()
+    # Importar 'requests' y 'numpy' (evaluador de respuestas) en segundo plano mientras se carga el cerebro
+    precarga = precargar('requests', 'numpy')
+
+    # Cargar el cerebro existente (o migrar cerebro.pkl) o crear uno nuevo
+    inicio_carga = time.perf_counter()
+    red_neuronal = RedNeuronal.cargar_cerebro() or RedNeuronal('')
+    tiempo_carga = time.perf_counter() - inicio_carga
+
+    if os.environ.get('CACHE_RESPUESTAS'):
+        # Caché opcional de respuestas repetidas (ruta del archivo SQLite)
+        red_neuronal.cache = CacheRespuestas(os.environ['CACHE_RESPUESTAS'])
+    # Varias instancias de Serge (SERGE_BACKENDS); cada backend crea sus propios chats
+    red_neuronal.pool = PoolBackends.desde_entorno()
+    # Grabar los intercambios con Serge (GRABAR_INTERCAMBIOS) o reproducirlos sin servidor (REPRODUCIR_INTERCAMBIOS)
+    cliente = cliente_desde_entorno(red_neuronal.cliente)
+    if isinstance(cliente, ClienteReproductor):
+        red_neuronal.pool = None
+    elif cliente is not None and red_neuronal.pool is not None:
+        for backend in red_neuronal.pool.backends:
+            backend.cliente = ClienteGrabador(backend.cliente, cliente.registro)
+    if cliente is not None:
+        red_neuronal.cliente = cliente
+    # Métricas: archivos (METRICAS_JSON, METRICAS_PROMETHEUS) y endpoint HTTP opcional (METRICAS_PUERTO),
+    # sólo en la máquina local salvo que METRICAS_HOST indique otra interfaz
+    red_neuronal.metricas = Metricas.desde_entorno()
+    if os.environ.get('METRICAS_PUERTO'):
+        host = os.environ.get('METRICAS_HOST', '127.0.0.1')
+        red_neuronal.metricas.servir(int(os.environ['METRICAS_PUERTO']), host)
+    if os.environ.get('TAMANO_LOTE'):
+        # Agrupar hasta N preguntas independientes en cada solicitud
+        red_neuronal.tamano_lote = int(os.environ['TAMANO_LOTE'])
+    if os.environ.get('PERFILAR_EPOCAS'):
+        # Perfilar con cProfile las primeras N épocas
+        red_neuronal.perfilador = PerfiladorEpocas(int(os.environ['PERFILAR_EPOCAS']))
+
+    precarga.join()
+    tiempo_primera_solicitud = time.perf_counter() - inicio_arranque
+    print(f"Arranque: importación {tiempo_importacion * 1000:.0f} ms, carga del cerebro {tiempo_carga * 1000:.0f} ms, "
+          f"requests {tiempos_importacion.get('requests', 0) * 1000:.0f} ms y "
+          f"numpy {tiempos_importacion.get('numpy', 0) * 1000:.0f} ms (en segundo plano), "
+          f"primera solicitud a los {tiempo_primera_solicitud * 1000:.0f} ms")
+    red_neuronal.metricas.fijar('arranque_importacion_segundos', tiempo_importacion)
+    red_neuronal.metricas.fijar('arranque_carga_segundos', tiempo_carga)
+    red_neuronal.metricas.fijar('arranque_primera_solicitud_segundos', tiempo_primera_solicitud)
+
+    if red_neuronal.chat_id == '' and red_neuronal.pool is None:
+        while red_neuronal.chat_id == '':  # Esperar hasta que se obtenga un chat_id
+            try:
+                red_neuronal.obtener_chat_id()
+            except ErrorSerge as e:
+                print('Error creating chat:', e)
+                time.sleep(5)  # Esperar 5 segundos antes de volver a intentarlo
         red_neuronal.guardar_cerebro()  # Crear un nuevo cerebro
 
     # Iniciar proceso de aprendizaje con preguntas iniciales
     red_neuronal.iniciar_aprendizaje()
 
-while not red_neuronal.entrenamiento_completo:
-    red_neuronal.auto_extension_codigo()
-    red_neuronal.aprender_autonomamente()
-    red_neuronal.guardar_cerebro()
-    print(f"Estado de entrenamiento: {'Completo' if red_neuronal.entrenamiento_completo else 'En progreso'}")
-    time.sleep(20)  # Esperar 20 segundos antes de iniciar el siguiente cicloF
\ No newline at end of file
+    # Ciclo de entrenamiento con pausas adaptativas (MAX_SOLICITUDES_MINUTO limita la carga sobre Serge)
+    red_neuronal.ciclo_entrenamiento(PlanificadorEntrenamiento.desde_entorno())
+
+
+if __name__ == '__main__':
+    main()
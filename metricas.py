@@ -0,0 +1,204 @@
+"""
+Métricas del ciclo de entrenamiento.
+
+Contadores (solicitudes, errores, aciertos de caché, bytes recibidos),
+indicadores (tamaño del corpus, época, calidad) y tiempos por etapa (solicitud
+HTTP, primer byte, streaming, clean_response, autopep8, escaneo, guardado).
+Se exportan como instantánea JSON y en formato de texto de Prometheus, a un
+archivo o por HTTP en '/metrics'. 'PerfiladorEpocas' activa cProfile durante
+unas pocas épocas para ver en qué se va el tiempo.
+"""
+
+import io
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from almacen_cerebro import escribir_atomico
+
+
+PREFIJO = 'homero'
+
+
+class Metricas:
+    """
+    Registro de métricas seguro entre hilos.
+    """
+
+    def __init__(self, ruta_json=None, ruta_prometheus=None):
+        self.ruta_json = ruta_json
+        self.ruta_prometheus = ruta_prometheus
+        self.contadores = {}
+        self.indicadores = {}
+        self.tiempos = {}  # etapa -> [n, suma, máximo, último]
+        self.inicio = time.time()
+        self._lock = threading.Lock()
+        self._servidor = None
+
+    @classmethod
+    def desde_entorno(cls):
+        # METRICAS_JSON / METRICAS_PROMETHEUS: archivos que se reescriben tras cada época
+        return cls(os.environ.get('METRICAS_JSON'), os.environ.get('METRICAS_PROMETHEUS'))
+
+    def contar(self, nombre, valor=1):
+        with self._lock:
+            self.contadores[nombre] = self.contadores.get(nombre, 0) + valor
+
+    def fijar(self, nombre, valor):
+        with self._lock:
+            self.indicadores[nombre] = valor
+
+    def observar(self, etapa, segundos):
+        with self._lock:
+            tiempo = self.tiempos.get(etapa)
+            if tiempo is None:
+                self.tiempos[etapa] = [1, segundos, segundos, segundos]
+            else:
+                tiempo[0] += 1
+                tiempo[1] += segundos
+                tiempo[2] = max(tiempo[2], segundos)
+                tiempo[3] = segundos
+
+    @contextmanager
+    def medir(self, etapa):
+        # Medir la duración del bloque, también si termina con una excepción
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(etapa, time.perf_counter() - inicio)
+
+    def instantanea(self):
+        """
+        Copia de todas las métricas como diccionario serializable en JSON.
+        """
+        with self._lock:
+            return {
+                'fecha': time.time(),
+                'activo_desde': self.inicio,
+                'contadores': dict(self.contadores),
+                'indicadores': dict(self.indicadores),
+                'tiempos': {etapa: {'n': n, 'suma': suma, 'media': suma / n, 'max': maximo, 'ultimo': ultimo}
+                            for etapa, (n, suma, maximo, ultimo) in self.tiempos.items()},
+            }
+
+    def texto_prometheus(self):
+        """
+        Métricas en el formato de texto de Prometheus.
+        """
+        instantanea = self.instantanea()
+        lineas = []
+        for nombre, valor in sorted(instantanea['contadores'].items()):
+            lineas.append(f"# TYPE {PREFIJO}_{nombre}_total counter")
+            lineas.append(f"{PREFIJO}_{nombre}_total {valor}")
+        for nombre, valor in sorted(instantanea['indicadores'].items()):
+            if isinstance(valor, (int, float)):
+                lineas.append(f"# TYPE {PREFIJO}_{nombre} gauge")
+                lineas.append(f"{PREFIJO}_{nombre} {valor}")
+        if instantanea['tiempos']:
+            lineas.append(f"# TYPE {PREFIJO}_duracion_segundos summary")
+            for etapa, tiempo in sorted(instantanea['tiempos'].items()):
+                lineas.append(f'{PREFIJO}_duracion_segundos_count{{etapa="{etapa}"}} {tiempo["n"]}')
+                lineas.append(f'{PREFIJO}_duracion_segundos_sum{{etapa="{etapa}"}} {tiempo["suma"]}')
+            lineas.append(f"# TYPE {PREFIJO}_duracion_maxima_segundos gauge")
+            for etapa, tiempo in sorted(instantanea['tiempos'].items()):
+                lineas.append(f'{PREFIJO}_duracion_maxima_segundos{{etapa="{etapa}"}} {tiempo["max"]}')
+        lineas.append(f"# TYPE {PREFIJO}_activo_desde_segundos gauge")
+        lineas.append(f"{PREFIJO}_activo_desde_segundos {instantanea['activo_desde']}")
+        return '\n'.join(lineas) + '\n'
+
+    def exportar(self):
+        # Reescribir de forma atómica los archivos configurados
+        if self.ruta_json:
+            escribir_atomico(self.ruta_json, json.dumps(self.instantanea(), indent=2, ensure_ascii=False))
+        if self.ruta_prometheus:
+            escribir_atomico(self.ruta_prometheus, self.texto_prometheus())
+
+    def servir(self, puerto, host='127.0.0.1'):
+        """
+        Publica las métricas por HTTP: '/metrics' (Prometheus) y '/metrics.json'.
+
+        Por defecto sólo se escucha en la máquina local; para publicarlas en otras
+        interfaces hay que indicar 'host' (por ejemplo '0.0.0.0').
+        """
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        metricas = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/metrics':
+                    cuerpo, tipo = metricas.texto_prometheus(), 'text/plain; version=0.0.4'
+                elif self.path == '/metrics.json':
+                    cuerpo, tipo = json.dumps(metricas.instantanea(), ensure_ascii=False), 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                datos = cuerpo.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', tipo)
+                self.send_header('Content-Length', str(len(datos)))
+                self.end_headers()
+                self.wfile.write(datos)
+
+            def log_message(self, formato, *args):
+                pass
+
+        self._servidor = ThreadingHTTPServer((host, puerto), Manejador)
+        self._servidor.daemon_threads = True
+        threading.Thread(target=self._servidor.serve_forever, name='metricas', daemon=True).start()
+        return self._servidor
+
+    def cerrar(self):
+        if self._servidor is not None:
+            self._servidor.shutdown()
+            self._servidor.server_close()
+            self._servidor = None
+
+
+class PerfiladorEpocas:
+    """
+    Perfila con cProfile las primeras 'epocas' épocas y guarda las estadísticas.
+
+    Se conecta asignándolo a 'RedNeuronal.perfilador'; cualquier objeto con
+    'inicio_epoca(epoca)' y 'fin_epoca(epoca)' sirve igual. cProfile sólo ve el
+    hilo que llama al ciclo (procesado de respuestas, formato, escaneo); las
+    esperas de red de los hilos del despachador aparecen como tiempos de
+    solicitud en 'Metricas'.
+    """
+
+    def __init__(self, epocas=3, ruta='perfil_entrenamiento.prof', lineas_resumen=20):
+        self.epocas = epocas
+        self.ruta = ruta
+        self.lineas_resumen = lineas_resumen
+        self.perfiladas = 0
+        self._perfil = None
+
+    def activo(self):
+        return self.perfiladas < self.epocas
+
+    def inicio_epoca(self, epoca):
+        if self.activo():
+            if self._perfil is None:
+                import cProfile
+                self._perfil = cProfile.Profile()
+            self._perfil.enable()
+
+    def fin_epoca(self, epoca):
+        if self._perfil is None or not self.activo():
+            return
+        self._perfil.disable()
+        self.perfiladas += 1
+        if not self.activo():
+            self._perfil.dump_stats(self.ruta)
+            print(f"Perfil de {self.perfiladas} épocas guardado en {self.ruta}:\n{self.resumen()}")
+            self._perfil = None
+
+    def resumen(self):
+        # Funciones con más tiempo acumulado
+        import pstats
+        salida = io.StringIO()
+        pstats.Stats(self.ruta, stream=salida).sort_stats('cumulative').print_stats(self.lineas_resumen)
+        return salida.getvalue()
@@ -0,0 +1,134 @@
+"""
+Un único hilo de fondo para todas las escrituras a disco.
+
+Antes cada guardado periódico arrancaba un 'threading.Timer' nuevo y el ciclo
+guardaba además en cada época, sin coordinación. 'EscritorFondo' mantiene un
+solo hilo de larga vida alimentado por una cola: cada trabajo tiene una clave
+y, si ya hay uno pendiente con la misma clave, la petición nueva se combina
+con él (sólo importa el último estado). Los trabajos periódicos los programa
+el mismo hilo, y al cerrar se escribe todo lo pendiente.
+"""
+
+import atexit
+import queue
+import threading
+import time
+
+
+class EscritorFondo:
+    """
+    Hilo de escritura con cola, peticiones combinadas por clave y trabajos periódicos.
+
+    'solicitar' nunca espera al disco: sólo encola. 'vaciar' espera a que se
+    hayan escrito las peticiones hechas hasta ese momento y 'cerrar' además
+    detiene el hilo.
+    """
+
+    def __init__(self, nombre='persistencia'):
+        self.nombre = nombre
+        self.escrituras = 0
+        self.combinadas = 0
+        self._cola = queue.Queue()
+        self._pendientes = {}  # clave -> (función, argumentos), aún sin ejecutar
+        self._periodicos = {}  # clave -> [intervalo, próxima ejecución, función]
+        self._lock = threading.Lock()
+        self._hilo = None
+        self._cerrado = False
+
+    def _iniciar(self):
+        # Arrancar el hilo la primera vez que hay trabajo
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._ejecutar, name=self.nombre, daemon=True)
+            self._hilo.start()
+            atexit.register(self.cerrar)
+
+    def solicitar(self, clave, funcion, *args):
+        """
+        Encola 'funcion(*args)'; si ya hay una petición pendiente con la misma clave, la sustituye.
+        """
+        with self._lock:
+            if self._cerrado:
+                raise RuntimeError("El escritor en segundo plano está cerrado")
+            self._iniciar()
+            combinada = clave in self._pendientes
+            self._pendientes[clave] = (funcion, args)
+            if combinada:
+                self.combinadas += 1
+                return False
+        self._cola.put(clave)
+        return True
+
+    def cada(self, segundos, clave, funcion, *args):
+        """
+        Ejecuta 'funcion(*args)' cada 'segundos' en el hilo de escritura (sustituye al anterior con la misma clave).
+        """
+        with self._lock:
+            self._iniciar()
+            self._periodicos[clave] = [segundos, time.monotonic() + segundos, funcion, args]
+        self._cola.put(None)  # Despertar al hilo para que recalcule la espera
+
+    def vaciar(self, timeout=None):
+        # Esperar a que se ejecuten las peticiones encoladas hasta ahora
+        if self._hilo is None:
+            return True
+        hecho = threading.Event()
+        self._cola.put(hecho)
+        return hecho.wait(timeout)
+
+    def cerrar(self, timeout=None):
+        """
+        Ejecuta lo pendiente y detiene el hilo; las peticiones posteriores fallan.
+        """
+        with self._lock:
+            if self._cerrado:
+                return
+            self._cerrado = True
+            self._periodicos.clear()
+        if self._hilo is not None:
+            self._cola.put(_FIN)
+            self._hilo.join(timeout)
+
+    def _espera(self):
+        # Segundos hasta el próximo trabajo periódico (None = esperar sin límite)
+        with self._lock:
+            if not self._periodicos:
+                return None
+            proximo = min(periodico[1] for periodico in self._periodicos.values())
+        return max(0.0, proximo - time.monotonic())
+
+    def _ejecutar(self):
+        while True:
+            try:
+                elemento = self._cola.get(timeout=self._espera())
+            except queue.Empty:
+                elemento = None
+            if elemento is _FIN:
+                return
+            if isinstance(elemento, threading.Event):
+                elemento.set()
+            elif elemento is not None:
+                with self._lock:
+                    funcion, args = self._pendientes.pop(elemento)
+                self._correr(elemento, funcion, args)
+            self._correr_periodicos()
+
+    def _correr_periodicos(self):
+        ahora = time.monotonic()
+        with self._lock:
+            vencidos = []
+            for clave, periodico in self._periodicos.items():
+                if periodico[1] <= ahora:
+                    periodico[1] = ahora + periodico[0]
+                    vencidos.append((clave, periodico[2], periodico[3]))
+        for clave, funcion, args in vencidos:
+            self._correr(clave, funcion, args)
+
+    def _correr(self, clave, funcion, args):
+        try:
+            funcion(*args)
+            self.escrituras += 1
+        except Exception as e:
+            print(f"Error en la escritura en segundo plano '{clave}': {e}")
+
+
+_FIN = object()
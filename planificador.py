@@ -0,0 +1,129 @@
+"""
+Planificador adaptativo del ciclo de entrenamiento.
+
+Sustituye al 'time.sleep(20)' fijo: la pausa entre ciclos se calcula a partir
+de la latencia medida del modelo (media móvil exponencial), de los errores
+consecutivos (espera exponencial) y de un presupuesto opcional de solicitudes
+por minuto. Las tareas que no afectan a la siguiente pregunta (guardados,
+escaneos) se ejecutan en un hilo de fondo, y SIGINT/SIGTERM detienen el ciclo
+de forma ordenada.
+"""
+
+import os
+import signal
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class PlanificadorEntrenamiento:
+    """
+    Decide cuánto esperar entre ciclos y ejecuta trabajo en segundo plano.
+    """
+
+    def __init__(self, pausa_minima=1.0, pausa_maxima=300.0, max_solicitudes_minuto=None,
+                 latencia_lenta=60.0, factor_carga=0.25, suavizado=0.3):
+        self.pausa_minima = pausa_minima
+        self.pausa_maxima = pausa_maxima
+        self.max_solicitudes_minuto = max_solicitudes_minuto
+        # Con respuestas más lentas que 'latencia_lenta' se deja descansar al servidor tanto como tardó
+        self.latencia_lenta = latencia_lenta
+        self.factor_carga = factor_carga
+        self.suavizado = suavizado
+        self.latencia_media = None
+        self.errores_seguidos = 0
+        self.detener = threading.Event()
+        self._solicitudes = deque()  # Instantes de las solicitudes del último minuto
+        self._lock = threading.Lock()
+        self._fondo = ThreadPoolExecutor(max_workers=1, thread_name_prefix='planificador')
+        self._senales_anteriores = {}
+
+    @classmethod
+    def desde_entorno(cls, **valores):
+        if 'MAX_SOLICITUDES_MINUTO' in os.environ:
+            valores.setdefault('max_solicitudes_minuto', int(os.environ['MAX_SOLICITUDES_MINUTO']))
+        return cls(**valores)
+
+    def instalar_senales(self):
+        # SIGINT/SIGTERM piden una parada ordenada; una segunda señal interrumpe de inmediato
+        if threading.current_thread() is not threading.main_thread():
+            return
+
+        def manejador(numero, marco):
+            if self.detener.is_set():
+                raise KeyboardInterrupt
+            print("Señal recibida: terminando el ciclo actual antes de salir.")
+            self.detener.set()
+
+        for senal in (signal.SIGINT, signal.SIGTERM):
+            self._senales_anteriores[senal] = signal.signal(senal, manejador)
+
+    def registrar_solicitud(self, latencia, error=False):
+        """
+        Registra una solicitud al modelo: su duración y si terminó en error.
+        """
+        with self._lock:
+            self._solicitudes.append(time.monotonic())
+            if error:
+                self.errores_seguidos += 1
+                return
+            self.errores_seguidos = 0
+            if self.latencia_media is None:
+                self.latencia_media = latencia
+            else:
+                self.latencia_media += self.suavizado * (latencia - self.latencia_media)
+
+    def pausa(self, solicitudes_siguientes=1):
+        """
+        Segundos a esperar antes del siguiente ciclo.
+        """
+        with self._lock:
+            pausa = self.pausa_minima
+            if self.latencia_media is not None:
+                # Pausa proporcional a la carga del servidor, y completa si está lento
+                pausa = max(pausa, self.latencia_media * self.factor_carga)
+                if self.latencia_media > self.latencia_lenta:
+                    pausa = max(pausa, self.latencia_media)
+            if self.errores_seguidos:
+                pausa = max(pausa, self.pausa_minima * (2 ** min(self.errores_seguidos, 16)))
+            pausa = min(pausa, self.pausa_maxima)
+
+            if self.max_solicitudes_minuto:
+                # Esperar a que salgan de la ventana de un minuto las solicitudes necesarias
+                ahora = time.monotonic()
+                while self._solicitudes and ahora - self._solicitudes[0] > 60:
+                    self._solicitudes.popleft()
+                exceso = len(self._solicitudes) + solicitudes_siguientes - self.max_solicitudes_minuto
+                if exceso > 0:
+                    liberacion = self._solicitudes[min(exceso, len(self._solicitudes)) - 1] + 60
+                    pausa = max(pausa, liberacion - ahora)
+            return pausa
+
+    def esperar(self, solicitudes_siguientes=1):
+        # Esperar la pausa calculada; devuelve True si se pidió detener el entrenamiento
+        return self.detener.wait(self.pausa(solicitudes_siguientes))
+
+    def detenido(self):
+        return self.detener.is_set()
+
+    def en_segundo_plano(self, funcion, *args):
+        """
+        Ejecuta la función en el hilo de fondo, fuera del camino de las preguntas.
+        """
+        futuro = self._fondo.submit(funcion, *args)
+        futuro.add_done_callback(_informar_error)
+        return futuro
+
+    def cerrar(self):
+        # Terminar el trabajo pendiente en segundo plano y restaurar las señales
+        self._fondo.shutdown(wait=True)
+        for senal, anterior in self._senales_anteriores.items():
+            signal.signal(senal, anterior)
+        self._senales_anteriores = {}
+
+
+def _informar_error(futuro):
+    error = futuro.exception()
+    if error is not None:
+        print(f"Error en una tarea en segundo plano: {error}")
@@ -0,0 +1,258 @@
+"""
+Recuperación de fragmentos relevantes para dar contexto a las preguntas.
+
+El chat se crea con 'context_window=2048': en lugar de preguntar "más código"
+sin decir cuál, se eligen los fragmentos del corpus (y respuestas anteriores)
+más relevantes con BM25 sobre un índice invertido compacto, y se meten en la
+pregunta hasta agotar un presupuesto de tokens.
+"""
+
+import hashlib
+import itertools
+import math
+import re
+import threading
+from array import array
+from collections import Counter, OrderedDict
+
+
+PATRON_TERMINO = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+PALABRAS_VACIAS = frozenset("""
+a an and are as at be by can code could do for from has have how i if in into is it its more of on or our please
+provide self so that the their then there these this to was we what which will with would you your
+""".split())
+
+
+def tokenizar(texto):
+    """
+    Términos de búsqueda: identificadores y palabras en minúsculas, y las partes de los nombres compuestos.
+    """
+    terminos = []
+    for palabra in PATRON_TERMINO.findall(texto):
+        palabra = palabra.lower()
+        partes = [parte for parte in palabra.split('_') if parte]
+        if len(partes) > 1:
+            terminos.extend(parte for parte in partes if len(parte) > 1 and parte not in PALABRAS_VACIAS)
+        if len(palabra) > 1 and palabra not in PALABRAS_VACIAS:
+            terminos.append(palabra)
+    return terminos
+
+
+def estimar_tokens(texto):
+    # Aproximación sin tokenizador: unos 3,5 caracteres por token en código y prosa en inglés
+    return int(len(texto) / 3.5) + 1
+
+
+class IndiceBM25:
+    """
+    Índice invertido con puntuación BM25.
+
+    Cada término guarda dos arrays paralelos (documentos y frecuencias), y cada
+    documento sólo su longitud: los textos se guardan fuera del índice.
+    """
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.terminos = {}  # término -> (array de documentos, array de frecuencias)
+        self.longitudes = array('I')
+        self.borrados = set()
+        self.activos = 0
+        self._longitud_total = 0
+
+    def __len__(self):
+        return self.activos
+
+    def agregar(self, texto):
+        """
+        Indexa el texto y devuelve su número de documento.
+        """
+        documento = len(self.longitudes)
+        frecuencias = Counter(tokenizar(texto))
+        longitud = sum(frecuencias.values())
+        self.longitudes.append(longitud)
+        self.activos += 1
+        self._longitud_total += longitud
+        for termino, frecuencia in frecuencias.items():
+            lista = self.terminos.get(termino)
+            if lista is None:
+                lista = self.terminos[termino] = (array('I'), array('H'))
+            lista[0].append(documento)
+            lista[1].append(min(frecuencia, 0xFFFF))
+        return documento
+
+    def borrar(self, documento):
+        # Los documentos borrados se saltan al buscar y se quitan del índice al acumularse
+        if documento in self.borrados or documento >= len(self.longitudes):
+            return
+        self.borrados.add(documento)
+        self.activos -= 1
+        self._longitud_total -= self.longitudes[documento]
+        if len(self.borrados) > max(64, self.activos // 2):
+            self.compactar()
+
+    def compactar(self):
+        """
+        Quita de las listas de cada término los documentos borrados.
+        """
+        borrados = self.borrados
+        for termino, (documentos, frecuencias) in list(self.terminos.items()):
+            conservar = [i for i, documento in enumerate(documentos) if documento not in borrados]
+            if not conservar:
+                del self.terminos[termino]
+            elif len(conservar) < len(documentos):
+                self.terminos[termino] = (array('I', (documentos[i] for i in conservar)),
+                                          array('H', (frecuencias[i] for i in conservar)))
+        for documento in borrados:
+            self.longitudes[documento] = 0
+        self.borrados = set()
+
+    def buscar(self, consulta, n=5):
+        """
+        Devuelve hasta 'n' pares (documento, puntuación) ordenados por relevancia.
+        """
+        total = len(self)
+        if not total:
+            return []
+        media = max(self._longitud_total / total, 1.0)
+        puntuaciones = {}
+        for termino in set(tokenizar(consulta)):
+            lista = self.terminos.get(termino)
+            if lista is None:
+                continue
+            documentos, frecuencias = lista
+            aparece = len(documentos) - sum(1 for documento in documentos if documento in self.borrados)
+            if not aparece:
+                continue
+            idf = math.log(1 + (total - aparece + 0.5) / (aparece + 0.5))
+            for documento, frecuencia in zip(documentos, frecuencias):
+                if documento in self.borrados:
+                    continue
+                normalizacion = self.k1 * (1 - self.b + self.b * self.longitudes[documento] / media)
+                puntuacion = idf * frecuencia * (self.k1 + 1) / (frecuencia + normalizacion)
+                puntuaciones[documento] = puntuaciones.get(documento, 0.0) + puntuacion
+        mejores = sorted(puntuaciones.items(), key=lambda par: (-par[1], -par[0]))
+        return mejores[:n]
+
+
+class ContextoCodigo:
+    """
+    Índice BM25 sobre los fragmentos del corpus y las últimas respuestas del modelo.
+
+    Los fragmentos nuevos del corpus se indexan al pedir contexto; el texto se
+    lee del corpus sólo para los fragmentos elegidos. 'preparar' indexa en un
+    hilo aparte los fragmentos que el corpus ya tenía: mientras tanto no se
+    devuelve contexto, en lugar de hacer esperar a la primera pregunta.
+    """
+
+    def __init__(self, corpus, max_respuestas=200, candidatos=8, tanda=256):
+        self.corpus = corpus
+        self.max_respuestas = max_respuestas
+        self.candidatos = candidatos
+        self.indice = IndiceBM25()
+        self._origenes = {}  # documento -> fragmento del corpus o texto de una respuesta
+        self._respuestas = OrderedDict()  # documento -> None, en orden de llegada
+        self._fragmentos_indexados = 0
+        self.tanda = tanda
+        self._preparando = None  # Hilo que indexa el corpus existente
+        self._lock = threading.Lock()
+
+    def preparar(self):
+        """
+        Empieza a indexar en segundo plano los fragmentos que ya tiene el corpus.
+        """
+        with self._lock:
+            if self._preparando is None and self._fragmentos_indexados < len(self.corpus):
+                self._preparando = threading.Thread(target=self._indexar_existentes, name='indice-bm25', daemon=True)
+                self._preparando.start()
+        return self
+
+    def listo(self):
+        # El índice ya cubre el corpus que había al empezar (o no se preparó en segundo plano)
+        return self._preparando is None or not self._preparando.is_alive()
+
+    def _indexar_existentes(self):
+        # Por tandas, soltando el lock entre una y otra para no bloquear 'agregar_respuesta'
+        while True:
+            with self._lock:
+                if self._actualizar(self.tanda):
+                    return
+
+    def _actualizar(self, limite=None):
+        # Indexar los fragmentos que se añadieron al corpus desde la última vez; True si no queda ninguno
+        pendientes = itertools.islice(self.corpus.iterar(self._fragmentos_indexados), limite)
+        for fragmento, texto in pendientes:
+            documento = self.indice.agregar(texto)
+            self._origenes[documento] = fragmento
+            self._fragmentos_indexados += 1
+        return self._fragmentos_indexados >= len(self.corpus)
+
+    def agregar_respuesta(self, respuesta):
+        """
+        Indexa una respuesta del modelo; se conservan las 'max_respuestas' más recientes.
+        """
+        if not respuesta or not respuesta.strip():
+            return
+        with self._lock:
+            documento = self.indice.agregar(respuesta)
+            self._origenes[documento] = respuesta
+            self._respuestas[documento] = None
+            while len(self._respuestas) > self.max_respuestas:
+                antiguo, _ = self._respuestas.popitem(last=False)
+                self.indice.borrar(antiguo)
+                del self._origenes[antiguo]
+
+    def _texto(self, documento):
+        origen = self._origenes[documento]
+        return origen if isinstance(origen, str) else self.corpus.leer(origen)
+
+    def empaquetar(self, consulta, presupuesto_tokens):
+        """
+        Devuelve los textos más relevantes para la consulta que caben en el presupuesto.
+
+        Los textos repetidos se descartan y el último que no cabe entero se corta
+        por líneas si aún quedan al menos unas pocas. Mientras 'preparar' no ha
+        terminado se devuelve una lista vacía.
+        """
+        if not self.listo():
+            return []
+        with self._lock:
+            self._actualizar()
+            resultados = self.indice.buscar(consulta, self.candidatos)
+            textos = [self._texto(documento) for documento, _ in resultados]
+
+        elegidos = []
+        vistos = set()
+        restante = presupuesto_tokens
+        for texto in textos:
+            texto = texto.strip()
+            resumen = hashlib.sha1(texto.encode('utf-8')).digest()
+            if not texto or resumen in vistos:
+                continue
+            vistos.add(resumen)
+            tokens = estimar_tokens(texto)
+            if tokens > restante:
+                texto = _recortar(texto, restante)
+                if texto is None:
+                    continue
+                tokens = estimar_tokens(texto)
+            elegidos.append(texto)
+            restante -= tokens
+            if restante <= 0:
+                break
+        return elegidos
+
+
+def _recortar(texto, presupuesto_tokens, lineas_minimas=3):
+    # Primeras líneas del texto que caben en el presupuesto, o None si son muy pocas
+    lineas = []
+    usados = 0
+    for linea in texto.splitlines():
+        tokens = estimar_tokens(linea + '\n')
+        if usados + tokens > presupuesto_tokens:
+            break
+        lineas.append(linea)
+        usados += tokens
+    if len(lineas) < lineas_minimas:
+        return None
+    return '\n'.join(lineas)
@@ -0,0 +1,46 @@
+import json
+
+from almacen_cerebro import AlmacenCerebro
+
+
+def test_diario_reproduce_los_cambios(tmp_path):
+    almacen = AlmacenCerebro(str(tmp_path / 'cerebro'))
+    almacen.guardar({'epoca': 1, 'confianza_IA': 0.5, 'chat_id': 'a'})
+    almacen.guardar({'epoca': 2, 'confianza_IA': 0.5, 'chat_id': 'a'})
+    almacen.guardar({'epoca': 3, 'confianza_IA': 0.7})
+
+    # La primera escritura es la instantánea; las siguientes sólo añaden lo que cambió
+    with open(almacen.ruta_diario, encoding='utf-8') as archivo:
+        entradas = [json.loads(linea) for linea in archivo]
+    assert [entrada['cambios'] for entrada in entradas] == [{'epoca': 2}, {'epoca': 3, 'confianza_IA': 0.7}]
+    assert entradas[-1]['borradas'] == ['chat_id']
+
+    assert AlmacenCerebro(almacen.directorio).cargar() == {'epoca': 3, 'confianza_IA': 0.7}
+
+
+def test_compactacion(tmp_path):
+    almacen = AlmacenCerebro(str(tmp_path / 'cerebro'), compactar_cada=2)
+    for epoca in range(1, 8):
+        almacen.guardar({'epoca': epoca})
+
+    with open(almacen.ruta_diario, encoding='utf-8') as archivo:
+        assert len(archivo.readlines()) <= 2
+    assert AlmacenCerebro(almacen.directorio).cargar() == {'epoca': 7}
+
+
+def test_linea_cortada_al_final_del_diario(tmp_path):
+    almacen = AlmacenCerebro(str(tmp_path / 'cerebro'))
+    almacen.guardar({'epoca': 1})
+    almacen.guardar({'epoca': 2})
+    # Un corte a mitad de un guardado deja la última línea sin terminar
+    with open(almacen.ruta_diario, 'a', encoding='utf-8') as archivo:
+        archivo.write('{"secuencia": 3, "cambios": {"epo')
+
+    recuperado = AlmacenCerebro(almacen.directorio)
+    assert recuperado.cargar() == {'epoca': 2}
+
+    # Los guardados siguientes no se pegan a la línea cortada y se leen al volver a cargar
+    recuperado.guardar({'epoca': 4})
+    assert AlmacenCerebro(almacen.directorio).cargar() == {'epoca': 4}
+    with open(almacen.ruta_diario, encoding='utf-8') as archivo:
+        assert all(json.loads(linea) for linea in archivo)
@@ -0,0 +1,37 @@
+from escaner_codigo import EscanerCodigo
+
+
+BLOQUE = (
+    "```python\n"
+    "def f(xs):\n"
+    "    for i in range(len(xs)):\n"
+    "        a = xs[i]\n"
+    "    return a\n"
+    "```\n"
+)
+
+
+def tipos(hallazgos):
+    return sorted((hallazgo.tipo, hallazgo.linea, hallazgo.detalle) for hallazgo in hallazgos)
+
+
+def test_parentesis_sin_cerrar_en_la_prosa():
+    con_parentesis = EscanerCodigo().escanear("Use numpy (e.g. vectorize it\n" + BLOQUE)
+    sin_parentesis = EscanerCodigo().escanear("Use numpy to vectorize it\n" + BLOQUE)
+
+    assert tipos(con_parentesis) == tipos(sin_parentesis)
+    assert ('bucle_range', 4, 'for i in range(len(xs))') in tipos(con_parentesis)
+    assert ('sin_documentar', 3, 'f') in tipos(con_parentesis)
+
+
+def test_parentesis_sin_cerrar_sin_bloques():
+    hallazgos = EscanerCodigo().escanear("Use numpy (e.g. x\nfor i in range(3):\n    y = i\nz = 1\n")
+
+    assert ('bucle_range', 2, 'for i in range(...)') in tipos(hallazgos)
+    assert ('nombre_corto', 4, 'z') in tipos(hallazgos)
+
+
+def test_linea_base():
+    hallazgos = EscanerCodigo().escanear("x = 1\n", linea_base=10)
+
+    assert tipos(hallazgos) == [('nombre_corto', 11, 'x')]
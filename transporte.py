@@ -0,0 +1,197 @@
+"""
+Capa de transporte HTTP para la API de Serge.
+
+Centraliza la URL base y los parámetros del modelo, reutiliza las conexiones
+con una sesión de 'requests' (keep-alive), aplica timeouts de conexión y de
+lectura, y reintenta los fallos transitorios con espera exponencial y jitter.
+Los fallos se notifican con excepciones 'ErrorSerge' en lugar de devolver
+texto que pueda confundirse con una respuesta del modelo.
+"""
+
+import os
+import random
+import time
+from urllib.parse import quote
+
+from diferido import ModuloDiferido
+
+
+# 'requests' se importa al crear la primera sesión: es lo más lento del arranque
+requests = ModuloDiferido('requests')
+excepciones_urllib3 = ModuloDiferido('urllib3.exceptions')
+
+
+PROMPT_INICIAL = "You are a Python programming language expert. You have extensive knowledge and experience in Python development. You're proficient in various Python libraries such as NumPy, Pandas, and TensorFlow. Your expertise includes data manipulation, machine learning algorithms, and deep learning architectures. You are constantly seeking ways to optimize and enhance code performance. You have a deep understanding of Python syntax, object-oriented programming, and best practices in software development. You are eager to teach and adapt your Python skills to improve this neural network's codebase. Please provide guidance and instructions on code enhancement, best practices, and innovative techniques to elevate the capabilities of this neural network."
+
+# Códigos HTTP con los que el servidor rechaza la solicitud sin procesarla (se puede repetir).
+# 502 y 504 no: el proxy pudo pasar la pregunta a Serge, que la habría generado igualmente
+CODIGOS_REINTENTABLES = (429, 503)
+
+
+class ErrorSerge(Exception):
+    """Error base de la comunicación con Serge."""
+
+
+class ErrorConexionSerge(ErrorSerge):
+    """No se pudo conectar o leer del servidor tras agotar los reintentos."""
+
+
+class ErrorRespuestaSerge(ErrorSerge):
+    """El servidor respondió con un código de error."""
+
+    def __init__(self, codigo_estado, texto):
+        super().__init__(f"HTTP {codigo_estado}: {texto[:200]}")
+        self.codigo_estado = codigo_estado
+        self.texto = texto
+
+
+class ConfiguracionSerge:
+    """
+    Parámetros del servidor y del modelo, definidos en un único lugar.
+
+    Para usar Zephyr en la misma máquina, por ejemplo:
+    ConfiguracionSerge(modelo='Zephyr-7B-Beta', n_threads=28)
+    """
+
+    def __init__(self, url_base='http://192.168.68.24:8008', modelo='Mixtral-8X7B-Instruct-v0_1',
+                 temperatura=0.1, top_k=50, top_p=0.95, max_length=2048, context_window=2048,
+                 repeat_last_n=64, repeat_penalty=1.3, n_threads=42, gpu_layers=0,
+                 prompt_inicial=PROMPT_INICIAL, timeout_conexion=5.0, timeout_lectura=120.0,
+                 reintentos=3, espera_base=0.5, espera_maxima=30.0, tamano_pool=10):
+        self.url_base = url_base.rstrip('/')
+        self.modelo = modelo
+        self.temperatura = temperatura
+        self.top_k = top_k
+        self.top_p = top_p
+        self.max_length = max_length
+        self.context_window = context_window
+        self.repeat_last_n = repeat_last_n
+        self.repeat_penalty = repeat_penalty
+        self.n_threads = n_threads
+        self.gpu_layers = gpu_layers
+        self.prompt_inicial = prompt_inicial
+        # Serge envía un ': ping' cada 15 s, así que el timeout de lectura sólo salta con sockets colgados
+        self.timeout_conexion = timeout_conexion
+        self.timeout_lectura = timeout_lectura
+        self.reintentos = reintentos
+        self.espera_base = espera_base
+        self.espera_maxima = espera_maxima
+        self.tamano_pool = tamano_pool
+
+    @classmethod
+    def desde_entorno(cls, **valores):
+        # Permitir cambiar servidor y modelo sin editar el código
+        if 'SERGE_URL' in os.environ:
+            valores.setdefault('url_base', os.environ['SERGE_URL'])
+        if 'SERGE_MODELO' in os.environ:
+            valores.setdefault('modelo', os.environ['SERGE_MODELO'])
+        if 'SERGE_N_THREADS' in os.environ:
+            valores.setdefault('n_threads', int(os.environ['SERGE_N_THREADS']))
+        return cls(**valores)
+
+    def parametros_chat(self):
+        # Parámetros de creación del chat, en el orden que espera /api/chat/
+        return {
+            'model': self.modelo,
+            'temperature': self.temperatura,
+            'top_k': self.top_k,
+            'top_p': self.top_p,
+            'max_length': self.max_length,
+            'context_window': self.context_window,
+            'repeat_last_n': self.repeat_last_n,
+            'repeat_penalty': self.repeat_penalty,
+            'n_threads': self.n_threads,
+            'init_prompt': self.prompt_inicial,
+            'gpu_layers': self.gpu_layers,
+        }
+
+    def timeout(self):
+        return (self.timeout_conexion, self.timeout_lectura)
+
+
+class ClienteSerge:
+    """
+    Cliente HTTP con sesión persistente para la API de Serge.
+    """
+
+    def __init__(self, configuracion=None):
+        self.configuracion = configuracion or ConfiguracionSerge.desde_entorno()
+        self._sesion = None
+
+    @property
+    def sesion(self):
+        # Crear la sesión en el primer uso para reutilizar las conexiones (keep-alive)
+        if self._sesion is None:
+            sesion = requests.Session()
+            adaptador = requests.adapters.HTTPAdapter(pool_connections=self.configuracion.tamano_pool,
+                                                      pool_maxsize=self.configuracion.tamano_pool, max_retries=0)
+            sesion.mount('http://', adaptador)
+            sesion.mount('https://', adaptador)
+            self._sesion = sesion
+        return self._sesion
+
+    def crear_chat(self):
+        """
+        Crea un chat nuevo con los parámetros configurados y devuelve su ID.
+        """
+        parametros = '&'.join(f"{clave}={quote(str(valor))}"
+                              for clave, valor in self.configuracion.parametros_chat().items())
+        response = self._solicitar('POST', f"/api/chat/?{parametros}", headers={'Accept': 'application/json'})
+        return response.json()
+
+    def preguntar(self, chat_id, pregunta, stream=False):
+        """
+        Envía una pregunta a un chat y devuelve la respuesta HTTP.
+
+        Con stream=True el cuerpo (eventos SSE) se lee a medida que llega;
+        el llamador debe cerrar la respuesta.
+        """
+        accept = 'text/event-stream' if stream else 'text/plain'
+        return self._solicitar('GET', f"/api/chat/{chat_id}/question?prompt={quote(pregunta)}",
+                               headers={'Accept': accept}, stream=stream)
+
+    def _solicitar(self, metodo, ruta, **kwargs):
+        # Realizar la solicitud reintentando los fallos transitorios. Ni crear un chat ni preguntar
+        # son idempotentes: sólo se repite si la solicitud no llegó al servidor (fallo al conectar)
+        # o si el servidor la rechazó sin procesarla (CODIGOS_REINTENTABLES)
+        configuracion = self.configuracion
+        url = configuracion.url_base + ruta
+        intento = 0
+        while True:
+            try:
+                response = self.sesion.request(metodo, url, timeout=configuracion.timeout(), **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if not fallo_al_conectar(e) or intento >= configuracion.reintentos:
+                    raise ErrorConexionSerge(f"{metodo} {url}: {e}") from e
+            else:
+                if response.ok:
+                    return response
+                if response.status_code not in CODIGOS_REINTENTABLES or intento >= configuracion.reintentos:
+                    texto = response.text
+                    response.close()
+                    raise ErrorRespuestaSerge(response.status_code, texto)
+                response.close()
+
+            time.sleep(self.espera(intento))
+            intento += 1
+
+    def espera(self, intento):
+        # Espera exponencial con jitter completo para no sincronizar los reintentos
+        limite = min(self.configuracion.espera_maxima, self.configuracion.espera_base * (2 ** intento))
+        return random.uniform(0, limite)
+
+    def cerrar(self):
+        if self._sesion is not None:
+            self._sesion.close()
+            self._sesion = None
+
+
+def fallo_al_conectar(error):
+    # La conexión no llegó a establecerse (timeout al conectar, conexión rechazada, DNS), así que el
+    # servidor no recibió la solicitud; un timeout de lectura o una conexión cortada no se repiten
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    if isinstance(error, requests.Timeout):
+        return False
+    motivo = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(motivo, excepciones_urllib3.NewConnectionError)